@@ -21,12 +21,13 @@ from __future__ import print_function
 from __future__ import absolute_import
 
 from panda3d.core import LPoint3d, LQuaternion, LColor, LVector3, LVector3d
-from panda3d.core import GeomVertexFormat, GeomVertexData, GeomVertexWriter, GeomVertexRewriter, InternalName
-from panda3d.core import Geom, GeomNode, GeomLines
+from panda3d.core import GeomVertexArrayFormat, GeomVertexFormat, GeomVertexData, GeomVertexWriter, InternalName
+from panda3d.core import Geom, GeomNode, GeomLines, GeomLinestrips
 from panda3d.core import NodePath
 
 from .foundation import VisibleObject, ObjectLabel, LabelledObject
 from .astro.orbits import FixedOrbit, InfinitePosition
+from .astro.orbitpath import orbitPathCache, get_rotation_matrix
 from .astro import units
 from .bodyclass import bodyClasses
 from .shaders import BasicShader, FlatLightingModel, LargeObjectVertexControl
@@ -36,6 +37,7 @@ from .utils import srgb_to_linear
 from . import settings
 
 from math import sin, cos, atan2, pi
+import numpy
 
 class AnnotationLabel(ObjectLabel):
     def update_instance(self, camera_pos, orientation):
@@ -72,6 +74,7 @@ class Orbit(VisibleObject):
         self.orbit = self.find_orbit(self.body)
         self.color = None
         self.fade = 0.0
+        self.batch = None
         if not self.orbit:
             print("No orbit for", self.get_name())
             self.visible = False
@@ -111,42 +114,34 @@ class Orbit(VisibleObject):
             self.color = self.selected_color
         else:
             self.color = self.parent.get_orbit_color()
-        if self.instance:
+        self.update_color()
+
+    def update_color(self):
+        if self.batch is not None:
+            self.batch.set_orbit_color(self, self.color, self.fade)
+        elif self.instance:
             self.instance.setColor(srgb_to_linear(self.color * self.fade))
 
     def create_instance(self):
+        if self.color is None:
+            self.color = self.parent.get_orbit_color()
+        if settings.batch_orbit_lines and self.body.parent.is_system():
+            self.batch = self.body.parent.get_orbit_batch()
+            self.batch.add_orbit(self)
+            self.instance_ready = True
+            return
         self.vertexData = GeomVertexData('vertexData', GeomVertexFormat.getV3(), Geom.UHStatic)
-        self.vertexWriter = GeomVertexWriter(self.vertexData, 'vertex')
-        delta = self.body.parent.get_local_position()
-        if self.orbit.is_periodic():
-            epoch = self.context.time.time_full - self.orbit.period
-            step = self.orbit.period / (self.nbOfPoints - 1)
-        else:
-            #TODO: Properly calculate orbit start and end time
-            epoch = self.orbit.get_time_of_perihelion() - self.orbit.period * 5.0
-            step = self.orbit.period * 10.0 / (self.nbOfPoints - 1)
-        for i in range(self.nbOfPoints):
-            time = epoch + step * i
-            pos = self.orbit.get_position_at(time) - delta
-            self.vertexWriter.addData3f(*pos)
-        self.lines = GeomLines(Geom.UHStatic)
-        for i in range(self.nbOfPoints-1):
-            self.lines.addVertex(i)
-            self.lines.addVertex(i+1)
-        if self.orbit.is_periodic():
-            self.lines.addVertex(self.nbOfPoints-1)
-            self.lines.addVertex(0)
+        self.lines = GeomLinestrips(Geom.UHStatic)
         self.geom = Geom(self.vertexData)
         self.geom.addPrimitive(self.lines)
         self.node = GeomNode(self.body.get_ascii_name() + '-orbit')
         self.node.addGeom(self.geom)
+        self.update_geom()
         self.instance = NodePath(self.node)
         self.instance.setRenderModeThickness(settings.orbit_thickness)
         self.instance.setCollideMask(GeomNode.getDefaultCollideMask())
         self.instance.node().setPythonTag('owner', self)
         self.instance.reparentTo(self.context.annotation)
-        if self.color is None:
-            self.color = self.parent.get_orbit_color()
         self.instance.setColor(srgb_to_linear(self.color * self.fade))
         self.instance_ready = True
         if self.shader is None:
@@ -154,23 +149,30 @@ class Orbit(VisibleObject):
         self.shader.apply(self, self.appearance)
         self.shader.update(self, self.appearance)
 
+    def get_path_vertices(self):
+        """
+        Returns the vertices of the orbit as a (n, 3) array relative to the parent of the body and whether the path is closed.
+        """
+        (path, closed) = orbitPathCache.get_path(self.orbit, self.nbOfPoints, self.context.time.time_full)
+        #The path is in the orbit frame
+        frame = self.orbit.frame
+        offset = frame.get_local_position(LPoint3d()) - self.body.parent.get_local_position()
+        vertices = path.dot(get_rotation_matrix(frame.get_orientation())) + offset
+        return (vertices, closed)
+
     def update_geom(self):
+        if self.batch is not None:
+            self.batch.update_orbit(self)
+            return
+        (vertices, closed) = self.get_path_vertices()
+        if closed:
+            vertices = numpy.vstack([vertices, vertices[:1]])
         geom = self.node.modify_geom(0)
         vdata = geom.modify_vertex_data()
-        vwriter = GeomVertexRewriter(vdata, InternalName.make('vertex'))
-        #TODO: refactor with above code !!!
-        delta = self.body.parent.get_local_position()
-        if self.orbit.is_periodic():
-            epoch = self.context.time.time_full - self.orbit.period
-            step = self.orbit.period / (self.nbOfPoints - 1)
-        else:
-            #TODO: Properly calculate orbit start and end time
-            epoch = self.orbit.get_time_of_perihelion() - self.orbit.period * 5.0
-            step = self.orbit.period * 10.0 / (self.nbOfPoints - 1)
-        for i in range(self.nbOfPoints):
-            time = epoch + step * i
-            pos = self.orbit.get_position_at(time) - delta
-            vwriter.setData3f(*pos)
+        vdata.unclean_set_num_rows(len(vertices))
+        buffer = numpy.frombuffer(memoryview(vdata.modify_array(0)), dtype=numpy.float32)
+        buffer[:] = vertices.ravel()
+        geom.modify_primitive(0).set_nonindexed_vertices(0, len(vertices))
 
     def check_visibility(self, pixel_size):
         if self.parent.parent.visible and self.parent.shown and self.orbit:
@@ -181,12 +183,33 @@ class Orbit(VisibleObject):
                 size = 0.0
             self.visible = size > settings.orbit_fade
             self.fade = min(1.0, max(0.0, (size - settings.orbit_fade) / settings.orbit_fade))
-            if self.color is not None and self.instance is not None:
-                self.instance.setColor(srgb_to_linear(self.color * self.fade))
+            if self.color is not None:
+                self.update_color()
         else:
             self.visible = False
 
+    def do_show(self):
+        if self.batch is None:
+            VisibleObject.do_show(self)
+        if self.batch is not None:
+            self.batch.show_orbit(self)
+
+    def do_hide(self):
+        if self.batch is not None:
+            self.batch.hide_orbit(self)
+        else:
+            VisibleObject.do_hide(self)
+
+    def remove_instance(self):
+        if self.batch is not None:
+            self.batch.remove_orbit(self)
+            self.batch = None
+            self.instance_ready = False
+        else:
+            VisibleObject.remove_instance(self)
+
     def update_instance(self, camera_pos, orientation):
+        #The batched orbits are placed by their batch
         if self.instance:
             self.place_instance_params(self.instance,
                                        self.body.parent.scene_position,
@@ -195,9 +218,203 @@ class Orbit(VisibleObject):
             self.shader.update(self, self.appearance)
 
     def update_user_parameters(self):
-        if self.instance is not None:
+        if self.instance is not None or self.batch is not None:
             self.update_geom()
 
+class OrbitBatch(VisibleObject):
+    """
+    Orbit lines of all the children of a system, merged in one vertex buffer and drawn with a single GeomLines.
+    The color and the fade of each orbit are stored in the vertices, each orbit owns a range of vertices and
+    a range of indices. Hiding an orbit only removes its indices from the primitive.
+    """
+    ignore_light = True
+    format = None
+    appearance = None
+    shader = None
+    #vertex, color and oid
+    nb_columns = 11
+
+    def __init__(self, system):
+        VisibleObject.__init__(self, system.get_ascii_name() + '-orbits')
+        self.system = system
+        self.orbits = []
+        self.blocks = {}
+        self.closed = {}
+        self.colors = {}
+        self.starts = {}
+        self.lines = {}
+        self.shown_orbits = set()
+        self.data = None
+        self.layout_dirty = False
+        self.indices_dirty = False
+        self.dirty_start = None
+        self.dirty_end = None
+        self.nb_indices = 0
+
+    @classmethod
+    def create_format(cls):
+        array = GeomVertexArrayFormat()
+        array.addColumn(InternalName.get_vertex(), 3, Geom.NTFloat32, Geom.CPoint)
+        array.addColumn(InternalName.get_color(), 4, Geom.NTFloat32, Geom.CColor)
+        array.addColumn(InternalName.make('oid'), 4, Geom.NTFloat32, Geom.COther)
+        format = GeomVertexFormat()
+        format.addArray(array)
+        cls.format = GeomVertexFormat.registerFormat(format)
+
+    @classmethod
+    def create_shader(cls):
+        cls.appearance = ModelAppearance(vertex_color=True)
+        if settings.use_inv_scaling:
+            vertex_control = LargeObjectVertexControl()
+        else:
+            vertex_control = None
+        cls.shader = BasicShader(lighting_model=FlatLightingModel(), vertex_control=vertex_control, vertex_oids=True)
+
+    def create_instance(self):
+        if self.format is None:
+            self.create_format()
+        vdata = GeomVertexData('vertexData', self.format, Geom.UHDynamic)
+        lines = GeomLines(Geom.UHDynamic)
+        lines.set_index_type(Geom.NT_uint32)
+        self.geom = Geom(vdata)
+        self.geom.addPrimitive(lines)
+        self.node = GeomNode(self.get_ascii_name())
+        self.node.addGeom(self.geom)
+        self.instance = NodePath(self.node)
+        self.instance.setRenderModeThickness(settings.orbit_thickness)
+        self.instance.setCollideMask(GeomNode.getDefaultCollideMask())
+        self.instance.node().setPythonTag('owner', self)
+        self.instance.reparentTo(self.context.annotation)
+        self.instance_ready = True
+        if self.shader is None:
+            self.create_shader()
+        self.shader.apply(self, self.appearance)
+
+    def make_block(self, orbit):
+        (vertices, closed) = orbit.get_path_vertices()
+        block = numpy.empty((len(vertices), self.nb_columns), dtype=numpy.float32)
+        block[:, 0:3] = vertices
+        block[:, 3:7] = srgb_to_linear(orbit.color * orbit.fade)
+        block[:, 7:11] = orbit.get_oid_color()
+        self.closed[orbit] = closed
+        return block
+
+    def add_orbit(self, orbit):
+        self.orbits.append(orbit)
+        self.colors[orbit] = (orbit.color, orbit.fade)
+        self.blocks[orbit] = self.make_block(orbit)
+        self.layout_dirty = True
+
+    def remove_orbit(self, orbit):
+        #The list of orbits is compacted at the next update
+        del self.blocks[orbit]
+        del self.colors[orbit]
+        del self.closed[orbit]
+        self.shown_orbits.discard(orbit)
+        self.layout_dirty = True
+
+    def update_orbit(self, orbit):
+        block = self.make_block(orbit)
+        if not self.layout_dirty and block.shape == self.blocks[orbit].shape:
+            self.blocks[orbit][:] = block
+            self.set_dirty(orbit)
+        else:
+            self.blocks[orbit] = block
+            self.layout_dirty = True
+
+    def set_orbit_color(self, orbit, color, fade):
+        (previous_color, previous_fade) = self.colors[orbit]
+        if color is previous_color and fade == previous_fade: return
+        self.colors[orbit] = (color, fade)
+        self.blocks[orbit][:, 3:7] = srgb_to_linear(color * fade)
+        if not self.layout_dirty:
+            self.set_dirty(orbit)
+
+    def show_orbit(self, orbit):
+        if orbit not in self.shown_orbits:
+            self.shown_orbits.add(orbit)
+            self.indices_dirty = True
+
+    def hide_orbit(self, orbit):
+        if orbit in self.shown_orbits:
+            self.shown_orbits.remove(orbit)
+            self.indices_dirty = True
+
+    def set_dirty(self, orbit):
+        start = self.starts[orbit]
+        end = start + len(self.blocks[orbit])
+        if self.dirty_start is None:
+            self.dirty_start = start
+            self.dirty_end = end
+        else:
+            self.dirty_start = min(self.dirty_start, start)
+            self.dirty_end = max(self.dirty_end, end)
+
+    def update_layout(self):
+        self.orbits = [orbit for orbit in self.orbits if orbit in self.blocks]
+        start = 0
+        for orbit in self.orbits:
+            nb_vertices = len(self.blocks[orbit])
+            segments = numpy.arange(start, start + nb_vertices - 1, dtype=numpy.uint32)
+            lines = numpy.column_stack([segments, segments + 1]).ravel()
+            if self.closed[orbit]:
+                lines = numpy.append(lines, numpy.array([start + nb_vertices - 1, start], dtype=numpy.uint32))
+            self.starts[orbit] = start
+            self.lines[orbit] = lines
+            start += nb_vertices
+        if len(self.orbits) > 0:
+            self.data = numpy.concatenate([self.blocks[orbit] for orbit in self.orbits])
+        else:
+            self.data = numpy.empty((0, self.nb_columns), dtype=numpy.float32)
+        #The blocks are now views of the vertex array
+        for orbit in self.orbits:
+            start = self.starts[orbit]
+            self.blocks[orbit] = self.data[start:start + len(self.blocks[orbit])]
+        vdata = self.geom.modify_vertex_data()
+        vdata.unclean_set_num_rows(len(self.data))
+        if len(self.data) > 0:
+            buffer = numpy.frombuffer(memoryview(vdata.modify_array(0)), dtype=numpy.float32)
+            buffer[:] = self.data.ravel()
+        self.layout_dirty = False
+        self.dirty_start = None
+        self.indices_dirty = True
+
+    def update_vertices(self):
+        vdata = self.geom.modify_vertex_data()
+        buffer = numpy.frombuffer(memoryview(vdata.modify_array(0)), dtype=numpy.float32)
+        start = self.dirty_start * self.nb_columns
+        end = self.dirty_end * self.nb_columns
+        buffer[start:end] = self.data[self.dirty_start:self.dirty_end].ravel()
+        self.dirty_start = None
+
+    def update_indices(self):
+        lines = [self.lines[orbit] for orbit in self.orbits if orbit in self.shown_orbits]
+        self.nb_indices = sum(len(orbit_lines) for orbit_lines in lines)
+        handle = self.geom.modify_primitive(0).modify_vertices()
+        handle.unclean_set_num_rows(self.nb_indices)
+        if self.nb_indices > 0:
+            buffer = numpy.frombuffer(memoryview(handle), dtype=numpy.uint32)
+            buffer[:] = numpy.concatenate(lines)
+        self.indices_dirty = False
+
+    def update_instance(self, camera_pos, orientation):
+        if self.instance is None: return
+        if self.layout_dirty:
+            self.update_layout()
+        elif self.dirty_start is not None:
+            self.update_vertices()
+        if self.indices_dirty:
+            self.update_indices()
+        if self.nb_indices == 0:
+            self.instance.stash()
+            return
+        self.instance.unstash()
+        self.place_instance_params(self.instance,
+                                   self.system.scene_position,
+                                   self.system.scene_scale_factor,
+                                   LQuaternion())
+        self.shader.update(self, self.appearance)
+
 class RotationAxis(VisibleObject):
     default_shown = False
     ignore_light = True
@@ -0,0 +1,234 @@
+#
+#This file is part of Cosmonium.
+#
+#Copyright (C) 2018-2019 Laurent Deru.
+#
+#Cosmonium is free software: you can redistribute it and/or modify
+#it under the terms of the GNU General Public License as published by
+#the Free Software Foundation, either version 3 of the License, or
+#(at your option) any later version.
+#
+#Cosmonium is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#GNU General Public License for more details.
+#
+#You should have received a copy of the GNU General Public License
+#along with Cosmonium.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+from __future__ import print_function
+from __future__ import absolute_import
+
+from panda3d.core import LPoint3d
+
+from .orbits import Orbit
+from .orbitpath import sample_orbit, get_elements_key
+from ..cache import create_path_for, is_cache_valid, save_arrays, map_arrays
+from .. import workers
+from .. import settings
+
+from math import floor
+import hashlib
+import numpy
+import os
+
+class ChebyshevEphemeris(object):
+    """
+    Piecewise Chebyshev approximation of the position of an orbit in its frame.
+    The window [start, start + nb_segments * segment_length] is split in segments of equal length,
+    each segment has its own coefficients for the three coordinates.
+    """
+    version = 1
+
+    def __init__(self, start, segment_length, coefs):
+        self.start = start
+        self.segment_length = segment_length
+        self.coefs = coefs
+        self.nb_segments = coefs.shape[0]
+        self.end = start + self.nb_segments * segment_length
+        #Coefficients of the segments already used, as python tuples from the highest degree
+        self.segments = {}
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        (start, segment_length) = arrays['window'].tolist()
+        degree = int(arrays['degree'][0])
+        return cls(start, segment_length, arrays['coefs'].reshape(-1, 3, degree + 1))
+
+    def get_arrays(self):
+        nb_segments, _, nb_coefs = self.coefs.shape
+        return [('window', numpy.array([self.start, self.segment_length])),
+                ('degree', numpy.array([nb_coefs - 1], dtype=numpy.int64)),
+                ('coefs', self.coefs.reshape(nb_segments, 3 * nb_coefs))]
+
+    def contains(self, time):
+        return self.start <= time < self.end
+
+    def evaluate(self, time):
+        u = (time - self.start) / self.segment_length
+        segment = min(int(floor(u)), self.nb_segments - 1)
+        coefs = self.segments.get(segment)
+        if coefs is None:
+            coefs = list(zip(*self.coefs[segment].tolist()))[::-1]
+            self.segments[segment] = coefs
+        x = 2.0 * (u - segment) - 1.0
+        x2 = 2.0 * x
+        #Clenshaw recurrence on the three coordinates at once
+        bx = by = bz = 0.0
+        cx = cy = cz = 0.0
+        for (ax, ay, az) in coefs[:-1]:
+            (bx, cx) = (x2 * bx - cx + ax, bx)
+            (by, cy) = (x2 * by - cy + ay, by)
+            (bz, cz) = (x2 * bz - cz + az, bz)
+        (ax, ay, az) = coefs[-1]
+        return LPoint3d(x * bx - cx + ax, x * by - cy + ay, x * bz - cz + az)
+
+    def evaluate_array(self, times):
+        times = numpy.asarray(times, dtype=numpy.float64)
+        u = (times - self.start) / self.segment_length
+        segments = numpy.clip(numpy.floor(u).astype(numpy.int64), 0, self.nb_segments - 1)
+        x = 2.0 * (u - segments) - 1.0
+        coefs = self.coefs[segments]
+        b1 = numpy.zeros((len(times), 3))
+        b2 = numpy.zeros((len(times), 3))
+        x2 = (2.0 * x)[:, None]
+        for i in range(coefs.shape[2] - 1, 0, -1):
+            (b1, b2) = (x2 * b1 - b2 + coefs[:, :, i], b1)
+        return x[:, None] * b1 - b2 + coefs[:, :, 0]
+
+def fit_chebyshev(orbit, start, segment_length, nb_segments, degree):
+    """
+    Interpolate the orbit on the Chebyshev nodes of each segment.
+    """
+    nb_nodes = degree + 1
+    theta = numpy.pi * (numpy.arange(nb_nodes) + 0.5) / nb_nodes
+    nodes = numpy.cos(theta)
+    times = start + (numpy.arange(nb_segments)[:, None] + (nodes[None, :] + 1.0) / 2.0) * segment_length
+    values = sample_orbit(orbit, times.ravel()).reshape(nb_segments, nb_nodes, 3)
+    #Discrete cosine transform of the values at the nodes
+    basis = numpy.cos(numpy.outer(numpy.arange(nb_nodes), theta)) * (2.0 / nb_nodes)
+    basis[0] /= 2.0
+    coefs = numpy.einsum('jk,skc->scj', basis, values)
+    return ChebyshevEphemeris(start, segment_length, numpy.ascontiguousarray(coefs))
+
+def get_segment_length(orbit, segments_per_period):
+    segment_length = orbit.get_period() / segments_per_period
+    eccentricity = getattr(orbit, 'eccentricity', 0.0)
+    if eccentricity < 1.0:
+        #The speed at perihelion increases with the eccentricity
+        segment_length *= (1.0 - eccentricity) ** 1.5
+    return segment_length
+
+def get_fit_parameters(orbit, time):
+    """
+    Returns the window and the segments used to fit the given orbit around the given time.
+    """
+    segment_length = get_segment_length(orbit, settings.ephemeris_segments_per_period)
+    nb_segments = int(min(settings.ephemeris_window / segment_length, settings.ephemeris_max_segments))
+    nb_segments = max(nb_segments, 1)
+    #Align the windows on half their length so that close requests map on the same files,
+    #the requested time is always in the middle half of the window
+    half = nb_segments * segment_length / 2
+    start = floor(time / half) * half - half / 2
+    return (start, segment_length, nb_segments, settings.ephemeris_degree)
+
+def get_ephemeris_cache_file(orbit, parameters):
+    key = repr((get_elements_key(orbit), parameters))
+    md5 = hashlib.md5(key.encode()).hexdigest()
+    return os.path.join(create_path_for('ephemeris'), md5 + ".dat")
+
+def prune_ephemeris_cache(cache_dir, max_files):
+    """
+    Removes the least recently used ephemeris files above the given count.
+    """
+    files = [os.path.join(cache_dir, name) for name in os.listdir(cache_dir) if name.endswith('.dat')]
+    if len(files) <= max_files:
+        return
+    files.sort(key=os.path.getmtime)
+    for filepath in files[:len(files) - max_files]:
+        try:
+            os.remove(filepath)
+        except OSError as e:
+            print("Could not remove ephemeris cache", filepath, ':', e)
+
+def load_or_fit(orbit, parameters):
+    cache_file = get_ephemeris_cache_file(orbit, parameters)
+    if is_cache_valid(cache_file):
+        arrays = map_arrays(cache_file, ChebyshevEphemeris.version)
+        if arrays is not None:
+            try:
+                ephemeris = ChebyshevEphemeris.from_arrays(arrays)
+                #Keep the recently used files out of the pruning
+                os.utime(cache_file, None)
+                return ephemeris
+            except KeyError as e:
+                print("Invalid ephemeris cache", cache_file, ':', e)
+    ephemeris = fit_chebyshev(orbit, *parameters)
+    save_arrays(cache_file, ephemeris.get_arrays(), ChebyshevEphemeris.version)
+    prune_ephemeris_cache(os.path.dirname(cache_file), settings.ephemeris_cache_max_files)
+    return ephemeris
+
+class EphemerisManager(object):
+    """
+    Fits the dynamic orbits in a background worker when they are requested and installs the result in the orbit.
+    Until the ephemeris is available, or outside of its window, the analytic orbit is used.
+    The worker is only created when the first orbit needs to be fitted.
+    """
+    def __init__(self, base):
+        self.base = base
+        self.loader = None
+        self.pending = set()
+        self.active = False
+
+    def set_active(self, active):
+        if active != self.active:
+            self.active = active
+            Orbit.ephemeris_manager = self if active else None
+
+    def get_position_at(self, orbit, time):
+        if not orbit.ephemeris_fit or not orbit.is_periodic():
+            return None
+        ephemeris = orbit.ephemeris
+        if ephemeris is not None and ephemeris.contains(time):
+            return ephemeris.evaluate(time)
+        if orbit not in self.pending:
+            self.pending.add(orbit)
+            parameters = get_fit_parameters(orbit, time)
+            if self.loader is None:
+                self.loader = workers.AsyncLoader(self.base, 'EphemerisFitter')
+            self.loader.add_job(load_or_fit, [orbit, parameters], self.fit_done, [orbit])
+        return None
+
+    def fit_done(self, ephemeris, orbit):
+        self.pending.discard(orbit)
+        orbit.ephemeris = ephemeris
+
+if __name__ == '__main__':
+    #Accuracy and speed of the ephemeris compared to the analytic orbits
+    from .orbits import create_elliptical_orbit
+    from . import units
+    from time import time as now
+    from random import seed, uniform
+
+    seed(0)
+    window = 100 * units.JYear
+    for (name, eccentricity, period) in (('circular', 0.01, 1.0), ('eccentric', 0.5, 5.0), ('comet', 0.95, 70.0)):
+        orbit = create_elliptical_orbit(semi_major_axis=5.0, eccentricity=eccentricity, period=period,
+                                        inclination=30.0, ascending_node=40.0, arg_of_periapsis=50.0)
+        for segments_per_period in (4, 8, 16):
+            segment_length = get_segment_length(orbit, segments_per_period)
+            nb_segments = int(window / segment_length)
+            start = now()
+            ephemeris = fit_chebyshev(orbit, units.J2000, segment_length, nb_segments, settings.ephemeris_degree)
+            fit_time = now() - start
+            times = [units.J2000 + uniform(0, ephemeris.end - ephemeris.start) for i in range(10000)]
+            start = now()
+            reference = [orbit.get_frame_rotation_at(t).xform(orbit.get_frame_position_at(t)) for t in times]
+            analytic_time = now() - start
+            start = now()
+            values = [ephemeris.evaluate(t) for t in times]
+            ephemeris_time = now() - start
+            error = max((value - ref).length() / ref.length() for (value, ref) in zip(values, reference))
+            print("%s, %d segments per period: fit %.1fms, analytic %.2fus, ephemeris %.2fus, max relative error %g" %
+                  (name, segments_per_period, fit_time * 1000, analytic_time / len(times) * 1e6, ephemeris_time / len(times) * 1e6, error))
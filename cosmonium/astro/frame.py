@@ -41,6 +41,11 @@ from math import pi
 #      z    =   -y
 
 class ReferenceFrame(object):
+    dynamic = False
+    nb_cache_hits = 0
+    nb_cache_misses = 0
+    #Incremented at each frame, values cached by the frames during a previous frame are no longer valid
+    generation = 0
     def get_center(self):
         raise Exception
     def get_orientation(self):
@@ -134,38 +139,57 @@ j2000GalacticReferenceFrame = CelestialReferenceFrame(right_asc=units.J2000_Gala
                                                       )
 
 class EquatorialReferenceFrame(RelativeReferenceFrame):
+    dynamic = True
     def get_orientation(self):
         rot = self.body.get_equatorial_rotation()
         return rot
 
 class SynchroneReferenceFrame(RelativeReferenceFrame):
+    dynamic = True
     def get_orientation(self):
         rot = self.body.get_sync_rotation()
         return rot
 
 class SurfaceReferenceFrame(RelativeReferenceFrame):
+    dynamic = True
     def __init__(self, long, lat):
         RelativeReferenceFrame.__init__(self)
         self.long = long
         self.lat = lat
+        self.cached_key = None
+        self.cached_center = None
+        self.cached_orientation = None
 
     def set_parent_body(self, body):
         self.body = body
         if self.body.primary is not None:
             self.body = self.body.primary
-
-    def get_center(self):
+        self.cached_key = None
+
+    def update_cache(self):
+        #The body creates new position and rotation objects when it is updated
+        key = (ReferenceFrame.generation, self.body.get_local_position(), self.body.get_sync_rotation())
+        if self.cached_key is not None and key[0] == self.cached_key[0] and key[1] is self.cached_key[1] and key[2] is self.cached_key[2]:
+            ReferenceFrame.nb_cache_hits += 1
+            return
+        ReferenceFrame.nb_cache_misses += 1
         (x, y, _) = self.body.spherical_to_xy((self.long, self.lat, None))
         distance = self.body.get_height_under_xy(x, y)
         position = self.body.spherical_to_frame_cartesian((self.long, self.lat, distance))
-        return self.body.get_local_position() + self.body.get_sync_rotation().xform(position)
-
-    def get_orientation(self):
-        (x, y, _) = self.body.spherical_to_xy((self.long, self.lat, None))
+        self.cached_center = self.body.get_local_position() + self.body.get_sync_rotation().xform(position)
         (normal, tangent, binormal) = self.body.get_normals_under_xy(x, y)
         rotation = LQuaterniond()
         look_at(rotation, normal, tangent)
-        return rotation * self.body.get_sync_rotation()
+        self.cached_orientation = rotation * self.body.get_sync_rotation()
+        self.cached_key = key
+
+    def get_center(self):
+        self.update_cache()
+        return self.cached_center
+
+    def get_orientation(self):
+        self.update_cache()
+        return self.cached_orientation
 
 class FramesDB(object):
     def __init__(self):
@@ -21,7 +21,12 @@ from __future__ import absolute_import
 
 try:
     from cosmonium_engine import kepler_pos
+    native_kepler = True
 except ImportError as e:
     print("WARNING: Could not load Kepler C implementation, fallback on python implementation")
     print("\t", e)
     from .pyastro.pykepler import kepler_pos
+    native_kepler = False
+
+#There is no batch solver in the C implementation, it is only worth using with the python fallback
+from .pyastro.pykepler import kepler_pos_array
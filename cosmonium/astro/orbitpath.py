@@ -0,0 +1,128 @@
+#
+#This file is part of Cosmonium.
+#
+#Copyright (C) 2018-2019 Laurent Deru.
+#
+#Cosmonium is free software: you can redistribute it and/or modify
+#it under the terms of the GNU General Public License as published by
+#the Free Software Foundation, either version 3 of the License, or
+#(at your option) any later version.
+#
+#Cosmonium is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#GNU General Public License for more details.
+#
+#You should have received a copy of the GNU General Public License
+#along with Cosmonium.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+from __future__ import print_function
+from __future__ import absolute_import
+
+from panda3d.core import LMatrix3d
+
+from .orbits import EllipticalOrbit
+from .kepler import kepler_pos_array
+
+from copy import copy
+import numpy
+
+def get_rotation_matrix(rotation):
+    """
+    Returns the matrix of the quaternion as a numpy array, to be applied on row vectors like Panda3D does.
+    """
+    matrix = LMatrix3d()
+    rotation.extract_to_matrix(matrix)
+    return numpy.array([[matrix.get_cell(i, j) for j in range(3)] for i in range(3)])
+
+def get_elements_key(orbit):
+    """
+    Returns a hashable key built from the elements of the orbit.
+    """
+    #The values kept from the last evaluations are not part of the orbit definition
+    elements = sorted((key, value) for (key, value) in vars(orbit).items()
+                      if isinstance(value, (int, float, str)) and not key.startswith(('cached_', 'batch_', 'last_')))
+    return (orbit.__class__.__name__, tuple(elements))
+
+def sample_orbit(orbit, times):
+    """
+    Returns the positions of the orbit in its frame at the given times as a (n, 3) array.
+    """
+    if type(orbit) is EllipticalOrbit:
+        mean_anomalies = (times - orbit.epoch) * orbit.mean_motion + orbit.mean_anomaly
+        positions = kepler_pos_array(numpy.full(len(times), orbit.pericenter_distance),
+                                     numpy.full(len(times), orbit.eccentricity),
+                                     mean_anomalies)
+        return positions.dot(get_rotation_matrix(orbit.rotation))
+    #Work on a copy, some orbits keep the last evaluation in the instance
+    orbit = copy(orbit)
+    positions = numpy.empty((len(times), 3))
+    for (i, time) in enumerate(times.tolist()):
+        position = orbit.get_frame_rotation_at(time).xform(orbit.get_frame_position_at(time))
+        positions[i] = (position[0], position[1], position[2])
+    return positions
+
+def elliptical_orbit_path(orbit, nb_points, oversampling=8):
+    """
+    Returns nb_points positions along the closed elliptical orbit, in its frame.
+    The points are sampled in eccentric anomaly with a density proportional to the square root of the
+    curvature, so that all the segments deviate by the same amount from the ellipse.
+    """
+    e = orbit.eccentricity
+    a = orbit.pericenter_distance / (1.0 - e)
+    b = a * numpy.sqrt(1.0 - e * e)
+    anomalies = numpy.linspace(0.0, 2 * numpy.pi, nb_points * oversampling + 1)
+    #With x = a cos(E), y = b sin(E), ds/dE = q and the curvature is a b / q**3
+    q = numpy.sqrt((a * numpy.sin(anomalies)) ** 2 + (b * numpy.cos(anomalies)) ** 2)
+    density = 1.0 / numpy.sqrt(q)
+    cumulative = numpy.concatenate([[0.0], numpy.cumsum((density[1:] + density[:-1]) / 2.0)])
+    targets = numpy.linspace(0.0, cumulative[-1], nb_points + 1)[:-1]
+    ecc_anom = numpy.interp(targets, cumulative, anomalies)
+    positions = numpy.zeros((nb_points, 3))
+    positions[:, 0] = a * (numpy.cos(ecc_anom) - e)
+    positions[:, 1] = b * numpy.sin(ecc_anom)
+    return positions.dot(get_rotation_matrix(orbit.rotation))
+
+def time_orbit_path(orbit, nb_points, time):
+    """
+    Returns nb_points positions of the orbit sampled uniformly in time, in its frame.
+    The periodic orbits are sampled over the last period, the other ones around their perihelion.
+    """
+    if orbit.is_periodic():
+        times = numpy.linspace(time - orbit.get_period(), time, nb_points)
+    else:
+        #TODO: Properly calculate orbit start and end time
+        perihelion = orbit.get_time_of_perihelion()
+        times = numpy.linspace(perihelion - orbit.get_period() * 5.0, perihelion + orbit.get_period() * 5.0, nb_points)
+    return sample_orbit(orbit, times)
+
+class OrbitPathCache(object):
+    """
+    Paths of the orbits in their frame, shared by all the orbits with the same elements.
+    Only the paths of the keplerian orbits, which do not depend on the time, are kept.
+    """
+    def __init__(self):
+        self.paths = {}
+
+    def get_path(self, orbit, nb_points, time):
+        """
+        Returns the path as a (n, 3) array and whether it is a closed loop.
+        """
+        closed = orbit.is_periodic()
+        if type(orbit) is not EllipticalOrbit:
+            return (time_orbit_path(orbit, nb_points, time), closed)
+        key = (get_elements_key(orbit), nb_points)
+        path = self.paths.get(key)
+        if path is None:
+            if closed:
+                path = elliptical_orbit_path(orbit, nb_points)
+            else:
+                path = time_orbit_path(orbit, nb_points, time)
+            self.paths[key] = path
+        return (path, closed)
+
+    def clear(self):
+        self.paths = {}
+
+orbitPathCache = OrbitPathCache()
@@ -26,25 +26,36 @@ from ..parameters import ParametersGroup, UserParameter, AutoUserParameter
 
 from . import units
 from .frame import J2000EclipticReferenceFrame, J2000EquatorialReferenceFrame
-from .kepler import kepler_pos
+from .kepler import kepler_pos, kepler_pos_array
 from .astro import calc_orientation
 
-from math import pi, asin, atan2
+from math import pi, asin, atan2, sqrt
+from operator import attrgetter
+import numpy
 
 class Orbit(object):
     dynamic = False
+    nb_cache_hits = 0
+    nb_cache_misses = 0
+    #Set when the positions can be replaced by a precomputed ephemeris, see ephemeris.py
+    ephemeris_manager = None
+    ephemeris_fit = False
     def __init__(self, frame=None):
         if frame is None:
             frame = J2000EclipticReferenceFrame()
         self.frame = frame
         self.origin = LPoint3d()
         self.body = None
+        self.cached_time = None
+        self.cached_position = None
+        self.ephemeris = None
 
     def get_user_parameters(self):
         return None
 
     def update_user_parameters(self):
-        pass
+        self.cached_time = None
+        self.ephemeris = None
 
     def set_frame(self, frame):
         self.frame = frame
@@ -71,7 +82,19 @@ class Orbit(object):
         return None
 
     def get_position_at(self, time):
-        return self.frame.get_local_position(self.get_frame_rotation_at(time).xform(self.get_frame_position_at(time)))
+        #Only the position in the frame is cached, the frame center can move during the same time
+        if time != self.cached_time:
+            Orbit.nb_cache_misses += 1
+            position = None
+            if Orbit.ephemeris_manager is not None and self.ephemeris_fit:
+                position = Orbit.ephemeris_manager.get_position_at(self, time)
+            if position is None:
+                position = self.get_frame_rotation_at(time).xform(self.get_frame_position_at(time))
+            self.cached_position = position
+            self.cached_time = time
+        else:
+            Orbit.nb_cache_hits += 1
+        return self.frame.get_local_position(self.cached_position)
 
     def get_rotation_at(self, time):
         return self.frame.get_abs_orientation(self.get_frame_rotation_at(time))
@@ -82,6 +105,12 @@ class Orbit(object):
     def get_apparent_radius(self):
         return 0.0
 
+    def get_max_speed(self):
+        """
+        Upper bound of the speed of the body in its frame, in km per day, or None if it can not be bounded.
+        """
+        return None
+
 class FixedPosition(Orbit):
     #TODO: Rename into something like GlobalFixedPosition
     def __init__(self, position=None, global_position=True,
@@ -139,6 +168,9 @@ class FixedPosition(Orbit):
     def get_apparent_radius(self):
         return self.position.length()
 
+    def get_max_speed(self):
+        return 0.0
+
     def get_global_position_at(self, time):
         return self.global_position
 
@@ -181,8 +213,14 @@ class FixedOrbit(Orbit):
     def get_frame_rotation_at(self, time):
         return self.rotation
 
+    def get_max_speed(self):
+        return 0.0
+
 class EllipticalOrbit(Orbit):
     dynamic = True
+    #Incremented when the elements of an orbit are modified, see EllipticalOrbitsBatch
+    generation = 0
+
     def __init__(self,
              pericenter_distance,
              period,
@@ -204,6 +242,8 @@ class EllipticalOrbit(Orbit):
         self.arg_of_periapsis = arg_of_periapsis * pi / 180
         self.mean_anomaly = mean_anomaly * pi / 180
         self.epoch = epoch
+        self.batch_time = None
+        self.batch_position = None
         self.update_rotation()
 
     def set_period(self, period):
@@ -212,6 +252,10 @@ class EllipticalOrbit(Orbit):
             self.mean_motion = 2 * pi / period
         else:
             self.mean_motion = 0
+        self.cached_time = None
+        self.batch_time = None
+        self.ephemeris = None
+        EllipticalOrbit.generation += 1
 
     def get_period(self):
         return self.period
@@ -239,7 +283,10 @@ class EllipticalOrbit(Orbit):
         return group
 
     def update_user_parameters(self):
+        Orbit.update_user_parameters(self)
+        self.batch_time = None
         self.update_rotation()
+        EllipticalOrbit.generation += 1
 
     def is_periodic(self):
         return self.eccentricity < 1.0
@@ -253,13 +300,56 @@ class EllipticalOrbit(Orbit):
     def get_apparent_radius(self):
         return abs(self.apocenter_distance)
 
+    def get_max_speed(self):
+        #The speed is the highest at the pericenter
+        if self.eccentricity == 1.0:
+            return None
+        return self.mean_motion * self.pericenter_distance * sqrt(1.0 + self.eccentricity) / abs(1.0 - self.eccentricity) ** 1.5
+
     def get_frame_position_at(self, time):
+        if time == self.batch_time:
+            return self.batch_position
         mean_anomaly = (time - self.epoch) * self.mean_motion + self.mean_anomaly
         return kepler_pos(self.pericenter_distance, self.eccentricity, mean_anomaly)
 
     def get_frame_rotation_at(self, time):
         return self.rotation
 
+orbit_elements_getter = attrgetter('epoch', 'mean_motion', 'mean_anomaly', 'pericenter_distance', 'eccentricity')
+
+class EllipticalOrbitsBatch(object):
+    """
+    Solve the Kepler equation of a subset of a list of orbits in one batch, the positions are kept in the orbits
+    and returned by get_frame_position_at() for the same time.
+    The elements of all the orbits are only collected again when one of them is modified.
+    """
+    def __init__(self, orbits):
+        self.orbits = orbits
+        self.generation = None
+
+    def update_elements(self):
+        self.elements = numpy.array(list(map(orbit_elements_getter, self.orbits)))
+        self.rows = dict((orbit, i) for (i, orbit) in enumerate(self.orbits))
+        self.generation = EllipticalOrbit.generation
+
+    def update(self, orbits, time):
+        """
+        Returns False if one of the given orbits is not part of the batch.
+        """
+        if self.generation != EllipticalOrbit.generation:
+            self.update_elements()
+        try:
+            rows = [self.rows[orbit] for orbit in orbits]
+        except KeyError:
+            return False
+        elements = self.elements[rows]
+        mean_anomalies = (time - elements[:, 0]) * elements[:, 1] + elements[:, 2]
+        positions = kepler_pos_array(elements[:, 3], elements[:, 4], mean_anomalies)
+        for (orbit, position) in zip(orbits, positions.tolist()):
+            orbit.batch_time = time
+            orbit.batch_position = LPoint3d(*position)
+        return True
+
 def create_elliptical_orbit(semi_major_axis=None,
                             semi_major_axis_units=units.AU,
                             pericenter_distance=None,
@@ -23,6 +23,7 @@ from __future__ import absolute_import
 from panda3d.core import LPoint3d
 
 from math import sqrt, cos, sin, fabs, pi, atan2, exp, log, fmod, atan, sinh, cosh
+import numpy
 
 THRESH = 1.0e-12
 MIN_THRESH = 1.0e-14
@@ -173,3 +174,167 @@ def kepler_pos(pericenter, ecc, mean_anom):
         x = a * (ecc - cosh(ecc_anom) )
         y = a * sqrt(ecc * ecc - 1) * sinh(ecc_anom)
         return LPoint3d(x, y, 0.0)
+
+def near_parabolic_array(ecc_anom, e):
+    anom2 = numpy.where(e > 1.0, ecc_anom * ecc_anom, -ecc_anom * ecc_anom)
+    term = e * anom2 * ecc_anom / 6.0
+    rval = (1.0 - e) * ecc_anom - term
+    active = numpy.fabs(term) > 1e-15
+    n = 4
+    while active.any():
+        term[active] *= anom2[active] / (n * (n + 1))
+        rval[active] -= term[active]
+        active &= numpy.fabs(term) > 1e-15
+        n += 2
+    return rval
+
+def kepler_elliptic_array(ecc, mean_anom):
+    """
+    Vectorized version of kepler_elliptic(), each element follows the same iterations as the scalar solver.
+    """
+    ecc = numpy.asarray(ecc, dtype=numpy.float64)
+    mean_anom = numpy.array(mean_anom, dtype=numpy.float64)
+    result = numpy.zeros(len(mean_anom))
+    offset = numpy.zeros(len(mean_anom))
+    valid = mean_anom != 0.0
+    wrap = (mean_anom < -pi) | (mean_anom > pi)
+    tmod = numpy.fmod(mean_anom[wrap], pi * 2.0)
+    tmod = numpy.where(tmod > pi, tmod - 2.0 * pi, numpy.where(tmod < -pi, tmod + 2.0 * pi, tmod))
+    offset[wrap] = mean_anom[wrap] - tmod
+    mean_anom[wrap] = tmod
+
+    low = valid & (ecc < 0.9)
+    if low.any():
+        e = ecc[low]
+        m = mean_anom[low]
+        curr = numpy.arctan2(numpy.sin(m), numpy.cos(m) - e)
+        active = numpy.ones(len(curr), dtype=numpy.bool_)
+        #All the elements are iterated together, the converged ones are left unchanged
+        while active.any():
+            err = (curr - e * numpy.sin(curr) - m) / (1.0 - e * numpy.cos(curr))
+            curr = numpy.where(active, curr - err, curr)
+            active &= numpy.fabs(err) > THRESH
+        result[low] = curr + offset[low]
+
+    high = valid & (ecc >= 0.9)
+    if high.any():
+        e = ecc[high]
+        m = mean_anom[high]
+        is_negative = m < 0.0
+        m = numpy.fabs(m)
+        curr = m.copy()
+        thresh = numpy.maximum(THRESH * numpy.fabs(1.0 - e), MIN_THRESH)
+        close = (e > 0.8) & (m < pi / 3.0)
+        with numpy.errstate(divide='ignore'):
+            trial = m / numpy.fabs(1.0 - e)
+            trial = numpy.where(trial * trial > 6.0 * numpy.fabs(1.0 - e), numpy.exp(numpy.log(6.0 * m) / 3.0), trial)
+        curr[close] = trial[close]
+        thresh[close] = numpy.minimum(thresh[close], THRESH)
+        delta_curr = numpy.ones(len(curr))
+        n_iter = 0
+        while n_iter < MAX_ITERATIONS:
+            active = numpy.fabs(delta_curr) > thresh
+            if not active.any(): break
+            if n_iter > MAX_DEFAULT_ITERATIONS:
+                err = near_parabolic_array(curr, e) - m
+            else:
+                err = curr - e * numpy.sin(curr) - m
+            delta_curr = numpy.where(active, -err / (1.0 - e * numpy.cos(curr)), 0.0)
+            curr += delta_curr
+            n_iter += 1
+        result[high] = numpy.where(is_negative, offset[high] - curr, offset[high] + curr)
+    return result
+
+def kepler_parabolic_array(mean_anom):
+    a = 3.0 / (2 * sqrt(2)) * numpy.asarray(mean_anom, dtype=numpy.float64)
+    b = numpy.exp(numpy.log(a + numpy.sqrt(a * a + 1)) / 3.0)
+    return 2 * numpy.arctan(b - 1 / b)
+
+def kepler_hyperbolic_array(ecc, mean_anom):
+    """
+    Vectorized version of kepler_hyperbolic(), each element follows the same iterations as the scalar solver.
+    """
+    ecc = numpy.asarray(ecc, dtype=numpy.float64)
+    mean_anom = numpy.asarray(mean_anom, dtype=numpy.float64)
+    result = numpy.zeros(len(mean_anom))
+    valid = mean_anom != 0.0
+    if not valid.any():
+        return result
+    e = ecc[valid]
+    m = mean_anom[valid]
+    is_negative = m < 0.0
+    m = numpy.fabs(m)
+    thresh = numpy.maximum(THRESH * numpy.fabs(1.0 - e), MIN_THRESH)
+    far = m / e > 3.0
+    trial = m / numpy.fabs(1.0 - e)
+    trial = numpy.where(trial * trial > 6. * numpy.fabs(1.0 - e), numpy.exp(numpy.log(6. * m) / 3.0), trial)
+    curr = numpy.where(far, numpy.log(numpy.where(far, m / e, 1.0)) + 0.85, trial)
+    thresh[~far] = numpy.minimum(thresh[~far], THRESH)
+    delta_curr = numpy.ones(len(curr))
+    n_iter = 0
+    near = e < 1.01
+    while n_iter < MAX_ITERATIONS:
+        active = numpy.fabs(delta_curr) > thresh
+        if not active.any(): break
+        err = e * numpy.sinh(curr) - curr - m
+        if n_iter > MAX_DEFAULT_ITERATIONS:
+            parabolic = active & near
+            if parabolic.any():
+                err[parabolic] = -near_parabolic_array(curr[parabolic], e[parabolic]) - m[parabolic]
+        delta_curr = numpy.where(active, -err / (e * numpy.cosh(curr) - 1.0), 0.0)
+        curr += delta_curr
+        n_iter += 1
+    result[valid] = numpy.where(is_negative, -curr, curr)
+    return result
+
+def kepler_pos_array(pericenter, ecc, mean_anom):
+    """
+    Batch version of kepler_pos(), returns the positions in the orbit plane as a (n, 3) array.
+    """
+    pericenter = numpy.asarray(pericenter, dtype=numpy.float64)
+    ecc = numpy.asarray(ecc, dtype=numpy.float64)
+    mean_anom = numpy.asarray(mean_anom, dtype=numpy.float64)
+    positions = numpy.zeros((len(ecc), 3))
+    elliptic = ecc < 1.0
+    if elliptic.any():
+        e = ecc[elliptic]
+        ecc_anom = kepler_elliptic_array(e, mean_anom[elliptic])
+        a = pericenter[elliptic] / (1.0 - e)
+        positions[elliptic, 0] = a * (numpy.cos(ecc_anom) - e)
+        positions[elliptic, 1] = a * numpy.sqrt(1 - e * e) * numpy.sin(ecc_anom)
+    parabolic = ecc == 1.0
+    if parabolic.any():
+        true_anom = kepler_parabolic_array(mean_anom[parabolic])
+        r = 2 * pericenter[parabolic] / (1 + numpy.cos(true_anom))
+        positions[parabolic, 0] = r * numpy.cos(true_anom)
+        positions[parabolic, 1] = r * numpy.sin(true_anom)
+    hyperbolic = ecc > 1.0
+    if hyperbolic.any():
+        e = ecc[hyperbolic]
+        ecc_anom = kepler_hyperbolic_array(e, mean_anom[hyperbolic])
+        a = pericenter[hyperbolic] / (e - 1.0)
+        positions[hyperbolic, 0] = a * (e - numpy.cosh(ecc_anom))
+        positions[hyperbolic, 1] = a * numpy.sqrt(e * e - 1) * numpy.sinh(ecc_anom)
+    return positions
+
+if __name__ == '__main__':
+    #Check the batch solver against the scalar solver and compare their speed
+    from random import seed, uniform
+    from time import time
+
+    seed(0)
+    for (name, min_ecc, max_ecc) in (('elliptic', 0.0, 0.9), ('high eccentricity', 0.9, 0.9999),
+                                     ('parabolic', 1.0, 1.0), ('hyperbolic', 1.0001, 3.0)):
+        nb_orbits = 10000
+        pericenters = numpy.array([uniform(0.1, 10.0) for i in range(nb_orbits)])
+        eccs = numpy.array([uniform(min_ecc, max_ecc) for i in range(nb_orbits)])
+        anomalies = numpy.array([uniform(-20.0, 20.0) for i in range(nb_orbits)])
+        start = time()
+        reference = [kepler_pos(pericenter, ecc, anomaly) for (pericenter, ecc, anomaly) in zip(pericenters.tolist(), eccs.tolist(), anomalies.tolist())]
+        scalar_time = time() - start
+        start = time()
+        positions = kepler_pos_array(pericenters, eccs, anomalies)
+        batch_time = time() - start
+        reference = numpy.array([(position[0], position[1], position[2]) for position in reference])
+        error = numpy.max(numpy.fabs(positions - reference) / numpy.maximum(numpy.fabs(reference), 1.0))
+        print("%s: scalar %.1fms, batch %.1fms, max relative error %g" % (name, scalar_time * 1000, batch_time * 1000, error))
@@ -28,7 +28,9 @@ from .frame import J2000EquatorialReferenceFrame
 from .astro import calc_orientation_from_incl_an
 from . import units
 
-from math import asin, atan2, pi
+from operator import attrgetter
+from math import asin, atan2, pi, cos, sin
+import numpy
 
 class ReferenceAxisBase(object):
     def get_user_parameters(self):
@@ -95,14 +97,21 @@ class EquatorialReferenceAxis(ReferenceAxisBase):
 
 class Rotation(object):
     dynamic = False
+    nb_cache_hits = 0
+    nb_cache_misses = 0
     def __init__(self, frame):
         self.frame = frame
+        self.cached_time = None
+        self.cached_rotation = None
+        self.cached_equatorial_time = None
+        self.cached_equatorial = None
 
     def get_user_parameters(self):
         return None
 
     def update_user_parameters(self):
-        pass
+        self.cached_time = None
+        self.cached_equatorial_time = None
 
     def set_frame(self, frame):
         self.frame = frame
@@ -111,13 +120,25 @@ class Rotation(object):
         return None
 
     def get_equatorial_orientation_at(self, time):
-        return self.frame.get_abs_orientation(self.get_frame_equatorial_orientation_at(time))
+        if time != self.cached_equatorial_time:
+            Rotation.nb_cache_misses += 1
+            self.cached_equatorial = self.get_frame_equatorial_orientation_at(time)
+            self.cached_equatorial_time = time
+        else:
+            Rotation.nb_cache_hits += 1
+        return self.frame.get_abs_orientation(self.cached_equatorial)
 
     def get_frame_rotation_at(self, time):
         return None
 
     def get_rotation_at(self, time):
-        return self.frame.get_abs_orientation(self.get_frame_rotation_at(time))
+        if time != self.cached_time:
+            Rotation.nb_cache_misses += 1
+            self.cached_rotation = self.get_frame_rotation_at(time)
+            self.cached_time = time
+        else:
+            Rotation.nb_cache_hits += 1
+        return self.frame.get_abs_orientation(self.cached_rotation)
 
 class FixedRotation(Rotation):
     def __init__(self, reference_axis, frame):
@@ -132,6 +153,7 @@ class FixedRotation(Rotation):
         return group
 
     def update_user_parameters(self):
+        Rotation.update_user_parameters(self)
         self.reference_axis.update_user_parameters()
 
     def get_frame_equatorial_orientation_at(self, time):
@@ -155,18 +177,54 @@ class UnknownRotation(FixedRotation):
     def __init__(self):
         FixedRotation.__init__(self, ReferenceAxis(LQuaterniond()), J2000EquatorialReferenceFrame())
 
-class UniformRotation(FixedRotation):
+class AxisRotation(FixedRotation):
+    """
+    Base class of the rotations around the axis of the reference axis, the constant equatorial orientation is
+    kept so that only the rotation around the axis is calculated for each time.
+    """
     dynamic = True
+    #Incremented when the elements of any axis rotation change, to invalidate the batches
+    generation = 0
+    def __init__(self, reference_axis, meridian_angle, epoch, frame):
+        FixedRotation.__init__(self, reference_axis, frame)
+        self.epoch = epoch
+        self.meridian_angle = meridian_angle
+        self.batch_time = None
+        self.batch_rotation = None
+        self.update_equatorial()
+
+    def update_equatorial(self):
+        self.equatorial = self.reference_axis.get_rotation_at(self.epoch)
+        self.batch_time = None
+        AxisRotation.generation += 1
+
+    def update_user_parameters(self):
+        FixedRotation.update_user_parameters(self)
+        #The epoch or the meridian angle could have been modified too
+        self.update_equatorial()
+
+    def get_mean_motion(self):
+        return 0.0
+
+    def get_frame_equatorial_orientation_at(self, time):
+        return self.equatorial
+
+    def get_frame_rotation_at(self, time):
+        if time == self.batch_time:
+            return self.batch_rotation
+        half_angle = ((time - self.epoch) * self.get_mean_motion() + self.meridian_angle) / 2
+        local = LQuaterniond(cos(half_angle), 0.0, 0.0, sin(half_angle))
+        return local * self.equatorial
+
+class UniformRotation(AxisRotation):
     def __init__(self,
                  period,
                  reference_axis,
                  meridian_angle,
                  epoch,
                  frame):
-        FixedRotation.__init__(self, reference_axis, frame)
         self.set_period(period)
-        self.epoch = epoch
-        self.meridian_angle = meridian_angle
+        AxisRotation.__init__(self, reference_axis, meridian_angle, epoch, frame)
 
     def set_period(self, period):
         self.period = period
@@ -174,10 +232,16 @@ class UniformRotation(FixedRotation):
             self.mean_motion = 2 * pi / period
         else:
             self.mean_motion = 0
+        self.cached_time = None
+        self.batch_time = None
+        AxisRotation.generation += 1
 
     def get_period(self):
         return self.period
 
+    def get_mean_motion(self):
+        return self.mean_motion
+
     def get_user_parameters(self):
         group = FixedRotation.get_user_parameters(self)
         group.add_parameter(UserParameter("Period", self.set_period, self.get_period, UserParameter.TYPE_FLOAT))
@@ -185,22 +249,16 @@ class UniformRotation(FixedRotation):
         group.add_parameter(AutoUserParameter("Epoch", 'epoch', self, UserParameter.TYPE_FLOAT))
         return group
 
-    def get_frame_rotation_at(self, time):
-        angle = (time - self.epoch) * self.mean_motion + self.meridian_angle
-        local = LQuaterniond()
-        local.setFromAxisAngleRad(angle, LVector3d.unitZ())
-        rotation = local * self.get_frame_equatorial_orientation_at(time)
-        return rotation
-
-class SynchronousRotation(FixedRotation):
+class SynchronousRotation(AxisRotation):
     def __init__(self,
                  reference_axis,
                  meridian_angle,
                  epoch,
                  frame=None):
-        FixedRotation.__init__(self, reference_axis, frame)
-        self.epoch = epoch
-        self.meridian_angle = meridian_angle * pi / 180
+        AxisRotation.__init__(self, reference_axis, meridian_angle * pi / 180, epoch, frame)
+
+    def get_mean_motion(self):
+        return self.body.orbit.get_mean_motion()
 
     def get_user_parameters(self):
         group = FixedRotation.get_user_parameters(self)
@@ -208,12 +266,58 @@ class SynchronousRotation(FixedRotation):
         group.add_parameter(AutoUserParameter("Epoch", 'epoch', self, UserParameter.TYPE_FLOAT))
         return group
 
-    def get_frame_rotation_at(self, time):
-        angle = (time - self.epoch) * self.body.orbit.get_mean_motion() + self.meridian_angle
-        local = LQuaterniond()
-        local.setFromAxisAngleRad(angle, LVector3d.unitZ())
-        rotation = local * self.get_frame_equatorial_orientation_at(time)
-        return rotation
+def calc_axis_rotations(angles, equatorials):
+    """
+    Returns the rotations of the given angles around the Z axis followed by the equatorial orientations,
+    the orientations and the result are (n, 4) arrays of quaternions in the (r, i, j, k) order.
+    """
+    half_angles = angles / 2
+    c = numpy.cos(half_angles)
+    s = numpy.sin(half_angles)
+    (w, x, y, z) = equatorials.T
+    return numpy.stack((w * c - z * s, x * c + y * s, y * c - x * s, z * c + w * s), axis=1)
+
+axis_rotation_getter = attrgetter('epoch', 'meridian_angle')
+
+class AxisRotationsBatch(object):
+    """
+    Calculate the rotations of a subset of a list of axis rotations in one batch, the orientations are kept in the
+    rotations and returned by get_frame_rotation_at() for the same time.
+    The elements of all the rotations are only collected again when one of them is modified.
+    """
+    def __init__(self, rotations):
+        self.rotations = rotations
+        self.generation = None
+
+    def update_elements(self):
+        rotations = self.rotations
+        elements = numpy.array(list(map(axis_rotation_getter, rotations)))
+        self.epochs = elements[:, 0]
+        self.meridian_angles = elements[:, 1]
+        self.equatorials = numpy.array([(q[0], q[1], q[2], q[3]) for q in (rotation.equatorial for rotation in rotations)])
+        self.mean_motions = numpy.array([rotation.get_mean_motion() for rotation in rotations])
+        self.rows = dict((rotation, i) for (i, rotation) in enumerate(rotations))
+        self.generation = AxisRotation.generation
+
+    def update(self, rotations, time):
+        """
+        Returns False if one of the given rotations is not part of the batch.
+        """
+        if self.generation != AxisRotation.generation:
+            self.update_elements()
+        try:
+            rows = [self.rows[rotation] for rotation in rotations]
+        except KeyError:
+            return False
+        #The mean motion of the synchronous rotations follows the orbit and is collected for each update
+        mean_motions = numpy.array([rotation.get_mean_motion() if isinstance(rotation, SynchronousRotation) else mean_motion
+                                    for (rotation, mean_motion) in zip(rotations, self.mean_motions[rows].tolist())])
+        angles = (time - self.epochs[rows]) * mean_motions + self.meridian_angles[rows]
+        quaternions = calc_axis_rotations(angles, self.equatorials[rows])
+        for (rotation, quaternion) in zip(rotations, quaternions.tolist()):
+            rotation.batch_time = time
+            rotation.batch_rotation = LQuaterniond(*quaternion)
+        return True
 
 def create_fixed_rotation(
              inclination=0.0, inclination_units=units.Deg,
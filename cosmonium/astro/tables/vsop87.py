@@ -21,5 +21,27 @@ from __future__ import print_function
 from __future__ import absolute_import
 
 from ..elementsdb import orbit_elements_db
+from ..vsop87 import VSOP87Orbit
+from ..frame import J2000EclipticReferenceFrame
+from ...dircontext import defaultDirContext
+from .. import units
+
+import os
+
+#File of the VSOP87 version B series, sidereal period and aphelion distance of the planets
+vsop87_planets = {
+    'mercury': ('VSOP87B.mer', 87.9691 * units.Day, 0.4667 * units.AU),
+    'venus': ('VSOP87B.ven', 224.701 * units.Day, 0.7282 * units.AU),
+    'earth': ('VSOP87B.ear', 365.256363 * units.Day, 1.0167 * units.AU),
+    'mars': ('VSOP87B.mar', 686.980 * units.Day, 1.6660 * units.AU),
+    'jupiter': ('VSOP87B.jup', 4332.59 * units.Day, 5.4588 * units.AU),
+    'saturn': ('VSOP87B.sat', 10759.22 * units.Day, 10.1238 * units.AU),
+    'uranus': ('VSOP87B.ura', 30688.5 * units.Day, 20.0965 * units.AU),
+    'neptune': ('VSOP87B.nep', 60182.0 * units.Day, 30.3300 * units.AU),
+    }
 
 orbit_elements_db.register_category('vsop87', 100)
+#Only the planets whose series are available are registered, the others use the lower priority elements
+for (element_name, (filename, period, radius)) in vsop87_planets.items():
+    if defaultDirContext.find_data(os.path.join('vsop87', filename)) is not None:
+        orbit_elements_db.register_element('vsop87', element_name, VSOP87Orbit(filename, period, radius, J2000EclipticReferenceFrame()))
@@ -0,0 +1,212 @@
+#
+#This file is part of Cosmonium.
+#
+#Copyright (C) 2018-2019 Laurent Deru.
+#
+#Cosmonium is free software: you can redistribute it and/or modify
+#it under the terms of the GNU General Public License as published by
+#the Free Software Foundation, either version 3 of the License, or
+#(at your option) any later version.
+#
+#Cosmonium is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#GNU General Public License for more details.
+#
+#You should have received a copy of the GNU General Public License
+#along with Cosmonium.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+from __future__ import print_function
+from __future__ import absolute_import
+
+from panda3d.core import LPoint3d, LQuaterniond
+
+from .orbits import Orbit
+from . import units
+from ..dircontext import defaultDirContext
+from ..cache import create_path_for, is_cache_valid, save_arrays, map_arrays
+from .. import settings
+
+from math import cos, sin
+import numpy
+import os
+
+class VSOP87Series(object):
+    """
+    Terms of a VSOP87 file, all the series are stored in flat arrays.
+    Each segment [starts[i], starts[i+1]) holds the terms of the coordinate variables[i] multiplied by T**powers[i].
+    """
+    version = 1
+
+    def __init__(self, amplitudes, phases, frequencies, starts, variables, powers):
+        self.amplitudes = numpy.asarray(amplitudes, dtype=numpy.float64)
+        self.phases = numpy.asarray(phases, dtype=numpy.float64)
+        self.frequencies = numpy.asarray(frequencies, dtype=numpy.float64)
+        self.starts = numpy.asarray(starts, dtype=numpy.int64)
+        self.variables = numpy.asarray(variables, dtype=numpy.int64)
+        self.powers = numpy.asarray(powers, dtype=numpy.float64)
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        return cls(arrays['amplitudes'], arrays['phases'], arrays['frequencies'],
+                   arrays['starts'], arrays['variables'], arrays['powers'])
+
+    def get_arrays(self):
+        return [('amplitudes', self.amplitudes),
+                ('phases', self.phases),
+                ('frequencies', self.frequencies),
+                ('starts', self.starts),
+                ('variables', self.variables),
+                ('powers', self.powers)]
+
+    def get_nb_terms(self):
+        return len(self.amplitudes)
+
+    def truncate(self, precision):
+        """
+        Returns a copy of the series without the terms whose amplitude is below the given precision.
+        """
+        if precision <= 0.0:
+            return self
+        keep = numpy.fabs(self.amplitudes) >= precision
+        counts = numpy.add.reduceat(keep.astype(numpy.int64), self.starts)
+        #Empty segments are dropped as reduceat() can not handle them
+        segments = counts > 0
+        counts = counts[segments]
+        starts = numpy.cumsum(counts) - counts
+        return VSOP87Series(self.amplitudes[keep], self.phases[keep], self.frequencies[keep],
+                            starts, self.variables[segments], self.powers[segments])
+
+    def evaluate(self, t):
+        """
+        Returns the three coordinates at the time t, expressed in Julian millennia since J2000.
+        """
+        terms = self.amplitudes * numpy.cos(self.phases + self.frequencies * t)
+        values = numpy.add.reduceat(terms, self.starts) * numpy.power(t, self.powers)
+        return numpy.bincount(self.variables, weights=values, minlength=3)
+
+def parse_vsop87(filepath):
+    """
+    Parse a VSOP87 file in the original text format, each series starts with a header line.
+    """
+    amplitudes = []
+    phases = []
+    frequencies = []
+    starts = []
+    variables = []
+    powers = []
+    try:
+        with open(filepath, 'r') as f:
+            for line in f:
+                if line.startswith(' VSOP87'):
+                    tokens = line.split()
+                    variables.append(int(tokens[5]) - 1)
+                    powers.append(int(tokens[7].split('**')[1]))
+                    starts.append(len(amplitudes))
+                else:
+                    tokens = line.split()
+                    if len(tokens) < 3: continue
+                    amplitudes.append(float(tokens[-3]))
+                    phases.append(float(tokens[-2]))
+                    frequencies.append(float(tokens[-1]))
+    except (IOError, ValueError, IndexError) as e:
+        print("Could not parse", filepath, ':', e)
+        return None
+    if len(amplitudes) == 0:
+        print("No terms found in", filepath)
+        return None
+    #Drop the series without terms
+    ends = starts[1:] + [len(amplitudes)]
+    segments = [i for i in range(len(starts)) if ends[i] > starts[i]]
+    return VSOP87Series(amplitudes, phases, frequencies,
+                        [starts[i] for i in segments], [variables[i] for i in segments], [powers[i] for i in segments])
+
+def load_vsop87(filename, context=defaultDirContext):
+    filepath = context.find_data(os.path.join('vsop87', filename))
+    if filepath is None:
+        print("File not found", filename)
+        return None
+    series = None
+    cache_file = os.path.join(create_path_for('vsop87'), filename + '.dat')
+    if settings.cache_vsop87 and is_cache_valid(cache_file, filepath):
+        arrays = map_arrays(cache_file, VSOP87Series.version)
+        if arrays is not None:
+            try:
+                series = VSOP87Series.from_arrays(arrays)
+            except KeyError as e:
+                print("Invalid VSOP87 cache", cache_file, ':', e)
+    if series is None:
+        print("Loading", filepath)
+        series = parse_vsop87(filepath)
+        if series is not None and settings.cache_vsop87:
+            save_arrays(cache_file, series.get_arrays(), VSOP87Series.version)
+    return series
+
+vsop87_series = {}
+
+def get_vsop87_series(filename, precision):
+    """
+    Returns the series truncated to the given precision, the series are shared by all the orbits.
+    """
+    key = (filename, precision)
+    if key not in vsop87_series:
+        full = vsop87_series.get((filename, 0.0))
+        if full is None:
+            full = load_vsop87(filename)
+            vsop87_series[(filename, 0.0)] = full
+        if full is not None:
+            vsop87_series[key] = full.truncate(precision)
+            print("VSOP87", filename, ':', vsop87_series[key].get_nb_terms(), "terms out of", full.get_nb_terms())
+        else:
+            vsop87_series[key] = None
+    return vsop87_series[key]
+
+class VSOP87Orbit(Orbit):
+    """
+    Heliocentric orbit using the VSOP87 version B series, spherical coordinates in the J2000 ecliptic frame.
+    """
+    dynamic = True
+    ephemeris_fit = True
+    def __init__(self, filename, period, radius, frame=None):
+        Orbit.__init__(self, frame)
+        self.filename = filename
+        self.period = period
+        self.radius = radius
+        self.rotation = LQuaterniond()
+        self.last_time = None
+        self.last_position = None
+
+    def is_periodic(self):
+        return True
+
+    def get_period(self):
+        return self.period
+
+    def get_mean_motion(self):
+        return 2 * numpy.pi / self.period
+
+    def get_time_of_perihelion(self):
+        return units.J2000
+
+    def get_apparent_radius(self):
+        return self.radius
+
+    def get_max_speed(self):
+        #Mean speed at the aphelion distance, with a margin for the eccentricity of Mercury
+        return 1.5 * 2 * numpy.pi * self.radius / self.period
+
+    def get_frame_position_at(self, time):
+        if time == self.last_time:
+            return self.last_position
+        series = get_vsop87_series(self.filename, settings.vsop87_precision)
+        if series is None:
+            return LPoint3d()
+        (l, b, r) = series.evaluate((time - units.J2000) / (units.JYear * 1000)).tolist()
+        r *= units.AU
+        self.last_position = LPoint3d(r * cos(b) * cos(l), r * cos(b) * sin(l), r * sin(b))
+        self.last_time = time
+        return self.last_position
+
+    def get_frame_rotation_at(self, time):
+        return self.rotation
@@ -22,8 +22,17 @@ from __future__ import absolute_import
 
 from . import settings
 
+import numpy
+import struct
+import mmap
 import os
 
+arrays_magic = b'COSMARR2'
+#Magic, version, number of arrays and key of the content, see save_arrays()
+arrays_header_fmt = '<8sII16s'
+arrays_entry_fmt = '<16s8sqqq'
+arrays_alignment = 16
+
 def init_cache():
     print("Cache directory:", settings.cache_dir)
 
@@ -32,3 +41,87 @@ def create_path_for(*path):
     if not os.path.isdir(final_path):
         os.makedirs(final_path)
     return final_path
+
+def is_cache_valid(cache_file, *sources):
+    """
+    The cache file is valid if it is more recent than all the sources.
+    """
+    if not os.path.exists(cache_file):
+        return False
+    cache_timestamp = os.path.getmtime(cache_file)
+    for source in sources:
+        if source is not None and os.path.getmtime(source) >= cache_timestamp:
+            return False
+    return True
+
+def align_offset(offset):
+    return (offset + arrays_alignment - 1) // arrays_alignment * arrays_alignment
+
+def save_arrays(filepath, arrays, version=0, key=b''):
+    """
+    Store a list of (name, array) in a file that can be mapped back with map_arrays().
+    Each array is stored as a raw aligned section, 2D arrays keep their number of columns.
+    The key, up to 16 bytes, identifies the content when the file name does not.
+    """
+    entries = []
+    offset = align_offset(struct.calcsize(arrays_header_fmt) + len(arrays) * struct.calcsize(arrays_entry_fmt))
+    for (name, array) in arrays:
+        array = numpy.ascontiguousarray(array)
+        columns = array.shape[1] if array.ndim > 1 else 0
+        entries.append((name, array, offset, columns))
+        offset = align_offset(offset + array.nbytes)
+    try:
+        with open(filepath, 'wb') as f:
+            f.write(struct.pack(arrays_header_fmt, arrays_magic, version, len(entries), key))
+            for (name, array, offset, columns) in entries:
+                f.write(struct.pack(arrays_entry_fmt, name.encode('ascii'), array.dtype.str.encode('ascii'), offset, array.shape[0], columns))
+            for (name, array, offset, columns) in entries:
+                f.seek(offset)
+                f.write(array.tobytes())
+            f.truncate(align_offset(f.tell()))
+    except IOError as e:
+        print("Could not write cache", filepath, ':', e)
+        return False
+    return True
+
+def read_arrays_key(filepath):
+    """
+    Returns the key stored by save_arrays() in the header of the file, or None if the file can not be read.
+    """
+    try:
+        with open(filepath, 'rb') as f:
+            header = f.read(struct.calcsize(arrays_header_fmt))
+        magic, file_version, nb_entries, key = struct.unpack(arrays_header_fmt, header)
+    except (IOError, struct.error):
+        return None
+    if magic != arrays_magic:
+        return None
+    return key
+
+def map_arrays(filepath, version=0):
+    """
+    Map the arrays stored by save_arrays() in memory, the pages are only read when accessed.
+    Returns a dict of arrays or None if the file is invalid.
+    """
+    try:
+        with open(filepath, 'rb') as f:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        header_size = struct.calcsize(arrays_header_fmt)
+        entry_size = struct.calcsize(arrays_entry_fmt)
+        magic, file_version, nb_entries, key = struct.unpack_from(arrays_header_fmt, data)
+        if magic != arrays_magic or file_version != version:
+            print("Invalid or outdated cache", filepath)
+            return None
+        arrays = {}
+        for i in range(nb_entries):
+            name, dtype, offset, rows, columns = struct.unpack_from(arrays_entry_fmt, data, header_size + i * entry_size)
+            dtype = numpy.dtype(dtype.rstrip(b'\0').decode('ascii'))
+            count = rows * columns if columns > 0 else rows
+            array = numpy.frombuffer(data, dtype=dtype, count=count, offset=offset)
+            if columns > 0:
+                array = array.reshape(rows, columns)
+            arrays[name.rstrip(b'\0').decode('ascii')] = array
+    except (IOError, ValueError, struct.error) as e:
+        print("Could not read cache", filepath, ':', e)
+        return None
+    return arrays
@@ -45,6 +45,10 @@ class GlobalObjectsDB(object):
     def __init__(self):
         self.db = {}
         self.oids = []
+        self.catalogs = []
+
+    def add_catalog(self, catalog):
+        self.catalogs.append(catalog)
 
     def add(self, body):
         body.oid = len(self.oids)
@@ -54,7 +58,12 @@ class GlobalObjectsDB(object):
             self.db[name.upper()] = body
 
     def get(self, name):
-        return self.db.get(name.upper(), None)
+        body = self.db.get(name.upper(), None)
+        if body is None:
+            for catalog in self.catalogs:
+                body = catalog.get(name)
+                if body is not None: break
+        return body
 
     def get_oid(self, oid):
         if oid < len(self.oids):
@@ -66,6 +75,8 @@ class GlobalObjectsDB(object):
         for name in body.names:
             self.db.pop(name.upper(), None)
         self.oids[body.oid] = None
+        for catalog in self.catalogs:
+            catalog.remove(body)
 
     def startswith(self, text):
         text = text.upper()
@@ -73,6 +84,18 @@ class GlobalObjectsDB(object):
         for (key, value) in self.db.items():
             if key.startswith(text):
                 result.append((value.get_exact_name(key), value))
+        for catalog in self.catalogs:
+            if getattr(catalog, 'lazy_completion', False):
+                #The entries are returned as is, the body is only created if the entry is selected
+                for (name, entry) in catalog.names_startswith(text):
+                    if name.upper() not in self.db:
+                        result.append((name, entry))
+                continue
+            for key in catalog.names_startswith(text):
+                if key in self.db: continue
+                body = catalog.get(key)
+                if body is not None:
+                    result.append((body.get_exact_name(key), body))
         return result
 
 objectsDB = GlobalObjectsDB()
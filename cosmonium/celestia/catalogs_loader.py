@@ -0,0 +1,119 @@
+#
+#This file is part of Cosmonium.
+#
+#Copyright (C) 2018-2019 Laurent Deru.
+#
+#Cosmonium is free software: you can redistribute it and/or modify
+#it under the terms of the GNU General Public License as published by
+#the Free Software Foundation, either version 3 of the License, or
+#(at your option) any later version.
+#
+#Cosmonium is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#GNU General Public License for more details.
+#
+#You should have received a copy of the GNU General Public License
+#along with Cosmonium.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+from __future__ import print_function
+from __future__ import absolute_import
+
+from ..dircontext import defaultDirContext
+
+from . import config_parser
+from . import star_parser
+from . import stc_parser
+from . import ssc_parser
+
+from time import time
+
+def find_files(filenames, context):
+    filepaths = []
+    for filename in filenames:
+        filepath = context.find_data(filename)
+        if filepath is not None:
+            filepaths.append(filepath)
+        else:
+            print("File not found", filename)
+    return filepaths
+
+class CatalogsJobs(object):
+    """
+    The files of the catalogs and the parse jobs submitted for them, the job of a file is None when its content
+    is taken from the cache in the loader thread.
+    """
+    def __init__(self):
+        self.stars_filename = None
+        self.stars_path = None
+        self.names_path = None
+        self.names_job = None
+        self.records_job = None
+        self.stc_jobs = []
+        self.ssc_jobs = []
+
+def submit_catalogs(parser, stars_filename, names_filename, stc_filenames, ssc_filenames, context=defaultDirContext):
+    """
+    Locate the star catalog and the STC and SSC files and submit those that are not cached to the given
+    ParallelParser. Returns the CatalogsJobs to give to load_catalogs() once the parser is started.
+    """
+    jobs = CatalogsJobs()
+    if stars_filename is not None:
+        jobs.stars_filename = stars_filename
+        jobs.stars_path = context.find_data(stars_filename)
+        if jobs.stars_path is None:
+            print("File not found", stars_filename)
+        jobs.names_path = context.find_data(names_filename) if names_filename is not None else None
+        catalog_cached = jobs.stars_path is not None and star_parser.is_catalog_cached(jobs.stars_path, jobs.names_path)
+        if jobs.names_path is not None and not catalog_cached:
+            jobs.names_job = parser.submit(jobs.names_path, star_parser.read_names, jobs.names_path)
+        if jobs.stars_path is not None and stars_filename.endswith('.dat') and not catalog_cached:
+            jobs.records_job = parser.submit(jobs.stars_path, star_parser.read_bin, jobs.stars_path)
+    for (filenames, file_jobs) in ((stc_filenames, jobs.stc_jobs), (ssc_filenames, jobs.ssc_jobs)):
+        for filepath in find_files(filenames, context):
+            if config_parser.is_cached(filepath):
+                job = None
+            else:
+                job = parser.submit(filepath, config_parser.load_items, filepath)
+            file_jobs.append((filepath, job))
+    return jobs
+
+def get_items(parser, filepath, job):
+    if job is None:
+        return config_parser.parse_file(filepath)
+    else:
+        return parser.get_result(job)
+
+def load_catalogs(parser, jobs, universe):
+    """
+    Instantiate the content of the catalogs submitted by submit_catalogs() in this thread, in dependency order:
+    the star catalog, then the STC stars and barycenters and finally the SSC bodies. The files still to parse
+    are parsed in parallel by the parser, which is shut down once all the files are loaded.
+    """
+    start = time()
+    try:
+        if jobs.stars_path is not None:
+            names = parser.get_result(jobs.names_job) if jobs.names_job is not None else None
+            if names is None:
+                names = {}
+            if not jobs.stars_filename.endswith('.dat'):
+                star_parser.do_load_text(jobs.stars_path, names, universe)
+            elif jobs.records_job is None:
+                star_parser.load_cached_catalog(jobs.stars_path, jobs.names_path, universe)
+            else:
+                records = parser.get_result(jobs.records_job)
+                if records is not None:
+                    catalog = star_parser.create_catalog(records, names, universe)
+                    star_parser.cache_catalog(catalog, jobs.stars_path, jobs.names_path)
+        for (filepath, job) in jobs.stc_jobs:
+            items = get_items(parser, filepath, job)
+            if items is not None:
+                stc_parser.instanciate(items, universe)
+        for (filepath, job) in jobs.ssc_jobs:
+            items = get_items(parser, filepath, job)
+            if items is not None:
+                ssc_parser.instanciate(items, universe, ssc_parser.is_deferred(filepath))
+    finally:
+        parser.shutdown()
+    print("Catalogs load time:", time() - start)
@@ -23,7 +23,19 @@ from __future__ import absolute_import
 from ply import lex
 from ply import yacc
 
+from ..cache import create_path_for, is_cache_valid
+from .. import settings
+
+from time import time
+import hashlib
+import pickle
 import sys
+import os
+import io
+import re
+
+#Must be incremented when the structure of the parsed items changes
+items_cache_version = 1
 
 tokens = ('STRING', 'NAME', 'INT', 'FLOAT', 'BOOL')
 
@@ -269,15 +281,322 @@ def p_error(p):
     else:
         print("SYNTAX ERROR AT EOF")
 
-parser = yacc.yacc(tabmodule='ssc_parsetab', write_tables=False, debug=False)
-
-def parse(data, debug=0):
+parser = None
+
+def get_parser():
+    """
+    Build the parser on first use, the LALR tables are kept in the cache directory and regenerated by ply
+    only when the grammar changes.
+    """
+    global parser
+    if parser is None:
+        picklefile = os.path.join(create_path_for('celestia'), 'ssc_parsetab.pickle')
+        parser = yacc.yacc(picklefile=picklefile, debug=False)
+    return parser
+
+def ply_parse(data, debug=0):
+    parser = get_parser()
     parser.error = 0
+    lexer.lineno = 1
     p = parser.parse(data, lexer=lexer, debug=debug)
     if parser.error:
         return None
     return p
 
+#Fast parser, the tokens are matched with the regular expressions of the ply lexer, in the same order,
+#and the items are built by a recursive descent parser as soon as they are complete.
+
+class ParseError(Exception):
+    pass
+
+#Each kind of token is captured by one group, the groups inside the ply rules are made non-capturing.
+#The comments are matched without group and any other character is illegal.
+#The whitespaces before a token are part of its match, which is faster than searching for the next token.
+token_re = re.compile('[%s\n]*(?:' % t_ignore +
+                      '|'.join(['(%s)' % rule.__doc__.replace('(', '(?:') for rule in (t_BOOL, t_NAME, t_STRING, t_FLOAT, t_INT)] +
+                               [t_ignore_COMMENT,
+                                '([%s])' % re.escape(''.join(literals)),
+                                '([^%s\n])' % t_ignore]) + ')')
+
+class Tokenizer(object):
+    """
+    Generates the tokens of the given lines as (type, value) tuples, the lines are processed by chunks.
+    The depth of the braces is tracked so that the parser can skip the rest of an invalid item.
+    """
+    chunk_size = 65536
+
+    def __init__(self, lines):
+        self.lines = lines
+        self.lineno = 1
+        self.depth = 0
+        self.errors = 0
+
+    def chunks(self):
+        if isinstance(self.lines, list):
+            yield ''.join(self.lines)
+            return
+        while True:
+            lines = self.lines.readlines(self.chunk_size)
+            if len(lines) == 0: break
+            yield ''.join(lines)
+
+    def __iter__(self):
+        for chunk in self.chunks():
+            for (boolean, name, string, real, integer, literal, illegal) in token_re.findall(chunk):
+                if name:
+                    yield ('NAME', name)
+                elif literal:
+                    if literal == '{':
+                        self.depth += 1
+                    elif literal == '}' and self.depth > 0:
+                        self.depth -= 1
+                    yield (literal, literal)
+                elif real:
+                    yield ('FLOAT', float(real))
+                elif integer:
+                    yield ('INT', int(integer))
+                elif string:
+                    yield ('STRING', string[1:-1])
+                elif boolean:
+                    yield ('BOOL', boolean == 'true')
+                elif illegal:
+                    print("Illegal character '%s'" % illegal)
+            self.lineno += chunk.count('\n')
+
+def syntax_error(token):
+    if token is None:
+        return ParseError("SYNTAX ERROR AT EOF")
+    else:
+        return ParseError("Syntax error at token %s : %s" % token)
+
+def parse_entries(tokens):
+    entries = {}
+    for token in tokens:
+        (kind, key) = token
+        if kind == '}':
+            return entries
+        if kind != 'NAME':
+            raise syntax_error(token)
+        token = next(tokens, None)
+        if token is None:
+            raise syntax_error(token)
+        (kind, value) = token
+        if kind == '[':
+            value = []
+            for token in tokens:
+                if token[0] == ']': break
+                if token[0] != 'FLOAT' and token[0] != 'INT':
+                    raise syntax_error(token)
+                value.append(token[1])
+            else:
+                raise syntax_error(None)
+        elif kind == '{':
+            value = parse_entries(tokens)
+        elif kind != 'INT' and kind != 'FLOAT' and kind != 'STRING' and kind != 'BOOL':
+            raise syntax_error(token)
+        entries[key] = value
+    raise syntax_error(None)
+
+def parse_header(header):
+    kinds = tuple(token[0] for token in header)
+    values = [token[1] for token in header]
+    if kinds == ('NAME',):
+        return ['Add', values[0], None, None, None]
+    disposition = 'Add'
+    item_type = 'Body'
+    if len(kinds) > 0 and kinds[0] == 'NAME':
+        if len(kinds) > 1 and kinds[1] == 'NAME':
+            disposition = values.pop(0)
+            kinds = kinds[1:]
+        item_type = values.pop(0)
+        kinds = kinds[1:]
+    if kinds == ('INT',) or kinds == ('STRING',):
+        return [disposition, item_type, values[0], None, None]
+    elif kinds == ('INT', 'STRING'):
+        return [disposition, item_type, values[0], None, values[1]]
+    elif kinds == ('STRING', 'STRING'):
+        return [disposition, item_type, values[0], values[1], None]
+    return None
+
+def parse_item(token, tokens):
+    header = []
+    while token is not None and token[0] != '{':
+        header.append(token)
+        token = next(tokens, None)
+    if token is None:
+        raise syntax_error(None)
+    item = parse_header(header)
+    if item is None:
+        raise syntax_error(header[-1] if len(header) > 0 else token)
+    item.append(parse_entries(tokens))
+    return item
+
+def parse_items(tokenizer):
+    """
+    Generates the items [disposition, type, name, parent, alias, data] from the tokens of the tokenizer.
+    An item that does not follow the grammar is reported and skipped, the parsing resumes after its closing brace.
+    """
+    tokens = iter(tokenizer)
+    for token in tokens:
+        try:
+            item = parse_item(token, tokens)
+        except ParseError as e:
+            print(e, "after line", tokenizer.lineno)
+            tokenizer.errors += 1
+            while tokenizer.depth > 0 and next(tokens, None) is not None:
+                pass
+            continue
+        yield item
+
+def fast_parse(data):
+    return fast_parse_lines(data.splitlines(True))
+
+def fast_parse_lines(lines):
+    tokenizer = Tokenizer(lines)
+    items = list(parse_items(tokenizer))
+    if len(items) == 0:
+        if tokenizer.errors == 0:
+            print("SYNTAX ERROR AT EOF")
+        return None
+    return items
+
+def parse(data, debug=0):
+    if settings.fast_celestia_parser:
+        return fast_parse(data)
+    else:
+        return ply_parse(data, debug)
+
+def get_cache_file(filepath):
+    md5 = hashlib.md5(filepath.encode()).hexdigest()
+    return os.path.join(create_path_for('celestia'), md5 + '.dat')
+
+def load_from_cache(filepath):
+    cache_file = get_cache_file(filepath)
+    if not os.path.exists(cache_file):
+        return None
+    try:
+        with open(cache_file, 'rb') as f:
+            (version, path, mtime, size, items) = pickle.load(f)
+    except (IOError, ValueError, EOFError, pickle.UnpicklingError) as e:
+        print("Could not read cache for", filepath, cache_file, ':', e)
+        return None
+    stat = os.stat(filepath)
+    if version != items_cache_version or path != filepath or mtime != stat.st_mtime or size != stat.st_size:
+        return None
+    return items
+
+def is_cached(filepath):
+    return settings.cache_celestia and is_cache_valid(get_cache_file(filepath), filepath)
+
+def store_to_cache(items, filepath):
+    cache_file = get_cache_file(filepath)
+    stat = os.stat(filepath)
+    try:
+        with open(cache_file, 'wb') as f:
+            pickle.dump((items_cache_version, filepath, stat.st_mtime, stat.st_size, items), f, pickle.HIGHEST_PROTOCOL)
+    except IOError as e:
+        print("Could not write cache for", filepath, cache_file, ':', e)
+
+def stream_file(filepath):
+    """
+    Generates the items of the file while it is read, the items are stored in the cache once the whole file is parsed.
+    """
+    items = []
+    with io.open(filepath, encoding='latin-1') as f:
+        for item in parse_items(Tokenizer(f)):
+            items.append(item)
+            yield item
+    if len(items) > 0 and settings.cache_celestia:
+        store_to_cache(items, filepath)
+
+def parse_file(filepath):
+    """
+    Returns the items defined in the file, the items are taken from the cache if the file did not change.
+    With the fast parser, the items are returned by a generator as soon as they are parsed.
+    """
+    items = None
+    if settings.cache_celestia:
+        items = load_from_cache(filepath)
+    if items is None:
+        if settings.fast_celestia_parser:
+            return stream_file(filepath)
+        data = io.open(filepath, encoding='latin-1').read()
+        items = ply_parse(data)
+        if items is not None and settings.cache_celestia:
+            store_to_cache(items, filepath)
+    return items
+
+def load_items(filepath):
+    """
+    Returns the list of items defined in the file, used when the file is parsed in another process.
+    """
+    items = parse_file(filepath)
+    if items is not None:
+        items = list(items)
+    return items
+
+def compare_loads(filenames, context):
+    """
+    Print the time needed to parse the given files and to load them from the cache.
+    """
+    total_cold = 0.0
+    total_warm = 0.0
+    for filename in filenames:
+        filepath = context.find_data(filename)
+        if filepath is None and os.path.exists(filename):
+            filepath = filename
+        if filepath is None:
+            print("File not found", filename)
+            continue
+        start = time()
+        data = io.open(filepath, encoding='latin-1').read()
+        items = ply_parse(data)
+        cold = time() - start
+        if items is None:
+            continue
+        store_to_cache(items, filepath)
+        start = time()
+        cached_items = load_from_cache(filepath)
+        warm = time() - start
+        if cached_items != items:
+            print("Cached items differ for", filepath)
+        print("%s: %d items, cold %.1fms, warm %.1fms" % (filename, len(items), cold * 1000, warm * 1000))
+        total_cold += cold
+        total_warm += warm
+    print("Total: cold %.1fms, warm %.1fms" % (total_cold * 1000, total_warm * 1000))
+
+def check_fast_parser(filenames, context):
+    """
+    Check that the fast parser returns the same items as the ply parser for the given files.
+    The parsers do not recover from a syntax error the same way: the fast parser only skips the invalid item
+    while ply can also drop the items before it, so for a file with errors only the item counts are reported.
+    """
+    valid = True
+    for filename in filenames:
+        filepath = context.find_data(filename)
+        if filepath is None and os.path.exists(filename):
+            filepath = filename
+        if filepath is None:
+            print("File not found", filename)
+            continue
+        data = io.open(filepath, encoding='latin-1').read()
+        start = time()
+        reference = ply_parse(data)
+        ply_time = time() - start
+        start = time()
+        with io.open(filepath, encoding='latin-1') as f:
+            tokenizer = Tokenizer(f)
+            items = list(parse_items(tokenizer))
+        fast_time = time() - start
+        if tokenizer.errors > 0:
+            print("%s: syntax errors, ply kept %d items, fast kept %d items" % (filename, len(reference or []), len(items)))
+        elif items != (reference or []):
+            valid = False
+            print("%s: the items differ" % filename)
+        else:
+            print("%s: %d items, ply %.1fms, fast %.1fms" % (filename, len(items), ply_time * 1000, fast_time * 1000))
+    return valid
+
 if __name__ == '__main__':
     if len(sys.argv) == 2:
         data = open(sys.argv[1]).read()
@@ -285,3 +604,16 @@ if __name__ == '__main__':
         if not struct:
             raise SystemExit
         print(struct)
+    else:
+        from ..dircontext import defaultDirContext
+        check = len(sys.argv) > 1 and sys.argv[1] == '--check'
+        filenames = sys.argv[2:] if check else sys.argv[1:]
+        if len(filenames) == 0:
+            filenames = ["solarsys.ssc", "minormoons.ssc", "numberedmoons.ssc", "asteroids.ssc", "outersys.ssc",
+                         "nearstars.stc", "revised.stc", "spectbins.stc", "visualbins.stc", "extrasolar.stc",
+                         "galaxies.dsc"]
+        if check:
+            if not check_fast_parser(filenames, defaultDirContext):
+                raise SystemExit(1)
+        else:
+            compare_loads(filenames, defaultDirContext)
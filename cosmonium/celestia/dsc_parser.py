@@ -33,7 +33,6 @@ from ..dircontext import defaultDirContext
 from .. import utils
 
 import sys
-import io
 
 def names_list(name):
     return name.split(':')
@@ -109,8 +108,7 @@ def parse_file(filename, universe, context=defaultDirContext):
     if filepath is not None:
         print("Loading", filepath)
         base.splash.set_text("Loading %s" % filepath)
-        data = io.open(filepath, encoding='latin-1').read()
-        items = config_parser.parse(data)
+        items = config_parser.parse_file(filepath)
         if items is not None:
             instanciate(items, universe)
     else:
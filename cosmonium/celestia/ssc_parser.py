@@ -42,11 +42,13 @@ from ..astro.orbits import FixedOrbit
 from ..astro.rotations import FixedRotation, create_uniform_rotation
 from ..astro import units
 from ..astro.frame import J2000EclipticReferenceFrame, RelativeReferenceFrame, EquatorialReferenceFrame
+from ..deferredbodies import DeferredBody
 from ..dircontext import defaultDirContext
+from .. import settings
 
 from time import time
 import sys
-import io
+import os
 
 def get_color(value):
     if len(value) == 4:
@@ -400,6 +402,20 @@ def instanciate_reference_point(universe, names, is_planet, data):
                          body_class=body_class)
     return ref
 
+def get_body_extend(is_planet, data):
+    orbit = None
+    if 'EllipticalOrbit' in data:
+        orbit = instanciate_elliptical_orbit(data['EllipticalOrbit'], is_planet)
+    elif 'CustomOrbit' in data:
+        orbit = instanciate_custom_orbit(data['CustomOrbit'])
+    radius = data.get('Radius', 1.0)
+    if orbit is None:
+        return radius
+    return orbit.get_apparent_radius() + radius
+
+def is_deferred(filepath):
+    return os.path.basename(filepath) in settings.deferred_ssc_files
+
 def find_parent(universe, path, item_parent):
     body = universe.find_by_path(path, return_system=True)
     if not body:
@@ -409,7 +425,7 @@ def find_parent(universe, path, item_parent):
             body = body.get_or_create_system()
     return body
 
-def instanciate_item(universe, disposition, item_type, item_name, item_parent, item_alias, item_data):
+def instanciate_item(universe, disposition, item_type, item_name, item_parent, item_alias, item_data, deferred=False):
     if disposition != 'Add':
         print("Disposition", disposition, "not supported")
         return
@@ -426,14 +442,19 @@ def instanciate_item(universe, disposition, item_type, item_name, item_parent, i
         print("Parent", item_parent, "not found")
         return
     if item_type == 'Body':
+        #The orbit frame could change the units of the orbit, those bodies are not deferred
+        if deferred and 'OrbitFrame' not in item_data:
+            extend = get_body_extend(is_planet, item_data)
+            parent.add_deferred_child(DeferredBody(names, extend, instanciate_body, universe, names, is_planet, item_data))
+            return
         body = instanciate_body(universe, names, is_planet, item_data)
     elif item_type == 'ReferencePoint':
         body = instanciate_reference_point(universe, names, is_planet, item_data)
     parent.add_child_fast(body)
     
-def instanciate(items_list, universe):
+def instanciate(items_list, universe, deferred=False):
     for item in items_list:
-        instanciate_item(universe, *item)
+        instanciate_item(universe, *item, deferred=deferred)
 
 def parse_file(filename, universe, context=defaultDirContext):
     filepath = context.find_data(filename)
@@ -441,10 +462,9 @@ def parse_file(filename, universe, context=defaultDirContext):
         start = time()
         print("Loading", filepath)
         base.splash.set_text("Loading %s" % filepath)
-        data = io.open(filepath, encoding='latin-1').read()
-        items = config_parser.parse(data)
+        items = config_parser.parse_file(filepath)
         if items is not None:
-            instanciate(items, universe)
+            instanciate(items, universe, is_deferred(filepath))
         end = time()
         print("Load time:", end - start)
     else:
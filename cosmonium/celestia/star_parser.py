@@ -19,24 +19,28 @@
 
 from __future__ import print_function
 
-from panda3d.core import LVector3d
-
 from ..universe import Universe
 from ..bodies import Star
-from ..astro.spectraltype import spectralTypeStringDecoder, spectralTypeIntDecoder
+from ..astro.spectraltype import spectralTypeStringDecoder
 from ..astro.orbits import FixedPosition
 from ..astro.rotations import UnknownRotation
 from ..astro.astro import app_to_abs_mag
 from ..astro import bayer
 from ..astro import units
+from ..starcatalog import StarCatalog
 from ..dircontext import defaultDirContext
+from ..cache import create_path_for, is_cache_valid, save_arrays, map_arrays
+from .. import settings
 
 from .bodies import celestiaStarSurfaceFactory
 
 from time import time
+import hashlib
+import numpy
 import struct
 import sys
 import io
+import os
 import re
 
 def parse_line(line, names, universe):
@@ -80,40 +84,59 @@ def load_text(filename, names, universe, context=defaultDirContext):
         print("File not found", filename)
         return {}
 
-def do_load_bin(filepath, names, universe):
-    start = time()
-    print("Loading", filepath)
-    base.splash.set_text("Loading %s" % filepath)
-    data = open(filepath, 'rb')
-    field=data.read(8+2+4)
-    header, version, count = struct.unpack("<8shi", field)
+star_record_dtype = numpy.dtype([('catalog_number', '<i4'),
+                                 ('position', '<f4', (3,)),
+                                 ('abs_magnitude', '<i2'),
+                                 ('spectral_type', '<i2')])
+
+def read_bin(filepath):
+    """
+    Returns the records of the binary star catalog, or None if the file is invalid.
+    """
+    data = open(filepath, 'rb').read()
+    header_fmt = "<8shi"
+    header_size = struct.calcsize(header_fmt)
+    header, version, count = struct.unpack_from(header_fmt, data)
     if not header == b"CELSTARS":
         print("Invalid header", header)
-        return
+        return None
     if not version == 0x0100:
         print("Invalid version", version)
-        return
+        return None
     print("Found", count, "stars")
-    fmt="<ifffhh"
-    size=struct.calcsize(fmt)
-    for i in range(count):
-        fields = data.read(size)
-        catNo, x, y, z, abs_magnitude, spectral_type = struct.unpack(fmt, fields)
-        if catNo in names:
-            name = names[catNo]
-        else:
-            name = "HIP %d" % catNo
-        position = LVector3d(x * units.Ly, -z * units.Ly, y * units.Ly)
-        orbit = FixedPosition(position=position)
-        star = Star(name,
-                    surface_factory=celestiaStarSurfaceFactory,
-                    spectral_type=spectralTypeIntDecoder.decode(spectral_type),
-                    abs_magnitude=abs_magnitude / 256.0,
-                    orbit=orbit,
-                    rotation=UnknownRotation())
-        universe.add_child_star_fast(star)
+    available = (len(data) - header_size) // star_record_dtype.itemsize
+    if available < count:
+        print("Truncated file, only", available, "stars available")
+        count = available
+    return numpy.frombuffer(data, dtype=star_record_dtype, count=count, offset=header_size)
+
+def do_load_bin(filepath, names, universe):
+    start = time()
+    print("Loading", filepath)
+    base.splash.set_text("Loading %s" % filepath)
+    records = read_bin(filepath)
+    if records is None:
+        return None
+    catalog = create_catalog(records, names, universe)
     end = time()
     print("Load time:", end - start)
+    return catalog
+
+def create_catalog(records, names, universe):
+    count = len(records)
+    raw_positions = records['position'].astype(numpy.float64)
+    positions = numpy.empty((count, 3), dtype=numpy.float64)
+    positions[:, 0] = raw_positions[:, 0] * units.Ly
+    positions[:, 1] = -raw_positions[:, 2] * units.Ly
+    positions[:, 2] = raw_positions[:, 1] * units.Ly
+    catalog = StarCatalog(records['catalog_number'],
+                          positions,
+                          records['abs_magnitude'] / 256.0,
+                          records['spectral_type'],
+                          names=names,
+                          surface_factory=celestiaStarSurfaceFactory)
+    universe.add_star_catalog(catalog)
+    return catalog
 
 def load_bin(filename, names, universe, context=defaultDirContext):
     filepath = context.find_data(filename)
@@ -130,15 +153,19 @@ def parse_line_name(line):
     names.append("HIP %d" % catNo)
     return (catNo, names)
 
-def do_load_names(filepath):
-    start = time()
-    print("Loading", filepath)
-    base.splash.set_text("Loading %s" % filepath)
+def read_names(filepath):
     names = {}
     data = io.open(filepath, encoding='latin-1')
     for line in data.readlines():
         catNo, aliases = parse_line_name(line)
         names[catNo] = list(map(lambda x: bayer.canonize_name(x), aliases))
+    return names
+
+def do_load_names(filepath):
+    start = time()
+    print("Loading", filepath)
+    base.splash.set_text("Loading %s" % filepath)
+    names = read_names(filepath)
     end = time()
     print("Load time:", end - start)
     return names
@@ -151,6 +178,56 @@ def load_names(filename, context=defaultDirContext):
         print("File not found", filename)
         return {}
 
+def get_catalog_cache_file(stars_path, names_path):
+    cache_path = create_path_for('stars')
+    md5 = hashlib.md5((stars_path + ':' + (names_path or '')).encode()).hexdigest()
+    return os.path.join(cache_path, md5 + ".dat")
+
+def load_catalog_from_cache(cache_file, stars_path, names_path, universe):
+    start = time()
+    print("Loading %s (cached)" % stars_path)
+    base.splash.set_text("Loading %s (cached)" % stars_path)
+    arrays = map_arrays(cache_file, StarCatalog.version)
+    if arrays is None:
+        return None
+    try:
+        catalog = StarCatalog.from_arrays(arrays, surface_factory=celestiaStarSurfaceFactory)
+    except KeyError as e:
+        print("Invalid star catalog cache", cache_file, ':', e)
+        return None
+    universe.add_star_catalog(catalog)
+    end = time()
+    print("Found", catalog.nb_stars, "stars")
+    print("Load time:", end - start)
+    return catalog
+
+def is_catalog_cached(stars_path, names_path):
+    return settings.cache_stars and is_cache_valid(get_catalog_cache_file(stars_path, names_path), stars_path, names_path)
+
+def load_cached_catalog(stars_path, names_path, universe):
+    if not is_catalog_cached(stars_path, names_path):
+        return None
+    return load_catalog_from_cache(get_catalog_cache_file(stars_path, names_path), stars_path, names_path, universe)
+
+def cache_catalog(catalog, stars_path, names_path):
+    if catalog is not None and settings.cache_stars:
+        cache_file = get_catalog_cache_file(stars_path, names_path)
+        print("Caching into", cache_file)
+        save_arrays(cache_file, catalog.get_arrays(), StarCatalog.version)
+
+def load_catalog(stars_filename, names_filename, universe, context=defaultDirContext):
+    stars_path = context.find_data(stars_filename)
+    if stars_path is None:
+        print("File not found", stars_filename)
+        return None
+    names_path = context.find_data(names_filename) if names_filename is not None else None
+    catalog = load_cached_catalog(stars_path, names_path, universe)
+    if catalog is None:
+        names = do_load_names(names_path) if names_path is not None else {}
+        catalog = do_load_bin(stars_path, names, universe)
+        cache_catalog(catalog, stars_path, names_path)
+    return catalog
+
 if __name__ == '__main__':
     if len(sys.argv) == 2:
         universe=Universe(None)
@@ -38,7 +38,6 @@ from . import config_parser
 
 from time import time
 import sys
-import io
 
 def names_list(name):
     return name.split(':')
@@ -194,8 +193,7 @@ def parse_file(filename, universe, context=defaultDirContext):
         start = time()
         print("Loading", filepath)
         base.splash.set_text("Loading %s" % filepath)
-        data = io.open(filepath, encoding='latin-1').read()
-        items = config_parser.parse(data)
+        items = config_parser.parse_file(filepath)
         if items is not None:
             instanciate(items, universe)
         end = time()
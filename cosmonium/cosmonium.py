@@ -37,11 +37,16 @@ from .opengl import request_opengl_config, check_opengl_config, create_main_wind
 from .bodies import StellarBody, ReflectiveBody
 from .systems import StellarSystem, SimpleSystem
 from .universe import Universe
+from .updatescheduler import UpdateScheduler
+from .deferredbodies import DeferredBodiesCatalog
 from .annotations import Grid
 from .pointsset import PointsSet
 from .sprites import RoundDiskPointSprite, GaussianPointSprite, ExpPointSprite, MergeSprite
 from .astro.frame import J2000EquatorialReferenceFrame, J2000EclipticReferenceFrame
-from .astro.frame import AbsoluteReferenceFrame, SynchroneReferenceFrame, RelativeReferenceFrame
+from .astro.frame import AbsoluteReferenceFrame, SynchroneReferenceFrame, RelativeReferenceFrame, ReferenceFrame
+from .astro.orbits import Orbit
+from .astro.ephemeris import EphemerisManager
+from .astro.rotations import Rotation
 from .celestia.cel_url import CelUrl
 
 #import orbits and rotations elements to add them to the DB
@@ -58,6 +63,7 @@ from .nav import FreeNav, WalkNav
 from .astro import units
 from .fonts import fontsManager
 from .pstats import pstat
+from .profiler import frameProfiler
 from . import utils
 from . import workers
 from . import cache
@@ -67,6 +73,7 @@ from . import pstats
 
 from math import pi
 import platform
+from time import strftime
 import sys
 import os
 from cosmonium.bodies import StellarObject
@@ -109,6 +116,7 @@ class CosmoniumBase(ShowBase):
 
         workers.asyncTextureLoader = workers.AsyncTextureLoader(self)
         workers.syncTextureLoader = workers.SyncTextureLoader()
+        self.ephemeris_manager = EphemerisManager(self)
 
     def panda_config(self):
         data = []
@@ -148,6 +156,8 @@ class CosmoniumBase(ShowBase):
         print("Data type:", "double" if settings.use_double else 'float')
 
     def exit(self):
+        if frameProfiler.enabled:
+            self.dump_frame_profile()
         sys.exit(0)
 
     def keystroke_event(self, keyname):
@@ -215,7 +225,7 @@ class CosmoniumBase(ShowBase):
     def window_event(self, window):
         if self.win is None: return
         if self.win.is_closed():
-            sys.exit(0)
+            self.exit()
         wp = self.win.getProperties()
         width = wp.getXSize()
         height = wp.getYSize()
@@ -251,6 +261,18 @@ class CosmoniumBase(ShowBase):
     def connect_pstats(self):
         PStatClient.connect()
 
+    def toggle_frame_profiler(self):
+        if frameProfiler.enabled:
+            self.dump_frame_profile()
+        frameProfiler.nb_frames = settings.profile_nb_frames
+        frameProfiler.toggle()
+
+    def dump_frame_profile(self):
+        if frameProfiler.frames == 0: return
+        frameProfiler.print_report()
+        basename = os.path.join(settings.profile_path, strftime(settings.profile_filename))
+        frameProfiler.export(basename)
+
     def toggle_wireframe(self):
         self.world.clear_render_mode()
         if self.wireframe_filled:
@@ -310,6 +332,7 @@ class Cosmonium(CosmoniumBase):
 
         self.splash = Splash() if not self.app_config.test_start else NoSplash()
 
+        self.init_loader()
         if not settings.debug_sync_load:
             self.async_start = workers.AsyncMethod("async_start", self, self.load_task, self.configure_scene)
         else:
@@ -323,7 +346,6 @@ class Cosmonium(CosmoniumBase):
 
         self.universe.recalc_recursive()
 
-        self.splash.set_text("Building octree...")
         self.universe.create_octree()
         #self.universe.octree.print_summary()
         #self.universe.octree.print_stats()
@@ -709,9 +731,15 @@ class Cosmonium(CosmoniumBase):
         self.gui.update_status()
 
     def time_task(self, task):
+        frameProfiler.start_frame()
         dt = globalClock.getDt()
+        ReferenceFrame.generation += 1
+        for cls in (Orbit, Rotation, ReferenceFrame):
+            cls.nb_cache_hits = 0
+            cls.nb_cache_misses = 0
 
         self.time.update_time(dt)
+        self.ephemeris_manager.set_active(settings.ephemeris_cache and abs(self.time.multiplier) >= settings.ephemeris_time_rate)
         self.nav.update(dt)
 
         self.update_octree()
@@ -719,7 +747,15 @@ class Cosmonium(CosmoniumBase):
         obs = pstats.levelpstat('obs', 'Bodies')
         visibility = pstats.levelpstat('visibility', 'Bodies')
         instance = pstats.levelpstat('instance', 'Bodies')
+        skipped = pstats.levelpstat('skipped', 'Bodies')
+        deferred = pstats.levelpstat('deferred', 'Bodies')
         StellarObject.nb_update = 0
+        StellarObject.nb_update_skipped = 0
+        UpdateScheduler.nb_every_frame = 0
+        UpdateScheduler.nb_deferred_updates = 0
+        UpdateScheduler.nb_deferred = 0
+        UpdateScheduler.nb_on_demand = 0
+        DeferredBodiesCatalog.nb_created = 0
         StellarObject.nb_obs = 0
         StellarObject.nb_visibility = 0
         StellarObject.nb_instance = 0
@@ -790,9 +826,33 @@ class Cosmonium(CosmoniumBase):
         obs.set_level(StellarObject.nb_obs)
         visibility.set_level(StellarObject.nb_visibility)
         instance.set_level(StellarObject.nb_instance)
+        skipped.set_level(StellarObject.nb_update_skipped)
+        deferred.set_level(UpdateScheduler.nb_deferred + UpdateScheduler.nb_on_demand)
+
+        if frameProfiler.enabled:
+            frameProfiler.set_counter('nb_update', StellarObject.nb_update)
+            frameProfiler.set_counter('nb_update_skipped', StellarObject.nb_update_skipped)
+            frameProfiler.set_counter('nb_update_every_frame', UpdateScheduler.nb_every_frame)
+            frameProfiler.set_counter('nb_update_deferred_updates', UpdateScheduler.nb_deferred_updates)
+            frameProfiler.set_counter('nb_update_deferred', UpdateScheduler.nb_deferred)
+            frameProfiler.set_counter('nb_update_on_demand', UpdateScheduler.nb_on_demand)
+            frameProfiler.set_counter('nb_deferred_created', DeferredBodiesCatalog.nb_created)
+            frameProfiler.set_counter('nb_obs', StellarObject.nb_obs)
+            frameProfiler.set_counter('nb_visibility', StellarObject.nb_visibility)
+            frameProfiler.set_counter('nb_instance', StellarObject.nb_instance)
+
+        for (name, cls) in (('orbit', Orbit), ('rotation', Rotation), ('frame', ReferenceFrame)):
+            total = cls.nb_cache_hits + cls.nb_cache_misses
+            hit_rate = 100.0 * cls.nb_cache_hits / total if total > 0 else 0.0
+            pstats.levelpstat(name, 'Cache hits').set_level(hit_rate)
+            if frameProfiler.enabled:
+                frameProfiler.set_counter(name + '_cache_hits', cls.nb_cache_hits)
+                frameProfiler.set_counter(name + '_cache_misses', cls.nb_cache_misses)
+                frameProfiler.set_counter(name + '_cache_hit_rate', hit_rate)
 
         if settings.color_picking:
             self.oid_texture.clear_image()
+        frameProfiler.end_frame()
 
         return Task.cont
 
@@ -873,6 +933,9 @@ class Cosmonium(CosmoniumBase):
                     print("\tOrientation:", self.selected.scene_orientation)
                     print("\tScale:", self.selected.scene_scale_factor)
 
+    def init_loader(self):
+        pass
+
     def init_universe(self):
         pass
 
@@ -0,0 +1,101 @@
+#
+#This file is part of Cosmonium.
+#
+#Copyright (C) 2018-2019 Laurent Deru.
+#
+#Cosmonium is free software: you can redistribute it and/or modify
+#it under the terms of the GNU General Public License as published by
+#the Free Software Foundation, either version 3 of the License, or
+#(at your option) any later version.
+#
+#Cosmonium is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#GNU General Public License for more details.
+#
+#You should have received a copy of the GNU General Public License
+#along with Cosmonium.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+from __future__ import print_function
+from __future__ import absolute_import
+
+from .catalogs import objectsDB
+
+class DeferredBody(object):
+    """
+    Placeholder of a body whose instantiation is deferred. It only holds the names of the body, the extent of its
+    orbit and the factory creating the real body when the parent system is resolved or when the body is looked up.
+    """
+    __slots__ = ('names', 'extend', 'factory', 'args', 'parent', 'body')
+
+    def __init__(self, names, extend, factory, *args):
+        self.names = names
+        self.extend = extend
+        self.factory = factory
+        self.args = args
+        self.parent = None
+        #The real body, once created
+        self.body = None
+
+    def get_name(self):
+        return self.names[0]
+
+    def get_exact_name(self, name_up):
+        for name in self.names:
+            if name.upper() == name_up:
+                return name
+        return self.names[0]
+
+    def is_named(self, name, name_up=None):
+        if name_up is None:
+            name_up = name.upper()
+        for name in self.names:
+            if name.upper() == name_up:
+                return True
+        return False
+
+    def create_body(self):
+        return self.factory(*self.args)
+
+    def get_body(self):
+        return self.parent.create_deferred_child(self)
+
+class DeferredBodiesCatalog(object):
+    """
+    Names index of the deferred bodies, registered in the objects database so that a lookup by name creates the body.
+    The completion returns the records without creating the bodies, see DeferredBody.get_body().
+    """
+    lazy_completion = True
+    nb_created = 0
+
+    def __init__(self):
+        self.db = {}
+
+    def add(self, record):
+        for name in record.names:
+            self.db[name.upper()] = record
+
+    def remove_record(self, record):
+        for name in record.names:
+            if self.db.get(name.upper()) is record:
+                del self.db[name.upper()]
+
+    def get(self, name):
+        record = self.db.get(name.upper())
+        if record is not None:
+            return record.get_body()
+        return None
+
+    def names_startswith(self, text):
+        """
+        Returns the list of (exact name, record) of the records with a name starting with the given text.
+        """
+        text = text.upper()
+        return [(record.get_exact_name(key), record) for (key, record) in self.db.items() if key.startswith(text)]
+
+    def remove(self, body):
+        pass
+
+deferredBodies = DeferredBodiesCatalog()
+objectsDB.add_catalog(deferredBodies)
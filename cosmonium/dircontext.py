@@ -22,15 +22,89 @@ from __future__ import absolute_import
 
 from panda3d.core import ExecutionEnvironment
 
+from . import settings
+
+from fnmatch import fnmatch
+from time import time
 import glob
+import sys
 import os
 from copy import deepcopy
 
+#The default file systems of Windows and macOS ignore the case of the names
+case_insensitive = sys.platform in ('win32', 'darwin')
+
+def name_key(name):
+    return name.lower() if case_insensitive else name
+
+class DirectoryListing(object):
+    def __init__(self, dirname, mtime):
+        self.mtime = mtime
+        self.checked = None
+        self.names = []
+        if mtime is not None:
+            try:
+                self.names = os.listdir(dirname or os.curdir)
+            except OSError:
+                pass
+        self.names_map = {}
+        for name in self.names:
+            self.names_map.setdefault(name_key(name), name)
+
+class DirectoryIndex(object):
+    """
+    Cache of the content of the searched directories, the lookups are resolved against the cached listings
+    instead of scanning the directories. A listing is rebuilt when the modification time of its directory changes,
+    which is checked at most once per check interval. The index is shared by a context and the contexts derived from it.
+    """
+    nb_listings = 0
+
+    def __init__(self):
+        self.listings = {}
+
+    def get_listing(self, dirname):
+        now = time()
+        listing = self.listings.get(dirname)
+        if listing is not None and now - listing.checked < settings.dir_index_check_interval:
+            return listing
+        try:
+            mtime = os.stat(dirname or os.curdir).st_mtime
+        except OSError:
+            mtime = None
+        if listing is None or listing.mtime != mtime:
+            DirectoryIndex.nb_listings += 1
+            listing = DirectoryListing(dirname, mtime)
+            self.listings[dirname] = listing
+        listing.checked = now
+        return listing
+
+    def find(self, path):
+        """
+        Returns the first path matching the given glob pattern, as glob.glob() would, or None.
+        """
+        (dirname, basename) = os.path.split(path)
+        if basename == '' or glob.has_magic(dirname):
+            files = glob.glob(path)
+            return files[0] if len(files) > 0 else None
+        listing = self.get_listing(dirname)
+        if not glob.has_magic(basename):
+            if name_key(basename) in listing.names_map:
+                return path
+            return None
+        #Like glob, the hidden files are only matched by a pattern starting with a dot
+        hidden = basename[0] == '.'
+        for name in listing.names:
+            if (hidden or name[0] != '.') and fnmatch(name, basename):
+                return os.path.join(dirname, name)
+        return None
+
 class DirContext(object):
     def __init__(self, context=None):
         if context is not None:
             self.category_paths = deepcopy(context.category_paths)
+            self.index = context.index
         else:
+            self.index = DirectoryIndex()
             self.category_paths={
                                 'textures': [],
                                 'models': [],
@@ -61,16 +135,22 @@ class DirContext(object):
     def find_file(self, category, pattern):
         if pattern is None: return None
         if os.path.isabs(pattern):
-            files = glob.glob(pattern)
-            if len(files) > 0:
-                return files[0]
+            return self.find_path(pattern)
         else:
             for res in self.category_paths[category]:
                 #print("Looking for", pattern, "in", res)
                 full_pattern =  os.path.join(res, pattern)
-                files = glob.glob(full_pattern)
-                if len(files) > 0:
-                    return files[0]
+                filepath = self.find_path(full_pattern)
+                if filepath is not None:
+                    return filepath
+        return None
+
+    def find_path(self, pattern):
+        if settings.dir_index:
+            return self.index.find(pattern)
+        files = glob.glob(pattern)
+        if len(files) > 0:
+            return files[0]
         return None
 
     def find_texture(self, pattern):
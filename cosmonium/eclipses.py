@@ -0,0 +1,105 @@
+#
+#This file is part of Cosmonium.
+#
+#Copyright (C) 2018-2019 Laurent Deru.
+#
+#Cosmonium is free software: you can redistribute it and/or modify
+#it under the terms of the GNU General Public License as published by
+#the Free Software Foundation, either version 3 of the License, or
+#(at your option) any later version.
+#
+#Cosmonium is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#GNU General Public License for more details.
+#
+#You should have received a copy of the GNU General Public License
+#along with Cosmonium.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+from __future__ import print_function
+from __future__ import absolute_import
+
+from . import settings
+
+import numpy
+
+class EclipseBroadPhase(object):
+    """
+    Finds the pairs of bodies of a system where the first body can cast a shadow on the second one.
+    The bodies are projected on the plane perpendicular to the light direction and sorted along one axis of
+    that plane. A pair is a candidate only if the target is behind the caster and inside its shadow cone,
+    widened by the penumbra. The exact check is done again only for the candidates whose geometry changed.
+    """
+    nb_candidates = 0
+    nb_checks = 0
+
+    def __init__(self):
+        #Last exact result of each candidate pair, with the lateral distance and the depth difference used
+        self.results = {}
+
+    def find_pairs(self, bodies, targets, light_vector, star_angular_radius, light_spread):
+        """
+        Returns the list of (caster, target) pairs, the targets are given as a list of booleans.
+        The light vector is the unit vector from the system to the star, the light vector of each body can deviate
+        from it by up to the light spread angle, and the star angular radius is the largest seen from the bodies.
+        """
+        nb_bodies = len(bodies)
+        if nb_bodies < 2:
+            self.results = {}
+            return []
+        light = numpy.array([light_vector[0], light_vector[1], light_vector[2]])
+        positions = numpy.array([(body._local_position[0], body._local_position[1], body._local_position[2]) for body in bodies])
+        lights = numpy.array([(body.vector_to_star[0], body.vector_to_star[1], body.vector_to_star[2]) for body in bodies])
+        radii = numpy.array([body.get_apparent_radius() for body in bodies])
+        is_target = numpy.array(targets, dtype=bool)
+        #Any axis perpendicular to the light will do to sort the projected positions
+        axis = numpy.cross(light, (1.0, 0.0, 0.0) if abs(light[0]) < 0.9 else (0.0, 1.0, 0.0))
+        axis /= numpy.sqrt(axis.dot(axis))
+        coords = positions.dot(axis)
+        order = numpy.argsort(coords)
+        sorted_coords = coords[order]
+        #The penumbra grows with the distance to the caster, and the light of the caster is not exactly along
+        #the sorting plane, the widest cone is used for the search in the sorted positions
+        k = star_angular_radius
+        size = numpy.sqrt(((positions - positions.mean(axis=0)) ** 2).sum(axis=1)).max() * 2
+        half_widths = radii + radii[is_target].max(initial=0.0) + (k + light_spread) * size
+        starts = numpy.searchsorted(sorted_coords, coords - half_widths, side='left')
+        ends = numpy.searchsorted(sorted_coords, coords + half_widths, side='right')
+        counts = ends - starts
+        casters = numpy.repeat(numpy.arange(nb_bodies), counts)
+        local_starts = numpy.cumsum(counts) - counts
+        others = order[numpy.arange(counts.sum()) - local_starts[casters] + starts[casters]]
+        keep = (casters != others) & is_target[others]
+        (casters, others) = (casters[keep], others[keep])
+        #The target must be farther from the star than the caster, along the light of the caster
+        separations = positions[others] - positions[casters]
+        caster_lights = lights[casters]
+        delta_depths = -numpy.einsum('ij,ij->i', separations, caster_lights)
+        laterals = separations + caster_lights * delta_depths[:, numpy.newaxis]
+        distances = numpy.sqrt(numpy.einsum('ij,ij->i', laterals, laterals))
+        lengths = numpy.sqrt(numpy.einsum('ij,ij->i', separations, separations))
+        bounds = radii[casters] + radii[others] + k * lengths
+        keep = (delta_depths > 0.0) & (distances < bounds)
+        (casters, others, delta_depths, distances) = (casters[keep], others[keep], delta_depths[keep], distances[keep])
+        EclipseBroadPhase.nb_candidates += len(casters)
+        pairs = []
+        results = {}
+        threshold = settings.eclipse_recheck_threshold
+        for (caster, target, delta_depth, distance) in zip(casters.tolist(), others.tolist(), delta_depths.tolist(), distances.tolist()):
+            caster = bodies[caster]
+            target = bodies[target]
+            key = (caster, target)
+            previous = self.results.get(key)
+            tolerance = threshold * min(caster.get_apparent_radius(), target.get_apparent_radius())
+            if previous is not None and abs(distance - previous[0]) + k * abs(delta_depth - previous[1]) < tolerance:
+                result = previous[2]
+            else:
+                EclipseBroadPhase.nb_checks += 1
+                result = caster.check_cast_shadow_on(target)
+                previous = (distance, delta_depth, result)
+            results[key] = previous
+            if result:
+                pairs.append(key)
+        self.results = results
+        return pairs
@@ -21,10 +21,13 @@ from __future__ import absolute_import
 
 try:
     from cosmonium_engine import OctreeNode, OctreeLeaf, InfiniteFrustum, VisibleObjectsTraverser
+    CoherentVisibleObjectsTraverser = None
     hasOctreeLeaf = True
 except ImportError as e:
     print("WARNING: Could not load Octree C implementation, fallback on python implementation")
     print("\t", e)
-    from .pyengine.pyoctree import OctreeNode, OctreeLeaf, VisibleObjectsTraverser
+    from .pyengine.pyoctree import OctreeNode, OctreeLeaf
+    from .pyengine.pyoctree import VectorizedVisibleObjectsTraverser as VisibleObjectsTraverser
+    from .pyengine.pyoctree import CoherentVisibleObjectsTraverser
     from .pyengine.pyfrustum import InfiniteFrustum
     hasOctreeLeaf = False
@@ -0,0 +1,107 @@
+#
+#This file is part of Cosmonium.
+#
+#Copyright (C) 2018-2019 Laurent Deru.
+#
+#Cosmonium is free software: you can redistribute it and/or modify
+#it under the terms of the GNU General Public License as published by
+#the Free Software Foundation, either version 3 of the License, or
+#(at your option) any later version.
+#
+#Cosmonium is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#GNU General Public License for more details.
+#
+#You should have received a copy of the GNU General Public License
+#along with Cosmonium.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+from __future__ import print_function
+from __future__ import absolute_import
+
+from . import settings
+
+import multiprocessing
+import traceback
+
+class ParseJob(object):
+    def __init__(self, filepath, function, args):
+        self.filepath = filepath
+        self.function = function
+        self.args = args
+        self.result = None
+
+def run_job(function, args):
+    try:
+        return function(*args)
+    except Exception:
+        traceback.print_exc()
+        return None
+
+class ParallelParser(object):
+    """
+    Parse independent files in a pool of processes, the parse functions must return plain picklable structures.
+    The results are retrieved in the loader thread, in any order, so that the content of the files can be
+    instantiated in dependency order while the other files are still being parsed.
+    Without process pool, or with only one worker, each file is parsed when its result is requested.
+
+    The application is not safe to import again in a new process, so the workers are forked. They are forked
+    by start(), once all the files are submitted, and only if there are at least two files to parse.
+    start() must be called on the main thread before the loader thread is started. The texture loader task
+    chain is already running at that point: a lock held by its thread when the workers are forked stays held
+    in the workers, this is why the parse functions must not use the panda3d objects shared with the task chains.
+    """
+    def __init__(self, splash=None):
+        self.splash = splash
+        self.jobs = []
+        self.nb_done = 0
+        self.pool = None
+
+    def submit(self, filepath, function, *args):
+        job = ParseJob(filepath, function, args)
+        self.jobs.append(job)
+        return job
+
+    def get_nb_workers(self):
+        nb_workers = settings.load_workers
+        if nb_workers == 0:
+            nb_workers = multiprocessing.cpu_count()
+        #There is no use for more workers than files to parse
+        return min(nb_workers, len(self.jobs))
+
+    def start(self):
+        nb_workers = self.get_nb_workers()
+        if nb_workers > 1 and 'fork' in multiprocessing.get_all_start_methods():
+            try:
+                self.pool = multiprocessing.get_context('fork').Pool(nb_workers)
+            except (OSError, ValueError) as e:
+                print("Could not create the parser processes:", e)
+                return
+            for job in self.jobs:
+                job.result = self.pool.apply_async(run_job, (job.function, job.args))
+
+    def job_done(self, job):
+        self.nb_done += 1
+        text = "Parsed %s (%d/%d)" % (job.filepath, self.nb_done, len(self.jobs))
+        print(text)
+        if self.splash is not None:
+            self.splash.set_text(text)
+
+    def get_result(self, job):
+        if job.result is None:
+            result = run_job(job.function, job.args)
+        else:
+            try:
+                result = job.result.get()
+            except Exception as e:
+                print("Could not parse", job.filepath, ':', e)
+                result = None
+        self.job_done(job)
+        return result
+
+    def shutdown(self):
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
@@ -20,7 +20,7 @@
 from __future__ import print_function
 from __future__ import absolute_import
 
-from panda3d.core import GeomVertexArrayFormat, InternalName, GeomVertexFormat, GeomVertexData, GeomVertexWriter
+from panda3d.core import GeomVertexArrayFormat, InternalName, GeomVertexFormat, GeomVertexData
 from panda3d.core import GeomPoints, Geom, GeomNode
 from panda3d.core import NodePath, OmniBoundingVolume
 from .foundation import VisibleObject
@@ -28,8 +28,16 @@ from .appearances import ModelAppearance
 from .shaders import BasicShader, FlatLightingModel, StaticSizePointControl
 from .sprites import SimplePoint, RoundDiskPointSprite
 
+import numpy
+
 class PointsSet(VisibleObject):
+    """
+    Set of points drawn as a single non-indexed GeomPoints primitive.
+    The vertex buffer is persistent and grows when needed, each frame the points are packed in a NumPy array
+    and only the range that differs from the previous frame is copied into the buffer.
+    """
     tex = None
+    min_capacity = 1024
     def __init__(self, use_sprites=True, use_sizes=True, points_size=2, sprite=None, background=None, shader=None):
         self.gnode = GeomNode('starfield')
         self.use_sprites = use_sprites
@@ -42,7 +50,11 @@ class PointsSet(VisibleObject):
 
         self.reset()
 
-        self.geom = self.makeGeom([], [], [], [])
+        self.make_format()
+        self.capacity = 0
+        self.nb_points = 0
+        self.previous_data = None
+        self.geom = self.make_geom()
         self.gnode.addGeom(self.geom)
         self.instance = NodePath(self.gnode)
         if self.use_sprites:
@@ -72,69 +84,72 @@ class PointsSet(VisibleObject):
         pass
 
     def reset(self):
-        self.points = []
-        self.colors = []
-        self.sizes = []
-        self.oids = []
+        self.values = []
 
     def add_point_scale(self, position, color, size, oids):
         #Observer is at position (0, 0, 0)
         distance_to_obs = position.length()
         vector_to_obs = -position / distance_to_obs
         point, _, _ = self.get_real_pos_rel(position, distance_to_obs, vector_to_obs)
-        self.points.append(point)
-        self.colors.append(color)
-        self.sizes.append(size)
-        self.oids.append(oids)
+        self.add_point(point, color, size, oids)
 
     def add_point(self, position, color, size, oid):
-        self.points.append(position)
-        self.colors.append(color)
-        self.sizes.append(size)
-        self.oids.append(oid)
-
-    def update(self):
-        self.update_arrays(self.points, self.colors, self.sizes, self.oids)
+        self.values += (position[0], position[1], position[2], color[0], color[1], color[2], color[3])
+        if self.use_sizes:
+            self.values.append(size)
+        if self.use_oids:
+            self.values += (oid[0], oid[1], oid[2], oid[3])
 
-    def makeGeom(self, points, colors, sizes, oids):
+    def make_format(self):
         array = GeomVertexArrayFormat()
         array.addColumn(InternalName.get_vertex(), 3, Geom.NTFloat32, Geom.CPoint)
         array.addColumn(InternalName.get_color(), 4, Geom.NTFloat32, Geom.CColor)
+        self.nb_columns = 7
         if self.use_sizes:
             array.addColumn(InternalName.get_size(), 1, Geom.NTFloat32, Geom.COther)
+            self.nb_columns += 1
         if self.use_oids:
             oids_column_name = InternalName.make('oid')
             array.addColumn(oids_column_name, 4, Geom.NTFloat32, Geom.COther)
+            self.nb_columns += 4
         format = GeomVertexFormat()
         format.addArray(array)
-        format = GeomVertexFormat.registerFormat(format)
-        vdata = GeomVertexData('vdata', format, Geom.UH_static)
-        vdata.unclean_set_num_rows(len(points))
-        self.vwriter = GeomVertexWriter(vdata, InternalName.get_vertex())
-        self.colorwriter = GeomVertexWriter(vdata, InternalName.get_color())
-        if self.use_sizes:
-            self.sizewriter = GeomVertexWriter(vdata, InternalName.get_size())
-        if self.use_oids:
-            self.oidwriter = GeomVertexWriter(vdata, oids_column_name)
-        geompoints = GeomPoints(Geom.UH_static)
-        geompoints.reserve_num_vertices(len(points))
-        index = 0
-        for (point, color, size, oid) in zip(points, colors, sizes, oids):
-            self.vwriter.addData3f(*point)
-            #self.colorwriter.addData3f(color[0], color[1], color[2])
-            self.colorwriter.addData4(color)
-            if self.use_sizes:
-                self.sizewriter.addData1f(size)
-            if self.use_oids:
-                self.oidwriter.addData4(oid)
-            geompoints.addVertex(index)
-            geompoints.closePrimitive()
-            index += 1
-        geom = Geom(vdata)
+        self.format = GeomVertexFormat.registerFormat(format)
+
+    def make_geom(self):
+        self.vdata = GeomVertexData('vdata', self.format, Geom.UH_dynamic)
+        geompoints = GeomPoints(Geom.UH_dynamic)
+        geompoints.set_nonindexed_vertices(0, 0)
+        geom = Geom(self.vdata)
         geom.addPrimitive(geompoints)
         return geom
 
-    def update_arrays(self, points, colors, sizes, oids):
-        self.gnode.removeAllGeoms()
-        self.geom = self.makeGeom(points, colors, sizes, oids)
-        self.gnode.addGeom(self.geom)
+    def update(self):
+        data = numpy.array(self.values, dtype=numpy.float32)
+        nb_points = len(data) // self.nb_columns
+        if nb_points > self.capacity:
+            self.capacity = max(nb_points, self.capacity * 2, self.min_capacity)
+            self.vdata.unclean_set_num_rows(self.capacity)
+            self.previous_data = None
+        if self.previous_data is None:
+            start = 0
+            end = len(data)
+        else:
+            #Only the values that differ from the previous frame are copied in the vertex buffer
+            common = min(len(data), len(self.previous_data))
+            changed = numpy.flatnonzero(data[:common] != self.previous_data[:common])
+            if len(changed) > 0:
+                start = changed[0]
+                end = changed[-1] + 1
+            else:
+                start = common
+                end = common
+            if len(data) > common:
+                end = len(data)
+        if end > start:
+            buffer = numpy.frombuffer(memoryview(self.vdata.modify_array(0)), dtype=numpy.float32)
+            buffer[start:end] = data[start:end]
+        self.previous_data = data
+        if nb_points != self.nb_points:
+            self.geom.modify_primitive(0).set_nonindexed_vertices(0, nb_points)
+            self.nb_points = nb_points
@@ -0,0 +1,178 @@
+#
+#This file is part of Cosmonium.
+#
+#Copyright (C) 2018-2019 Laurent Deru.
+#
+#Cosmonium is free software: you can redistribute it and/or modify
+#it under the terms of the GNU General Public License as published by
+#the Free Software Foundation, either version 3 of the License, or
+#(at your option) any later version.
+#
+#Cosmonium is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#GNU General Public License for more details.
+#
+#You should have received a copy of the GNU General Public License
+#along with Cosmonium.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+from __future__ import print_function
+from __future__ import absolute_import
+
+from time import time
+import numpy
+import json
+import os
+
+class FrameProfiler(object):
+    """
+    Built-in frame profiler, records the duration of the frame phases and the per-frame counters
+    in a ring buffer of the last frames. Unlike PStats, it does not need a server and can be used
+    in headless runs.
+    """
+    def __init__(self, nb_frames=1000):
+        self.enabled = False
+        self.nb_frames = nb_frames
+        self.columns = []
+        self.columns_index = {}
+        self.time_columns = set(['time_task'])
+        self.data = None
+        self.frames = 0
+        self.current = None
+        self.frame_start = None
+
+    def set_enabled(self, enabled):
+        if enabled and not self.enabled:
+            self.clear()
+        self.enabled = enabled
+
+    def toggle(self):
+        self.set_enabled(not self.enabled)
+        print("Frame profiler", "enabled" if self.enabled else "disabled")
+
+    def clear(self):
+        self.columns = []
+        self.columns_index = {}
+        self.time_columns = set(['time_task'])
+        self.data = None
+        self.frames = 0
+        self.current = None
+
+    def start_frame(self):
+        if not self.enabled: return
+        self.current = {}
+        self.frame_start = time()
+
+    def add_time(self, name, duration):
+        if self.current is None: return
+        self.current[name] = self.current.get(name, 0.0) + duration
+        self.time_columns.add(name)
+
+    def set_counter(self, name, value):
+        if self.current is None: return
+        self.current[name] = value
+
+    def end_frame(self):
+        if self.current is None: return
+        self.current['time_task'] = time() - self.frame_start
+        for name in self.current.keys():
+            if name not in self.columns_index:
+                self.add_column(name)
+        if self.data is None:
+            self.data = numpy.full((self.nb_frames, len(self.columns)), numpy.nan)
+        row = self.data[self.frames % self.nb_frames]
+        row.fill(numpy.nan)
+        for (name, value) in self.current.items():
+            row[self.columns_index[name]] = value
+        self.frames += 1
+        self.current = None
+
+    def add_column(self, name):
+        self.columns_index[name] = len(self.columns)
+        self.columns.append(name)
+        if self.data is not None:
+            self.data = numpy.hstack([self.data, numpy.full((self.nb_frames, 1), numpy.nan)])
+
+    def get_frames(self):
+        """
+        Returns the recorded frames in chronological order, one row per frame.
+        """
+        if self.data is None:
+            return numpy.empty((0, len(self.columns)))
+        if self.frames <= self.nb_frames:
+            return self.data[:self.frames]
+        start = self.frames % self.nb_frames
+        return numpy.concatenate([self.data[start:], self.data[:start]])
+
+    def get_percentiles(self, percentiles=(50, 95, 99)):
+        """
+        Returns a dict of column name to the list of the requested percentiles of that column.
+        """
+        frames = self.get_frames()
+        result = {}
+        for (i, name) in enumerate(self.columns):
+            values = frames[:, i]
+            values = values[~numpy.isnan(values)]
+            if len(values) > 0:
+                result[name] = numpy.percentile(values, percentiles).tolist()
+            else:
+                result[name] = [None] * len(percentiles)
+        return result
+
+    def print_report(self):
+        frames = self.get_frames()
+        print("Frame profile on %d frames" % len(frames))
+        print("%-20s %10s %10s %10s" % ('', 'p50', 'p95', 'p99'))
+        for (name, values) in sorted(self.get_percentiles().items()):
+            if values[0] is None: continue
+            if name in self.time_columns:
+                print("%-20s %8.2fms %8.2fms %8.2fms" % (name, values[0] * 1000, values[1] * 1000, values[2] * 1000))
+            else:
+                print("%-20s %10g %10g %10g" % (name, values[0], values[1], values[2]))
+
+    def export_csv(self, filename):
+        frames = self.get_frames()
+        try:
+            with open(filename, 'w') as f:
+                f.write(','.join(['index'] + self.columns) + '\n')
+                first = self.frames - len(frames)
+                for (i, row) in enumerate(frames):
+                    values = ['' if numpy.isnan(value) else repr(float(value)) for value in row]
+                    f.write(','.join([str(first + i)] + values) + '\n')
+        except IOError as e:
+            print("Could not write", filename, ':', e)
+            return False
+        return True
+
+    def export_json(self, filename):
+        frames = self.get_frames()
+        first = self.frames - len(frames)
+        trace = []
+        for (i, row) in enumerate(frames):
+            entry = {'index': first + i}
+            for (name, value) in zip(self.columns, row):
+                if not numpy.isnan(value):
+                    entry[name] = float(value)
+            trace.append(entry)
+        percentiles = dict((name, dict(zip(('p50', 'p95', 'p99'), values))) for (name, values) in self.get_percentiles().items())
+        try:
+            with open(filename, 'w') as f:
+                json.dump({'percentiles': percentiles, 'frames': trace}, f, indent=1)
+        except IOError as e:
+            print("Could not write", filename, ':', e)
+            return False
+        return True
+
+    def export(self, basename):
+        """
+        Export the recorded frames as CSV and JSON files, basename is the path without extension.
+        """
+        path = os.path.dirname(basename)
+        if path != '' and not os.path.isdir(path):
+            os.makedirs(path)
+        print("Saving frame profile into", basename + '.csv', basename + '.json')
+        self.export_csv(basename + '.csv')
+        self.export_json(basename + '.json')
+
+frameProfiler = FrameProfiler()
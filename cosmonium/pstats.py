@@ -19,6 +19,9 @@
 
 from panda3d.core import PStatCollector
 from functools import wraps
+from time import time
+
+from .profiler import frameProfiler
 
 custom_collectors = {}
 
@@ -27,10 +30,16 @@ def pstat(func):
     if not collectorName in custom_collectors.keys():
         custom_collectors[collectorName] = PStatCollector(collectorName)
     pstat = custom_collectors[collectorName]
+    name = func.__name__
     @wraps(func)
     def doPstat(*args, **kargs):
         pstat.start()
-        returned = func(*args, **kargs)
+        if frameProfiler.enabled:
+            start = time()
+            returned = func(*args, **kargs)
+            frameProfiler.add_time(name, time() - start)
+        else:
+            returned = func(*args, **kargs)
         pstat.stop()
         return returned
     return doPstat
@@ -20,11 +20,13 @@
 from __future__ import print_function
 from __future__ import absolute_import
 
-from panda3d.core import LPoint3d
+from panda3d.core import LPoint3d, LQuaterniond
 
 from ..astro.astro import abs_to_app_mag, app_to_abs_mag
+from ..astro import units
 
-from math import sqrt
+from math import sqrt, atan2
+import numpy
 
 def OctreeLeaf(ref_object, *args):
     return ref_object
@@ -45,6 +47,8 @@ class OctreeNode(object):
         self.has_children = False
         self.children = [None, None, None, None, None, None, None, None]
         self.leaves = []
+        self.leaves_arrays = None
+        self.visibility_state = None
         self.max_magnitude = 99.0
         OctreeNode.nb_cells += 1
 
@@ -67,6 +71,56 @@ class OctreeNode(object):
     def add(self, leaf):
         self._add(leaf, leaf.get_global_position(), leaf.abs_magnitude)
 
+    def add_leaves(self, leaves):
+        """
+        Insert all the leaves at once, the resulting tree is the same as when the leaves are added one by one.
+        """
+        if self.has_children or len(self.leaves) > 0:
+            for leaf in leaves:
+                self.add(leaf)
+            return
+        nb_leaves = len(leaves)
+        if nb_leaves == 0: return
+        positions = numpy.empty((nb_leaves, 3), dtype=numpy.float64)
+        magnitudes = numpy.empty(nb_leaves, dtype=numpy.float64)
+        extends = numpy.empty(nb_leaves, dtype=numpy.float64)
+        for (i, leaf) in enumerate(leaves):
+            position = leaf.get_global_position()
+            positions[i] = (position[0], position[1], position[2])
+            magnitudes[i] = leaf.abs_magnitude
+            extends[i] = leaf._extend
+        self._add_bulk(leaves, positions, magnitudes, extends, numpy.arange(nb_leaves))
+
+    def _add_bulk(self, leaves, positions, magnitudes, extends, indexes):
+        #indexes are the insertion order of the leaves routed to this cell, in ascending order
+        nb_leaves = len(indexes)
+        self.nb_leaves += nb_leaves
+        self.max_magnitude = min(self.max_magnitude, magnitudes[indexes].min())
+        self.leaves_arrays = None
+        if self.level >= self.max_level or nb_leaves < self.max_leaves:
+            self.leaves += [leaves[index] for index in indexes]
+            return
+        #The cell is split when its first max_leaves leaves are inserted, only those are kept for their extend
+        keep = magnitudes[indexes] < self.threshold
+        first = indexes[:self.max_leaves]
+        center = self.center
+        dx = center[0] - positions[first, 0]
+        dy = center[1] - positions[first, 1]
+        dz = center[2] - positions[first, 2]
+        keep[:self.max_leaves] |= numpy.sqrt(dx * dx + dy * dy + dz * dz) < extends[first]
+        self.leaves += [leaves[index] for index in indexes[keep]]
+        self.has_children = True
+        routed = indexes[~keep]
+        octants = (positions[routed, 0] >= center[0]).astype(numpy.int8)
+        octants |= (positions[routed, 1] >= center[1]) << 1
+        octants |= (positions[routed, 2] >= center[2]) << 2
+        order = numpy.argsort(octants, kind='stable')
+        bounds = numpy.searchsorted(octants[order], numpy.arange(9))
+        for index in range(8):
+            if bounds[index] < bounds[index + 1]:
+                child = self._get_child(index)
+                child._add_bulk(leaves, positions, magnitudes, extends, routed[order[bounds[index]:bounds[index + 1]]])
+
     def get_child(self, index):
         return self.children[index]
 
@@ -76,11 +130,27 @@ class OctreeNode(object):
     def get_leaves(self):
         return self.leaves
 
-    def _add_in_child(self, obj, position, magnitude):
-        index = 0
-        if position.x >= self.center.x: index |= 1
-        if position.y >= self.center.y: index |= 2
-        if position.z >= self.center.z: index |= 4
+    def get_leaves_arrays(self):
+        """
+        Returns the leaves of the cell sorted by absolute magnitude, with their positions, absolute magnitudes
+        and extends as contiguous arrays.
+        The arrays are built on first use and invalidated when the leaves of the cell are modified.
+        """
+        if self.leaves_arrays is None:
+            leaves = sorted(self.leaves, key=lambda leaf: leaf.get_abs_magnitude())
+            nb_leaves = len(leaves)
+            positions = numpy.empty((nb_leaves, 3), dtype=numpy.float64)
+            magnitudes = numpy.empty(nb_leaves, dtype=numpy.float64)
+            extends = numpy.empty(nb_leaves, dtype=numpy.float64)
+            for (i, leaf) in enumerate(leaves):
+                position = leaf._global_position
+                positions[i] = (position[0], position[1], position[2])
+                magnitudes[i] = leaf.get_abs_magnitude()
+                extends[i] = leaf._extend
+            self.leaves_arrays = (leaves, positions, magnitudes, extends)
+        return self.leaves_arrays
+
+    def _get_child(self, index):
         if self.children[index] is None:
             child_offset = self.width / 4.0
             child_center = LPoint3d(self.center)
@@ -98,7 +168,14 @@ class OctreeNode(object):
                 child_center.z -= child_offset
             child = OctreeNode(self.level + 1, child_center, self.width / 2.0, self.threshold + self.child_threshold, index)
             self.children[index] = child
-        self.children[index]._add(obj, position, magnitude)
+        return self.children[index]
+
+    def _add_in_child(self, obj, position, magnitude):
+        index = 0
+        if position.x >= self.center.x: index |= 1
+        if position.y >= self.center.y: index |= 2
+        if position.z >= self.center.z: index |= 4
+        self._get_child(index)._add(obj, position, magnitude)
 
     def _add(self, obj, position, magnitude):
         self.nb_leaves += 1
@@ -106,6 +183,7 @@ class OctreeNode(object):
             self.max_magnitude = magnitude
         if not self.has_children or magnitude < self.threshold:
             self.leaves.append(obj)
+            self.leaves_arrays = None
         else:
             self._add_in_child(obj, position, magnitude)
         if self.level < self.max_level and len(self.leaves) >= self.max_leaves and not self.has_children:
@@ -121,6 +199,7 @@ class OctreeNode(object):
             else:
                 self._add_in_child(leaf, position, leaf.get_abs_magnitude())
         self.leaves = new_leaves
+        self.leaves_arrays = None
         self.has_children = True
 
     def dump_octree_summary(self):
@@ -142,6 +221,100 @@ class OctreeNode(object):
         print("Nb cells:", self.nb_cells)
         print("Nb leaves:", self.nb_leaves)
 
+    def get_arrays(self, leaves):
+        """
+        Returns the cells of the tree, in depth-first order, as a list of (name, array).
+        The leaves of the cells are stored as their index in the given leaves list.
+        """
+        leaves_indexes = dict((id(leaf), i) for (i, leaf) in enumerate(leaves))
+        cells = []
+        stack = [(self, -1)]
+        while len(stack) > 0:
+            (cell, parent) = stack.pop()
+            cell_id = len(cells)
+            cells.append((cell, parent))
+            for child in reversed(cell.children):
+                if child is not None:
+                    stack.append((child, cell_id))
+        nb_cells = len(cells)
+        levels = numpy.empty(nb_cells, dtype=numpy.int32)
+        indexes = numpy.empty(nb_cells, dtype=numpy.int32)
+        parents = numpy.empty(nb_cells, dtype=numpy.int32)
+        centers = numpy.empty((nb_cells, 3), dtype=numpy.float64)
+        widths = numpy.empty(nb_cells, dtype=numpy.float64)
+        thresholds = numpy.empty(nb_cells, dtype=numpy.float64)
+        max_magnitudes = numpy.empty(nb_cells, dtype=numpy.float64)
+        has_children = numpy.empty(nb_cells, dtype=numpy.uint8)
+        nb_leaves = numpy.empty(nb_cells, dtype=numpy.int64)
+        leaves_offsets = numpy.empty(nb_cells + 1, dtype=numpy.int64)
+        cells_leaves = []
+        leaves_offsets[0] = 0
+        for (i, (cell, parent)) in enumerate(cells):
+            levels[i] = cell.level
+            indexes[i] = cell.index
+            parents[i] = parent
+            centers[i] = (cell.center[0], cell.center[1], cell.center[2])
+            widths[i] = cell.width
+            thresholds[i] = cell.threshold
+            max_magnitudes[i] = cell.max_magnitude
+            has_children[i] = cell.has_children
+            nb_leaves[i] = cell.nb_leaves
+            cells_leaves += [leaves_indexes[id(leaf)] for leaf in cell.leaves]
+            leaves_offsets[i + 1] = len(cells_leaves)
+        return [('levels', levels),
+                ('indexes', indexes),
+                ('parents', parents),
+                ('centers', centers),
+                ('widths', widths),
+                ('thresholds', thresholds),
+                ('max_magnitudes', max_magnitudes),
+                ('has_children', has_children),
+                ('nb_leaves', nb_leaves),
+                ('leaves_offsets', leaves_offsets),
+                ('leaves', numpy.array(cells_leaves, dtype=numpy.int64)),
+                ('nb_total_leaves', numpy.array([len(leaves)], dtype=numpy.int64))]
+
+    def load_arrays(self, arrays, leaves):
+        """
+        Rebuild the tree below this empty cell from the arrays created by get_arrays().
+        Returns False if the arrays do not match this cell or the given leaves.
+        """
+        try:
+            if arrays['nb_total_leaves'][0] != len(leaves) or len(arrays['leaves']) > len(leaves):
+                return False
+            if (arrays['levels'][0] != self.level or arrays['widths'][0] != self.width or
+                arrays['thresholds'][0] != self.threshold or tuple(arrays['centers'][0]) != tuple(self.center)):
+                return False
+            levels = arrays['levels']
+            indexes = arrays['indexes'].tolist()
+            parents = arrays['parents'].tolist()
+            centers = arrays['centers']
+            widths = arrays['widths'].tolist()
+            thresholds = arrays['thresholds'].tolist()
+            max_magnitudes = arrays['max_magnitudes'].tolist()
+            has_children = arrays['has_children'].tolist()
+            nb_leaves = arrays['nb_leaves'].tolist()
+            leaves_offsets = arrays['leaves_offsets'].tolist()
+            cells_leaves = arrays['leaves'].tolist()
+        except (KeyError, IndexError) as e:
+            print("Invalid octree arrays:", e)
+            return False
+        cells = []
+        for i in range(len(indexes)):
+            if i == 0:
+                cell = self
+            else:
+                center = centers[i]
+                cell = OctreeNode(int(levels[i]), LPoint3d(center[0], center[1], center[2]), widths[i], thresholds[i], indexes[i])
+                cells[parents[i]].children[indexes[i]] = cell
+            cell.max_magnitude = max_magnitudes[i]
+            cell.has_children = bool(has_children[i])
+            cell.nb_leaves = nb_leaves[i]
+            cell.leaves = [leaves[index] for index in cells_leaves[leaves_offsets[i]:leaves_offsets[i + 1]]]
+            cell.leaves_arrays = None
+            cells.append(cell)
+        return True
+
 class VisibleObjectsTraverser(object):
     def __init__(self, frustum, limit, update_id):
         self.frustum = frustum
@@ -192,3 +365,322 @@ class VisibleObjectsTraverser(object):
             if add:
                 self.collected_leaves.append(leaf)
                 leaf.update_id = self.update_id
+
+class VectorizedVisibleObjectsTraverser(VisibleObjectsTraverser):
+    """
+    Same visibility rules as VisibleObjectsTraverser, but the distance, magnitude limit and
+    frustum planes tests are done for all the leaves of a cell at once using NumPy arrays.
+    """
+    #Below this number of leaves the overhead of NumPy is higher than the scalar loop
+    min_vectorized_leaves = 8
+
+    def __init__(self, frustum, limit, update_id):
+        VisibleObjectsTraverser.__init__(self, frustum, limit, update_id)
+        position = frustum.get_position()
+        self.position = numpy.array([position[0], position[1], position[2]], dtype=numpy.float64)
+        planes = numpy.array([[plane[0], plane[1], plane[2], plane[3]] for plane in frustum.planes], dtype=numpy.float64)
+        self.planes_normals = planes[:, :3].T
+        self.planes_distances = planes[:, 3]
+
+    def traverse(self, octree, leaves):
+        if len(leaves) == 0: return
+        distance = (octree.center - self.frustum.get_position()).length() - octree.radius
+        if distance > 0.0:
+            faintest = app_to_abs_mag(self.limit, distance)
+        else:
+            faintest = 99.0
+        sorted_leaves, positions, magnitudes, extends = octree.get_leaves_arrays()
+        nb_candidates = numpy.searchsorted(magnitudes, faintest)
+        if nb_candidates == 0: return
+        if nb_candidates < self.min_vectorized_leaves:
+            VisibleObjectsTraverser.traverse(self, octree, sorted_leaves[:nb_candidates])
+            return
+        positions = positions[:nb_candidates]
+        deltas = positions - self.position
+        distances = numpy.sqrt(numpy.einsum('ij,ij->i', deltas, deltas))
+        with numpy.errstate(divide='ignore'):
+            app_magnitudes = magnitudes[:nb_candidates] + 5 * (numpy.log10(distances / units.KmPerParsec) - 1)
+        planes_distances = numpy.dot(positions, self.planes_normals) + self.planes_distances
+        in_frustum = (planes_distances <= extends[:nb_candidates, numpy.newaxis]).all(axis=1)
+        visible = (distances <= 0.0) | ((app_magnitudes < self.limit) & in_frustum)
+        update_id = self.update_id
+        for index in numpy.flatnonzero(visible):
+            leaf = sorted_leaves[index]
+            self.collected_leaves.append(leaf)
+            leaf.update_id = update_id
+
+def limit_distance(abs_magnitude, limit):
+    """
+    Distance at which an object of the given absolute magnitude reaches the apparent magnitude limit.
+    """
+    return units.KmPerParsec * 10.0 ** ((limit - abs_magnitude) / 5.0 + 1)
+
+class CellVisibilityState(object):
+    """
+    Visibility result of a cell, the own slacks cover the cell and its leaves and the subtree slacks
+    cover also the children of the cell.
+    """
+    __slots__ = ('generation', 'entered', 'leaves',
+                 'own_reference', 'own_position_slack', 'own_angle_slack',
+                 'reference', 'position_slack', 'angle_slack')
+
+    def __init__(self):
+        self.generation = None
+        self.entered = False
+        self.leaves = []
+        self.own_reference = None
+        self.own_position_slack = 0.0
+        self.own_angle_slack = 0.0
+        self.reference = None
+        self.position_slack = 0.0
+        self.angle_slack = 0.0
+
+class CoherentVisibleObjectsTraverser(object):
+    """
+    Persistent traverser that keeps the visibility results of each cell between frames.
+
+    Each result is stored with the observer position and orientation it was computed for and with the
+    translation and rotation of the observer it stays valid for, i.e. the distance to the nearest magnitude
+    limit or frustum plane crossing. A plane at distance m from a point at range R can not be crossed
+    as long as translation + (R + translation) * rotation < m, which is enforced by allowing m / 2 to each term.
+    Only the cells whose results could have changed are tested again and the differences with the previous
+    update are returned as added and removed leaves.
+    """
+    def __init__(self, octree, limit):
+        self.octree = octree
+        self.limit = limit
+        self.epoch = 0
+        self.generation = 0
+        self.reference = None
+        self.motions = {}
+        self.added = []
+        self.removed = []
+        self.nb_tested_cells = 0
+
+    def invalidate(self):
+        """
+        Force all the cells to be tested again on next update, e.g. when the lens has changed.
+        """
+        self.generation += 1
+
+    def get_added(self):
+        return self.added
+
+    def get_removed(self):
+        return self.removed
+
+    def update(self, frustum, orientation):
+        self.epoch += 1
+        self.frustum = frustum
+        position = frustum.get_position()
+        self.position = LPoint3d(position)
+        self.orientation = LQuaterniond(orientation[0], orientation[1], orientation[2], orientation[3])
+        self.reference = (self.epoch, self.position, self.orientation)
+        self.array_position = numpy.array([position[0], position[1], position[2]], dtype=numpy.float64)
+        planes = numpy.array([[plane[0], plane[1], plane[2], plane[3]] for plane in frustum.planes], dtype=numpy.float64)
+        self.planes_normals = planes[:, :3].T
+        self.planes_distances = planes[:, 3]
+        self.motions = {}
+        self.added = []
+        self.removed = []
+        self.nb_tested_cells = 0
+        self.visit(self.octree, True)
+
+    def get_motion(self, reference):
+        (epoch, position, orientation) = reference
+        motion = self.motions.get(epoch)
+        if motion is None:
+            translation = (self.position - position).length()
+            #acos(w) is not accurate enough for small rotations
+            delta = orientation.conjugate() * self.orientation
+            rotation = 2 * atan2(sqrt(delta[1] * delta[1] + delta[2] * delta[2] + delta[3] * delta[3]), abs(delta[0]))
+            motion = (translation, rotation)
+            self.motions[epoch] = motion
+        return motion
+
+    def frustum_slack(self, center, radius):
+        """
+        Returns True if the sphere is in the frustum and the distance to the nearest plane crossing.
+        """
+        outside = None
+        inside = float('inf')
+        for plane in self.frustum.planes:
+            excess = plane.dist_to_plane(center) - radius
+            if excess > 0.0:
+                if outside is None or excess > outside:
+                    outside = excess
+            elif -excess < inside:
+                inside = -excess
+        if outside is not None:
+            return (False, outside)
+        return (True, inside)
+
+    def enter(self, cell):
+        distance = (cell.center - self.position).length()
+        cell_distance = distance - cell.radius
+        if cell_distance <= 0.0:
+            return (True, -cell_distance, float('inf'))
+        magnitude_slack = limit_distance(cell.max_magnitude, self.limit) - cell_distance
+        if magnitude_slack < 0.0:
+            return (False, -magnitude_slack, float('inf'))
+        (entered, frustum_slack) = self.frustum_slack(cell.center, cell.radius)
+        angle_slack = frustum_slack / (2 * distance + frustum_slack)
+        if entered:
+            return (True, min(magnitude_slack, frustum_slack / 2), angle_slack)
+        return (False, frustum_slack / 2, angle_slack)
+
+    def test_leaves(self, cell):
+        if len(cell.leaves) == 0:
+            return ([], float('inf'), float('inf'))
+        cell_distance = (cell.center - self.position).length() - cell.radius
+        sorted_leaves, positions, magnitudes, extends = cell.get_leaves_arrays()
+        if cell_distance > 0.0:
+            faintest = app_to_abs_mag(self.limit, cell_distance)
+            nb_candidates = numpy.searchsorted(magnitudes, faintest)
+        else:
+            nb_candidates = len(sorted_leaves)
+        if nb_candidates < len(sorted_leaves):
+            position_slack = cell_distance - limit_distance(magnitudes[nb_candidates], self.limit)
+        else:
+            position_slack = float('inf')
+        if nb_candidates == 0:
+            return ([], position_slack, float('inf'))
+        positions = positions[:nb_candidates]
+        extends = extends[:nb_candidates]
+        deltas = positions - self.array_position
+        distances = numpy.sqrt(numpy.einsum('ij,ij->i', deltas, deltas))
+        magnitude_slacks = limit_distance(magnitudes[:nb_candidates], self.limit) - distances
+        excesses = numpy.dot(positions, self.planes_normals) + self.planes_distances - extends[:, numpy.newaxis]
+        max_excesses = excesses.max(axis=1)
+        in_frustum = max_excesses <= 0.0
+        at_origin = distances <= 0.0
+        visible = at_origin | ((magnitude_slacks > 0.0) & in_frustum)
+        frustum_slacks = numpy.abs(max_excesses)
+        #Visible leaves can leave the view through the magnitude limit or the frustum, hidden leaves can
+        #only appear once the reason they were culled for is removed
+        leaves_position_slacks = numpy.where(visible, numpy.minimum(magnitude_slacks, frustum_slacks / 2),
+                                             numpy.where(magnitude_slacks <= 0.0, -magnitude_slacks, frustum_slacks / 2))
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            leaves_angle_slacks = numpy.where(visible | (magnitude_slacks > 0.0),
+                                              frustum_slacks / (2 * distances + frustum_slacks), numpy.inf)
+        leaves_position_slacks[at_origin] = 0.0
+        leaves_angle_slacks[at_origin] = 0.0
+        position_slack = min(position_slack, leaves_position_slacks.min())
+        angle_slack = leaves_angle_slacks.min()
+        leaves = [sorted_leaves[index] for index in numpy.flatnonzero(visible)]
+        return (leaves, position_slack, angle_slack)
+
+    def visit(self, cell, root=False):
+        state = cell.visibility_state
+        own_valid = False
+        if state is None:
+            state = CellVisibilityState()
+            cell.visibility_state = state
+        elif state.generation == self.generation:
+            (translation, rotation) = self.get_motion(state.reference)
+            if translation < state.position_slack and rotation < state.angle_slack:
+                return (state.position_slack - translation, state.angle_slack - rotation)
+            (translation, rotation) = self.get_motion(state.own_reference)
+            own_valid = translation < state.own_position_slack and rotation < state.own_angle_slack
+        if own_valid:
+            position_slack = state.own_position_slack - translation
+            angle_slack = state.own_angle_slack - rotation
+        else:
+            self.nb_tested_cells += 1
+            if root:
+                (entered, position_slack, angle_slack) = (True, float('inf'), float('inf'))
+            else:
+                (entered, position_slack, angle_slack) = self.enter(cell)
+            if entered:
+                (leaves, leaves_position_slack, leaves_angle_slack) = self.test_leaves(cell)
+                self.update_leaves(state, leaves)
+                position_slack = min(position_slack, leaves_position_slack)
+                angle_slack = min(angle_slack, leaves_angle_slack)
+            else:
+                self.hide(cell)
+            state.generation = self.generation
+            state.entered = entered
+            state.own_reference = self.reference
+            state.own_position_slack = position_slack
+            state.own_angle_slack = angle_slack
+        if state.entered:
+            for child in cell.children:
+                if child is not None:
+                    (child_position_slack, child_angle_slack) = self.visit(child)
+                    position_slack = min(position_slack, child_position_slack)
+                    angle_slack = min(angle_slack, child_angle_slack)
+        state.reference = self.reference
+        state.position_slack = position_slack
+        state.angle_slack = angle_slack
+        return (position_slack, angle_slack)
+
+    def update_leaves(self, state, leaves):
+        previous = state.leaves
+        if len(previous) == 0:
+            self.added += leaves
+        else:
+            previous_set = set(previous)
+            leaves_set = set(leaves)
+            self.added += [leaf for leaf in leaves if leaf not in previous_set]
+            self.removed += [leaf for leaf in previous if leaf not in leaves_set]
+        state.leaves = leaves
+
+    def hide(self, cell):
+        state = cell.visibility_state
+        self.removed += state.leaves
+        state.leaves = []
+        if state.entered:
+            for child in cell.children:
+                if child is not None and child.visibility_state is not None:
+                    self.hide(child)
+                    child.visibility_state = None
+        state.entered = False
+
+if __name__ == '__main__':
+    #Benchmark of the vectorized traverser against the per-leaf traverser on random star fields
+    from panda3d.core import PerspectiveLens, LMatrix4
+    from .pyfrustum import InfiniteFrustum
+    from random import seed, uniform, gauss
+    from time import time
+
+    class BenchmarkLeaf(object):
+        def __init__(self, name, position, abs_magnitude, extend):
+            self.name = name
+            self._global_position = position
+            self.abs_magnitude = abs_magnitude
+            self._extend = extend
+            self.update_id = 0
+
+        def get_name(self):
+            return self.name
+
+        def get_global_position(self):
+            return self._global_position
+
+        def get_abs_magnitude(self):
+            return self.abs_magnitude
+
+    seed(0)
+    lens = PerspectiveLens()
+    lens.set_fov(60)
+    frustum = InfiniteFrustum(lens.make_bounds(), LMatrix4.ident_mat(), LPoint3d())
+    for nb_stars in (10000, 100000, 1000000):
+        width = 10000.0 * units.Ly
+        octree = OctreeNode(0, LPoint3d(10 * units.Ly, 10 * units.Ly, 10 * units.Ly), width, app_to_abs_mag(6.0, width * sqrt(3)))
+        radius = 1000.0 * units.Ly
+        for i in range(nb_stars):
+            position = LPoint3d(uniform(-radius, radius), uniform(-radius, radius), uniform(-radius, radius))
+            octree.add(BenchmarkLeaf("Star %d" % i, position, gauss(4.0, 3.0), 1e6))
+        start = time()
+        reference = VisibleObjectsTraverser(frustum, 6.0, 1)
+        octree.traverse(reference)
+        reference_time = time() - start
+        #First traversal builds the cells arrays
+        octree.traverse(VectorizedVisibleObjectsTraverser(frustum, 6.0, 2))
+        start = time()
+        vectorized = VectorizedVisibleObjectsTraverser(frustum, 6.0, 3)
+        octree.traverse(vectorized)
+        vectorized_time = time() - start
+        same = set(map(id, reference.get_leaves())) == set(map(id, vectorized.get_leaves()))
+        print("%d stars: %d visible, per-leaf %.1f ms, vectorized %.1f ms, same leaves: %s" %
+              (nb_stars, vectorized.get_num_leaves(), reference_time * 1000, vectorized_time * 1000, same))
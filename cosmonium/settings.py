@@ -34,6 +34,57 @@ version = '0.1.2-dev'
 
 use_double = LPoint3 == LPoint3d
 cache_yaml = True
+cache_stars = True
+#Keep the cells of the octree of the stars, rebuilt when the catalogs change
+cache_octree = True
+cache_vsop87 = True
+#Keep the items parsed from the Celestia catalogs
+cache_celestia = True
+#Parse the Celestia catalogs with the fast streaming parser instead of ply
+fast_celestia_parser = True
+#Number of processes used to parse the catalogs, 0 to use all the cores and 1 to parse them in the loader thread
+#It is capped by the number of files that are not cached
+load_workers = 0
+#The bodies of these SSC files are only created when their parent system is resolved or when they are looked up
+deferred_ssc_files = ['minormoons.ssc', 'numberedmoons.ssc', 'asteroids.ssc', 'outersys.ssc']
+#Maximum number of deferred bodies created in each frame, 0 to create them all at once
+deferred_bodies_per_frame = 200
+#Resolve the data files against a cached listing of the searched directories instead of scanning them
+dir_index = True
+#Minimum delay in seconds before checking again if a searched directory has been modified
+dir_index_check_interval = 2.0
+#Update the visible cells of the octree from the previous frame instead of traversing the whole octree
+coherent_octree = True
+#Calculate the position relative to the observer and the visibility of the stars in one batch
+batch_obs = True
+#Solve the Kepler equation of the children of a system in one batch
+batch_orbits = True
+#Calculate the rotations of the children of a system in one batch
+batch_rotations = True
+#Use a bounding sphere hierarchy to find the closest body of the large systems
+spatial_index = True
+#The hierarchy is rebuilt when the children could have moved more than that fraction of its size
+spatial_index_max_drift = 0.1
+#Check the shadows between all the bodies of a system instead of only the primary
+eclipses_broad_phase = True
+#The shadow of a pair is checked again when the bodies moved more than that fraction of the smallest radius
+eclipse_recheck_threshold = 0.01
+#Defer the update of the moving bodies while their displacement on screen is smaller than that fraction of pixel
+update_scheduler = True
+update_max_pixel_shift = 0.25
+#Maximum number of frames the update of a body can be deferred
+update_max_interval = 60
+#Terms of the VSOP87 series with a smaller amplitude are ignored (radians or AU), 0 to use the full series
+vsop87_precision = 1e-7
+#Above this time rate, the costly orbits are replaced by Chebyshev ephemeris fitted in the background
+ephemeris_cache = True
+ephemeris_time_rate = 30 * 24 * 3600
+ephemeris_window = 36525.0
+ephemeris_segments_per_period = 8
+ephemeris_max_segments = 4096
+ephemeris_degree = 10
+#Maximum number of fitted windows kept in the ephemeris cache, the least recently used are removed
+ephemeris_cache_max_files = 256
 prc_file = 'config.prc'
 
 #OpenGL user configuration
@@ -106,6 +157,10 @@ screenshot_path = "screenshots"
 screenshot_filename = "screenshot-%Y-%m-%d-%H-%M-%S-%~f.%~e"
 screenshot_format = "png"
 
+profile_path = "profiles"
+profile_filename = "profile-%Y-%m-%d-%H-%M-%S"
+profile_nb_frames = 1000
+
 use_inv_scaling=True
 use_log_scaling=False
 use_depth_scaling = use_inv_scaling or use_log_scaling
@@ -179,6 +234,8 @@ show_orbits = False
 orbit_fade = 20
 label_fade = 20
 orbit_thickness = 0.6
+#Draw the orbits of the children of a system with a single geom
+batch_orbit_lines = True
 
 grid_thickness = 0.5
 
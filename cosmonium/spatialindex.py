@@ -0,0 +1,164 @@
+#
+#This file is part of Cosmonium.
+#
+#Copyright (C) 2018-2019 Laurent Deru.
+#
+#Cosmonium is free software: you can redistribute it and/or modify
+#it under the terms of the GNU General Public License as published by
+#the Free Software Foundation, either version 3 of the License, or
+#(at your option) any later version.
+#
+#Cosmonium is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#GNU General Public License for more details.
+#
+#You should have received a copy of the GNU General Public License
+#along with Cosmonium.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+from __future__ import print_function
+from __future__ import absolute_import
+
+from . import settings
+
+from heapq import heappush, heappop
+from math import sqrt
+import numpy
+
+class BodySphereTree(object):
+    """
+    Bounding sphere hierarchy over the children of a system, used to find the closest surface to the observer.
+    The positions of the children are taken relative to the center of the system when the tree is built.
+    As the children move, the radius of each node is inflated by the distance its members could have traveled
+    since then, the tree is rebuilt when that drift becomes too large compared to the size of the tree.
+    """
+    leaf_size = 8
+    nb_builds = 0
+    nb_visited = 0
+
+    def __init__(self, system):
+        self.system = system
+        self.build_time = None
+        self.children = []
+        #Children whose motion can not be bounded, they are always checked
+        self.unbounded = []
+        #Each node is a tuple (radius, max speed, sub nodes or None, children of the leaf)
+        self.nodes = []
+        self.node_centers = []
+
+    def get_relative_position(self, child):
+        system = self.system
+        position = (child._global_position - system._global_position) + (child._local_position - system._local_position)
+        return (position[0], position[1], position[2])
+
+    def build(self, time):
+        BodySphereTree.nb_builds += 1
+        self.children = []
+        self.unbounded = []
+        positions = []
+        radii = []
+        speeds = []
+        for child in self.system.children:
+            speed = child.orbit.get_max_speed() if not child.orbit.frame.dynamic else None
+            if speed is None or child._local_position is None:
+                self.unbounded.append(child)
+                continue
+            self.children.append(child)
+            positions.append(self.get_relative_position(child))
+            if child.is_system():
+                radii.append(child.get_extend())
+            else:
+                radii.append(child.get_apparent_radius())
+            speeds.append(speed)
+        self.build_time = time
+        self.nodes = []
+        self.node_centers = []
+        if len(self.children) > 0:
+            self.build_nodes(numpy.array(positions), numpy.array(radii), numpy.array(speeds))
+
+    def build_nodes(self, positions, radii, speeds):
+        """
+        Build the hierarchy one level at a time, the members of each node are a contiguous range of the order array
+        and the bounds of all the nodes of a level are computed at once.
+        """
+        order = numpy.arange(len(positions))
+        #Nodes of the current level, as (start, count, node index)
+        segments = [(0, len(positions), 0)]
+        self.nodes.append(None)
+        self.node_centers.append(None)
+        while len(segments) > 0:
+            (starts, counts, node_ids) = (numpy.array(values) for values in zip(*segments))
+            local_starts = numpy.cumsum(counts) - counts
+            segment_ids = numpy.repeat(numpy.arange(len(segments)), counts)
+            indices = numpy.arange(counts.sum()) - local_starts[segment_ids] + starts[segment_ids]
+            members = order[indices]
+            points = positions[members]
+            mins = numpy.minimum.reduceat(points, local_starts)
+            maxs = numpy.maximum.reduceat(points, local_starts)
+            centers = (mins + maxs) / 2.0
+            extents = numpy.sqrt(((points - centers[segment_ids]) ** 2).sum(axis=1)) + radii[members]
+            node_radii = numpy.maximum.reduceat(extents, local_starts).tolist()
+            node_speeds = numpy.maximum.reduceat(speeds[members], local_starts).tolist()
+            #Sort the members of each node along the largest axis of its bounding box
+            axis = numpy.argmax(maxs - mins, axis=1)
+            keys = points[numpy.arange(len(points)), axis[segment_ids]]
+            order[indices] = members[numpy.lexsort((keys, segment_ids))]
+            next_segments = []
+            for (i, (start, count, node)) in enumerate(segments):
+                self.node_centers[node] = tuple(centers[i].tolist())
+                if count <= self.leaf_size:
+                    self.nodes[node] = (node_radii[i], node_speeds[i], None, [self.children[j] for j in order[start:start + count].tolist()])
+                else:
+                    half = count // 2
+                    left = len(self.nodes)
+                    self.nodes += [None, None]
+                    self.node_centers += [None, None]
+                    self.nodes[node] = (node_radii[i], node_speeds[i], (left, left + 1), None)
+                    next_segments.append((start, half, left))
+                    next_segments.append((start + half, count - half, left + 1))
+            segments = next_segments
+
+    def needs_rebuild(self, time):
+        if self.build_time is None: return True
+        if len(self.nodes) == 0: return False
+        (radius, speed, _, _) = self.nodes[0]
+        return speed * abs(time - self.build_time) > settings.spatial_index_max_drift * radius
+
+    def get_bound(self, node, position, drift_time):
+        (radius, speed, _, _) = self.nodes[node]
+        (x, y, z) = self.node_centers[node]
+        return sqrt((x - position[0]) ** 2 + (y - position[1]) ** 2 + (z - position[2]) ** 2) - radius - speed * drift_time
+
+    def find_closest(self, position, time, distance=None, body=None):
+        """
+        Returns the smallest distance to the surface of the children from the given position, relative to the center
+        of the system, and the child, or the given distance and body if no child is closer.
+        """
+        for child in self.unbounded:
+            (distance, body) = self.check_child(child, distance, body)
+        if len(self.nodes) == 0:
+            return (distance, body)
+        position = (position[0], position[1], position[2])
+        drift_time = abs(time - self.build_time)
+        queue = [(self.get_bound(0, position, drift_time), 0)]
+        while len(queue) > 0:
+            (bound, node) = heappop(queue)
+            if distance is not None and bound >= distance: break
+            BodySphereTree.nb_visited += 1
+            (_, _, sub_nodes, children) = self.nodes[node]
+            if sub_nodes is not None:
+                for sub_node in sub_nodes:
+                    heappush(queue, (self.get_bound(sub_node, position, drift_time), sub_node))
+            else:
+                for child in children:
+                    (distance, body) = self.check_child(child, distance, body)
+        return (distance, body)
+
+    def check_child(self, child, distance, body):
+        if child.is_system():
+            return child.find_closest(distance, body)
+        if child.distance_to_obs is not None and (distance is None or child.distance_to_obs - child.get_apparent_radius() < distance):
+            distance = child.distance_to_obs - child.get_apparent_radius()
+            body = child
+        return (distance, body)
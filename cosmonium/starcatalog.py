@@ -0,0 +1,341 @@
+#
+#This file is part of Cosmonium.
+#
+#Copyright (C) 2018-2019 Laurent Deru.
+#
+#Cosmonium is free software: you can redistribute it and/or modify
+#it under the terms of the GNU General Public License as published by
+#the Free Software Foundation, either version 3 of the License, or
+#(at your option) any later version.
+#
+#Cosmonium is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#GNU General Public License for more details.
+#
+#You should have received a copy of the GNU General Public License
+#along with Cosmonium.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+from __future__ import print_function
+from __future__ import absolute_import
+
+from panda3d.core import LPoint3d, LColor
+
+from .bodies import Star
+from .astro.orbits import FixedPosition
+from .astro.rotations import UnknownRotation
+from .astro.spectraltype import spectralTypeIntDecoder
+from .astro.blackbody import temp_to_RGB
+from .astro import units
+
+from bisect import bisect_left
+import numpy
+
+class StarNamesTable(object):
+    """
+    In-memory names table, built from a dict of catalog number to list of names.
+    """
+    def __init__(self, names):
+        self.names = names
+        self.index = {}
+        for (catalog_number, aliases) in names.items():
+            for alias in aliases:
+                self.index[alias.upper()] = catalog_number
+        self.sorted_keys = sorted(self.index.keys())
+
+    def get_names(self, catalog_number):
+        return self.names.get(catalog_number)
+
+    def find(self, name_up):
+        return self.index.get(name_up)
+
+    def startswith(self, text):
+        result = []
+        pos = bisect_left(self.sorted_keys, text)
+        while pos < len(self.sorted_keys):
+            key = self.sorted_keys[pos]
+            if not key.startswith(text): break
+            result.append(key)
+            pos += 1
+        return result
+
+    def get_arrays(self):
+        numbers = sorted(self.names.keys())
+        names_blob = bytearray()
+        names_offsets = [0]
+        for catalog_number in numbers:
+            names_blob += '\0'.join(self.names[catalog_number]).encode('utf-8')
+            names_offsets.append(len(names_blob))
+        keys = sorted((key.encode('utf-8'), catalog_number) for (key, catalog_number) in self.index.items())
+        index_blob = bytearray()
+        index_offsets = [0]
+        for (key, catalog_number) in keys:
+            index_blob += key
+            index_offsets.append(len(index_blob))
+        return [('names_numbers', numpy.array(numbers, dtype=numpy.int32)),
+                ('names_offsets', numpy.array(names_offsets, dtype=numpy.int64)),
+                ('names_blob', numpy.frombuffer(bytes(names_blob), dtype=numpy.uint8)),
+                ('index_numbers', numpy.array([catalog_number for (key, catalog_number) in keys], dtype=numpy.int32)),
+                ('index_offsets', numpy.array(index_offsets, dtype=numpy.int64)),
+                ('index_blob', numpy.frombuffer(bytes(index_blob), dtype=numpy.uint8))]
+
+class MappedStarNamesKeys(object):
+    """
+    Read-only sequence view of the sorted names index, used for binary search.
+    """
+    def __init__(self, offsets, blob):
+        self.offsets = offsets
+        self.blob = blob
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        return self.blob[self.offsets[index]:self.offsets[index + 1]].tobytes()
+
+class MappedStarNamesTable(object):
+    """
+    Names table backed by the arrays created by StarNamesTable.get_arrays().
+    The names are only decoded when they are requested.
+    """
+    def __init__(self, arrays):
+        self.names_numbers = arrays['names_numbers']
+        self.names_offsets = arrays['names_offsets']
+        self.names_blob = arrays['names_blob']
+        self.index_numbers = arrays['index_numbers']
+        self.keys = MappedStarNamesKeys(arrays['index_offsets'], arrays['index_blob'])
+
+    def get_names(self, catalog_number):
+        pos = numpy.searchsorted(self.names_numbers, catalog_number)
+        if pos < len(self.names_numbers) and self.names_numbers[pos] == catalog_number:
+            return self.names_blob[self.names_offsets[pos]:self.names_offsets[pos + 1]].tobytes().decode('utf-8').split('\0')
+        return None
+
+    def find(self, name_up):
+        key = name_up.encode('utf-8')
+        pos = bisect_left(self.keys, key)
+        if pos < len(self.keys) and self.keys[pos] == key:
+            return int(self.index_numbers[pos])
+        return None
+
+    def startswith(self, text):
+        prefix = text.encode('utf-8')
+        result = []
+        pos = bisect_left(self.keys, prefix)
+        while pos < len(self.keys):
+            key = self.keys[pos]
+            if not key.startswith(prefix): break
+            result.append(key.decode('utf-8'))
+            pos += 1
+        return result
+
+class StarCatalogEntry(object):
+    """
+    Lightweight proxy of a catalog row, used as octree leaf until the row is
+    turned into a real Star object.
+    """
+    __slots__ = ('catalog', 'index', 'update_id')
+
+    def __init__(self, catalog, index):
+        self.catalog = catalog
+        self.index = index
+        self.update_id = 0
+
+    def get_name(self):
+        return self.catalog.get_names(self.index)[0]
+
+    def get_global_position(self):
+        return self.catalog.get_position(self.index)
+
+    def get_abs_magnitude(self):
+        return float(self.catalog.abs_magnitudes[self.index])
+
+    def get_extend(self):
+        return float(self.catalog.radii[self.index])
+
+    def get_body(self):
+        return self.catalog.get_star(self.index)
+
+    _global_position = property(get_global_position)
+    abs_magnitude = property(get_abs_magnitude)
+    _extend = property(get_extend)
+
+class StarCatalog(object):
+    """
+    Columnar store of point-like stars. The rows are kept in NumPy arrays and
+    a Star object is only created when the row is visible, selected or
+    looked up by name.
+    """
+    version = 1
+    #The completion returns the rows without creating the stars, see StarCatalogEntry.get_body()
+    lazy_completion = True
+
+    def __init__(self, catalog_numbers, positions, abs_magnitudes, spectral_types, names=None, surface_factory=None,
+                 colors=None, radii=None, sorted_indexes=None):
+        self.catalog_numbers = numpy.asarray(catalog_numbers, dtype=numpy.int32)
+        self.positions = numpy.asarray(positions, dtype=numpy.float64)
+        self.abs_magnitudes = numpy.asarray(abs_magnitudes, dtype=numpy.float32)
+        self.spectral_types = numpy.asarray(spectral_types, dtype=numpy.int16)
+        self.nb_stars = len(self.catalog_numbers)
+        if names is None:
+            names = {}
+        if isinstance(names, dict):
+            names = StarNamesTable(names)
+        self.names = names
+        self.surface_factory = surface_factory
+        self.parent = None
+        self.removed = numpy.zeros(self.nb_stars, dtype=numpy.bool_)
+        self.bodies = {}
+        self.bodies_index = {}
+        if colors is None or radii is None:
+            self.calc_physical_parameters()
+        else:
+            self.colors = colors
+            self.radii = radii
+        self.build_indexes(sorted_indexes)
+
+    @classmethod
+    def from_arrays(cls, arrays, surface_factory=None):
+        return cls(arrays['catalog_numbers'],
+                   arrays['positions'],
+                   arrays['abs_magnitudes'],
+                   arrays['spectral_types'],
+                   names=MappedStarNamesTable(arrays),
+                   surface_factory=surface_factory,
+                   colors=arrays['colors'],
+                   radii=arrays['radii'],
+                   sorted_indexes=arrays['sorted_indexes'])
+
+    def get_arrays(self):
+        arrays = [('catalog_numbers', self.catalog_numbers),
+                  ('positions', self.positions),
+                  ('abs_magnitudes', self.abs_magnitudes),
+                  ('spectral_types', self.spectral_types),
+                  ('colors', self.colors),
+                  ('radii', self.radii),
+                  ('sorted_indexes', self.sorted_indexes)]
+        arrays += self.names.get_arrays()
+        return arrays
+
+    def calc_physical_parameters(self):
+        #There are only a few distinct spectral types, decode them once and broadcast the result
+        codes, inverse = numpy.unique(self.spectral_types, return_inverse=True)
+        temperatures = numpy.empty(len(codes), dtype=numpy.float64)
+        white_dwarfs = numpy.empty(len(codes), dtype=numpy.bool_)
+        colors = numpy.empty((len(codes), 4), dtype=numpy.float32)
+        for (i, code) in enumerate(codes):
+            spectral_type = spectralTypeIntDecoder.decode(int(code))
+            temperatures[i] = spectral_type.temperature
+            white_dwarfs[i] = spectral_type.white_dwarf
+            color = temp_to_RGB(spectral_type.temperature)
+            colors[i] = (color[0], color[1], color[2], color[3])
+        self.colors = colors[inverse]
+        temperature_ratio = units.sun_temperature / temperatures[inverse]
+        luminosity_ratio = numpy.power(10.0, 0.4 * (units.sun_abs_magnitude - self.abs_magnitudes.astype(numpy.float64)))
+        radii = temperature_ratio * temperature_ratio * numpy.sqrt(luminosity_ratio) * units.sun_radius
+        #TODO: Find radius-luminosity relationship or use mass
+        self.radii = numpy.where(white_dwarfs[inverse], 7000.0, radii)
+
+    def build_indexes(self, sorted_indexes=None):
+        if sorted_indexes is None:
+            sorted_indexes = numpy.argsort(self.catalog_numbers, kind='mergesort')
+        self.sorted_indexes = sorted_indexes
+        self.sorted_numbers = self.catalog_numbers[self.sorted_indexes]
+
+    def set_parent(self, parent):
+        self.parent = parent
+
+    def get_position(self, index):
+        return LPoint3d(*self.positions[index])
+
+    def get_names(self, index):
+        catalog_number = int(self.catalog_numbers[index])
+        names = self.names.get_names(catalog_number)
+        if names is None:
+            names = ["HIP %d" % catalog_number]
+        return names
+
+    def find_index(self, catalog_number):
+        pos = numpy.searchsorted(self.sorted_numbers, catalog_number)
+        if pos < self.nb_stars and self.sorted_numbers[pos] == catalog_number:
+            return int(self.sorted_indexes[pos])
+        return None
+
+    def find_index_by_name(self, name):
+        name_up = name.upper()
+        catalog_number = self.names.find(name_up)
+        if catalog_number is None and name_up.startswith('HIP '):
+            try:
+                catalog_number = int(name_up[4:])
+            except ValueError:
+                return None
+        if catalog_number is None:
+            return None
+        index = self.find_index(catalog_number)
+        if index is None or self.removed[index]:
+            return None
+        return index
+
+    def get(self, name):
+        index = self.find_index_by_name(name)
+        if index is not None:
+            return self.get_star(index)
+        return None
+
+    def get_exact_name(self, index, name_up):
+        for name in self.get_names(index):
+            if name.upper() == name_up:
+                return name
+        return name_up
+
+    def names_startswith(self, text):
+        """
+        Returns the list of (exact name, entry) of the rows with a name starting with the given text.
+        """
+        result = []
+        for key in self.names.startswith(text.upper()):
+            index = self.find_index_by_name(key)
+            if index is not None:
+                result.append((self.get_exact_name(index, key), StarCatalogEntry(self, index)))
+        return result
+
+    def create_star(self, index):
+        orbit = FixedPosition(position=self.get_position(index))
+        star = Star(self.get_names(index),
+                    surface_factory=self.surface_factory,
+                    spectral_type=spectralTypeIntDecoder.decode(int(self.spectral_types[index])),
+                    abs_magnitude=float(self.abs_magnitudes[index]),
+                    radius=float(self.radii[index]),
+                    point_color=LColor(*self.colors[index].tolist()),
+                    orbit=orbit,
+                    rotation=UnknownRotation())
+        return star
+
+    def get_star(self, index):
+        star = self.bodies.get(index)
+        if star is None and not self.removed[index]:
+            star = self.create_star(index)
+            self.bodies[index] = star
+            self.bodies_index[star] = index
+            if self.parent is not None:
+                self.parent.add_child_star_fast(star)
+        return star
+
+    def remove(self, body):
+        index = self.bodies_index.pop(body, None)
+        if index is not None:
+            del self.bodies[index]
+            self.removed[index] = True
+
+    def create_entries(self):
+        """
+        Returns the objects of the rows not removed, in row order: the star if it was already created, an entry otherwise.
+        The order does not depend on the stars created before.
+        """
+        entries = []
+        for index in numpy.flatnonzero(~self.removed):
+            index = int(index)
+            star = self.bodies.get(index)
+            entries.append(star if star is not None else StarCatalogEntry(self, index))
+        return entries
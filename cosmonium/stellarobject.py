@@ -31,6 +31,7 @@ from .astro.astro import abs_to_app_mag
 from .bodyclass import bodyClasses
 from .catalogs import objectsDB
 from .parameters import ParametersGroup
+from .updatescheduler import updateScheduler
 from . import settings
 from .settings import smallest_glare_mag
 from .utils import mag_to_scale, srgb_to_linear
@@ -107,6 +108,7 @@ class StellarObject(LabelledObject):
     nb_obs = 0
     nb_visibility = 0
     nb_instance = 0
+    nb_update_skipped = 0
 
     def __init__(self, names, orbit=None, rotation=None, body_class=None, point_color=None, description=''):
         LabelledObject.__init__(self, names)
@@ -131,6 +133,8 @@ class StellarObject(LabelledObject):
         self.in_view = False
         self.selected = False
         self.update_id = 0
+        self.last_update_time = None
+        self.last_update_frame = 0
         self.visibility_override = False
         #Cached values
         self._position = LPoint3d()
@@ -163,9 +167,11 @@ class StellarObject(LabelledObject):
         self.init_annotations = False
         self.init_components = False
         self.update_frozen = False
+        self.static = False
         #TODO: Should be done properly
         self.orbit.body = self
         self.rotation.body = self
+        self.check_static()
         objectsDB.add(self)
 
     def is_system(self):
@@ -203,6 +209,16 @@ class StellarObject(LabelledObject):
             if self.orbit_object is not None:
                 self.orbit_object.update_user_parameters()
         self.rotation.update_user_parameters()
+        self.update_frozen = False
+        self.last_update_time = None
+        updateScheduler.invalidate()
+        #The bounds of the spatial index of the parent are no longer valid
+        if isinstance(self.orbit, FixedOrbit) and self.system is not None:
+            moved = self.system
+        else:
+            moved = self
+        if moved.parent is not None and moved.parent.is_system():
+            moved.parent.spatial_index = None
 
     def get_fullname(self, separator='/'):
         if hasattr(self, "primary") and self.primary is not None:
@@ -273,6 +289,7 @@ class StellarObject(LabelledObject):
             self.orbit_object = None
         self.orbit = orbit
         self.orbit.set_body(self)
+        self.check_static()
         if self.has_orbit and self.init_annotations:
             self.create_orbit_object()
 
@@ -280,6 +297,16 @@ class StellarObject(LabelledObject):
         self.rotation = rotation
         if self.rotation:
             self.rotation.body = self
+            self.check_static()
+
+    def check_static(self):
+        """
+        A body is static if its position and rotation can not change with time, in that case its transforms
+        are computed once and the per-frame update is skipped while the body is not resolved.
+        """
+        self.static = not (self.orbit.dynamic or self.orbit.frame.dynamic or
+                           self.rotation.dynamic or self.rotation.frame.dynamic)
+        self.update_frozen = False
 
     def find_by_name(self, name, name_up=None):
         if self.is_named(name, name_up):
@@ -441,7 +468,7 @@ class StellarObject(LabelledObject):
         if self.star is not None:
             (self.vector_to_star, self.distance_to_star) = self.calc_local_distance_to(self.star.get_local_position())
         CompositeObject.update(self, time)
-        self.update_frozen = not self.resolved and not (self.orbit.dynamic or self.rotation.dynamic)
+        self.update_frozen = self.static and not self.resolved
 
     def first_update_obs(self, observer):
         self.update_obs(observer)
@@ -21,11 +21,23 @@ from __future__ import print_function
 from __future__ import absolute_import
 
 from .stellarobject import StellarObject
+from .annotations import OrbitBatch
+from .spatialindex import BodySphereTree
+from .eclipses import EclipseBroadPhase
+from .updatescheduler import updateScheduler
 from .catalogs import ObjectsDB, objectsDB
+from .deferredbodies import DeferredBodiesCatalog, deferredBodies
+from .astro.orbits import EllipticalOrbit, EllipticalOrbitsBatch
+from .astro.rotations import AxisRotation, AxisRotationsBatch
+from .astro.kepler import native_kepler
 from .astro.astro import lum_to_abs_mag, abs_mag_to_lum
+from . import settings
 
 class StellarSystem(StellarObject):
     virtual_object = True
+    min_batch_orbits = 4
+    min_batch_rotations = 4
+    min_indexed_children = 16
 
     def __init__(self, names, orbit=None, rotation=None, body_class=None, point_color=None, description=''):
         StellarObject.__init__(self, names, orbit, rotation, body_class, point_color, description)
@@ -36,10 +48,22 @@ class StellarSystem(StellarObject):
         self.has_halo = False
         self.was_visible = True
         self.abs_magnitude = None
+        self.orbit_batch = None
+        self.spatial_index = None
+        self.orbits_batch = None
+        self.rotations_batch = None
+        #Children not yet created, see DeferredBody
+        self.deferred_children = []
 
     def is_system(self):
         return True
 
+    def get_orbit_batch(self):
+        if self.orbit_batch is None:
+            self.orbit_batch = OrbitBatch(self)
+            self.orbit_batch.create_instance()
+        return self.orbit_batch
+
     def apply_func(self, func):
         StellarObject.apply_func(self, func)
         for child in self.children:
@@ -55,6 +79,9 @@ class StellarSystem(StellarObject):
                 found = child.find_by_name(name, name_up)
                 if found is not None:
                     return found
+            for record in self.deferred_children:
+                if record.body is None and record.is_named(name, name_up):
+                    return self.create_deferred_child(record)
             return None
 
     def find_child_by_name(self, name, return_system=False):
@@ -69,6 +96,9 @@ class StellarSystem(StellarObject):
                     return child
                 else:
                     return child.primary
+        for record in self.deferred_children:
+            if record.body is None and record.is_named(name):
+                return self.create_deferred_child(record)
         return None
 
     def find_by_path(self, path, return_system=False, first=True, separator='/'):
@@ -103,6 +133,14 @@ class StellarSystem(StellarObject):
         return None
 
     def find_closest(self, distance=None, body=None):
+        if settings.spatial_index and len(self.children) >= self.min_indexed_children and self.rel_position is not None:
+            time = self.context.time.time_full
+            if self.spatial_index is None:
+                self.spatial_index = BodySphereTree(self)
+            if self.spatial_index.needs_rebuild(time):
+                self.spatial_index.build(time)
+            #The observer position relative to the center of the system
+            return self.spatial_index.find_closest(-self.rel_position, time, distance, body)
         for child in self.children:
             if isinstance(child, StellarSystem):
                 (distance, body) = child.find_closest(distance, body)
@@ -125,10 +163,42 @@ class StellarSystem(StellarObject):
         #print("Add child", child.get_name(), "to", self.get_name())
         self.children.append(child)
         child.set_parent(self)
+        self.spatial_index = None
+        self.orbits_batch = None
+        self.rotations_batch = None
         #TODO: Temporary workaround until multiple stars are supported
         if self.star is not None:
             child.set_star(self.star)
 
+    def add_deferred_child(self, record):
+        record.parent = self
+        self.deferred_children.append(record)
+        deferredBodies.add(record)
+        if record.extend > self._extend:
+            self._extend = record.extend
+
+    def create_deferred_child(self, record):
+        #The record stays in the deferred children until the system is resolved, it is skipped once created
+        if record.body is None:
+            self.create_body(record)
+        return record.body
+
+    def create_deferred_children(self, count):
+        if count == 0 or count > len(self.deferred_children):
+            count = len(self.deferred_children)
+        records = self.deferred_children[:count]
+        del self.deferred_children[:count]
+        for record in records:
+            if record.body is None:
+                self.create_body(record)
+
+    def create_body(self, record):
+        deferredBodies.remove_record(record)
+        DeferredBodiesCatalog.nb_created += 1
+        record.body = record.create_body()
+        if record.body is not None:
+            self.add_child_fast(record.body)
+
     #TODO: This is a quick workaround until stars of a system are properly managed
     def add_child_star_fast(self, child):
         if child.parent is not None:
@@ -137,6 +207,9 @@ class StellarSystem(StellarObject):
         #print("Add child", child.get_name(), "to", self.get_name())
         self.children.append(child)
         child.set_parent(self)
+        self.spatial_index = None
+        self.orbits_batch = None
+        self.rotations_batch = None
         self.star = child
         self.has_halo = True
 
@@ -155,6 +228,9 @@ class StellarSystem(StellarObject):
         #print("Remove child", child.get_name(), "from", self.get_name())
         self.children.remove(child)
         child.set_parent(None)
+        self.spatial_index = None
+        self.orbits_batch = None
+        self.rotations_batch = None
         child.set_star(None)
         self.children_map.remove(child)
 
@@ -170,6 +246,9 @@ class StellarSystem(StellarObject):
                 size += child.orbit.get_apparent_radius()
             if size > extend:
                 extend = size
+        for record in self.deferred_children:
+            if record.extend > extend:
+                extend = record.extend
         self._extend = extend
 
     def recalc_recursive(self):
@@ -192,9 +271,34 @@ class StellarSystem(StellarObject):
         StellarObject.update(self, time)
         #No need to update the children if not visible
         if not self.visible or not self.resolved: return
-        for child in self.children:
+        if len(self.deferred_children) > 0:
+            self.create_deferred_children(settings.deferred_bodies_per_frame)
+        #Only the children updated in this frame are calculated in the batches
+        children = [child for child in self.children if updateScheduler.needs_update(child)]
+        if settings.batch_orbits and not native_kepler:
+            self.update_orbits_batch(children, time)
+        if settings.batch_rotations:
+            self.update_rotations_batch(children, time)
+        for child in children:
             child.update(time)
 
+    def update_orbits_batch(self, children, time):
+        orbits = [child.orbit for child in children if isinstance(child.orbit, EllipticalOrbit)]
+        if len(orbits) >= self.min_batch_orbits:
+            if self.orbits_batch is None:
+                self.orbits_batch = EllipticalOrbitsBatch([child.orbit for child in self.children if isinstance(child.orbit, EllipticalOrbit)])
+            if not self.orbits_batch.update(orbits, time):
+                #An orbit has been replaced, the batch is created again for the next frame
+                self.orbits_batch = None
+
+    def update_rotations_batch(self, children, time):
+        rotations = [child.rotation for child in children if isinstance(child.rotation, AxisRotation)]
+        if len(rotations) >= self.min_batch_rotations:
+            if self.rotations_batch is None:
+                self.rotations_batch = AxisRotationsBatch([child.rotation for child in self.children if isinstance(child.rotation, AxisRotation)])
+            if not self.rotations_batch.update(rotations, time):
+                self.rotations_batch = None
+
     def first_update_obs(self, observer):
         StellarObject.update_obs(self, observer)
         for child in self.children:
@@ -228,6 +332,8 @@ class StellarSystem(StellarObject):
         if (not self.visible or not self.resolved) and not self.was_visible: return
         for child in self.children:
             child.check_and_update_instance(camera_pos, orientation, pointset)
+        if self.orbit_batch is not None:
+            self.orbit_batch.update_instance(camera_pos, orientation)
 
     def remove_components(self):
         StellarObject.remove_components(self)
@@ -240,6 +346,9 @@ class StellarSystem(StellarObject):
         StellarObject.remove_instance(self)
         for child in self.children:
             child.remove_instance()
+        if self.orbit_batch is not None:
+            self.orbit_batch.remove_instance()
+            self.orbit_batch = None
 
     def get_extend(self):
         return self._extend
@@ -259,6 +368,7 @@ class SimpleSystem(StellarSystem):
     def __init__(self, names, primary=None, star_system=False, orbit=None, rotation=None, body_class='system', point_color=None, description=''):
         StellarSystem.__init__(self, names, orbit, rotation, body_class, point_color, description)
         self.star_system = star_system
+        self.eclipses = None
         self.set_primary(primary)
 
     def set_primary(self, primary):
@@ -318,21 +428,51 @@ class SimpleSystem(StellarSystem):
         if not self.visible or not self.resolved: return
         primary = self.primary
         if primary is None or primary.is_emissive(): return
-        check_primary = primary.visible and primary.resolved and primary.in_view
-        for child in self.children:
+        bodies = [child for child in self.children if not child.is_system() and not child.is_emissive()]
+        for child in bodies:
             child.start_shadows_update()
-        for child in self.children:
+        if settings.eclipses_broad_phase and primary.star is not None:
+            pairs = self.find_eclipses(bodies)
+        else:
+            pairs = self.find_primary_eclipses(bodies)
+        for (caster, target) in pairs:
+            #print(caster.get_friendly_name(), "casts shadow on", target.get_friendly_name())
+            caster.add_shadow_target(target)
+        for child in bodies:
+            child.end_shadows_update()
+
+    def find_eclipses(self, bodies):
+        """
+        Find the shadows cast between all the bodies of the system.
+        """
+        if self.eclipses is None:
+            self.eclipses = EclipseBroadPhase()
+        primary = self.primary
+        star = primary.star
+        star_distance = (star.get_local_position() - primary.get_local_position()).length()
+        #The bodies of the system can be closer to the star than the primary
+        closest_distance = max(star_distance - self.get_extend(), star.get_apparent_radius())
+        star_angular_radius = star.get_apparent_radius() / closest_distance
+        light_spread = min(self.get_extend() / closest_distance, 1.0)
+        targets = [body.visible and body.resolved and body.in_view for body in bodies]
+        return self.eclipses.find_pairs(bodies, targets, primary.vector_to_star, star_angular_radius, light_spread)
+
+    def find_primary_eclipses(self, bodies):
+        """
+        Find the shadows cast by the primary on the other bodies and by the other bodies on the primary.
+        """
+        primary = self.primary
+        check_primary = primary.visible and primary.resolved and primary.in_view
+        pairs = []
+        for child in bodies:
             if child == primary: continue
             if child.visible and child.resolved and child.in_view:
                 if primary.check_cast_shadow_on(child):
-                    #print(primary.get_friendly_name(), "casts shadow on", child.get_friendly_name())
-                    primary.add_shadow_target(child)
+                    pairs.append((primary, child))
             if check_primary:
                 if child.check_cast_shadow_on(primary):
-                    #print(child.get_friendly_name(), "casts shadow on", primary.get_friendly_name())
-                    child.add_shadow_target(primary)
-        for child in self.children:
-            child.end_shadows_update()
+                    pairs.append((child, primary))
+        return pairs
 
 class Barycenter(StellarSystem):
     def __init__(self, *args, **kwargs):
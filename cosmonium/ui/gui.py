@@ -32,6 +32,9 @@ from ..astro import bayer
 from ..astro.units import toUnit
 from ..fonts import fontsManager, Font
 from ..catalogs import objectsDB
+from ..deferredbodies import DeferredBody
+from ..starcatalog import StarCatalogEntry
+from ..profiler import frameProfiler
 from ..bodyclass import bodyClasses
 from ..appstate import AppState
 from ..extrainfo import extra_info
@@ -137,6 +140,8 @@ class Gui(object):
         event_ctrl.accept('f1', self.show_info)
         event_ctrl.accept('shift-f1', self.show_help)
         event_ctrl.accept('f2', self.cosmonium.connect_pstats)
+        event_ctrl.accept('shift-f2', self.cosmonium.toggle_frame_profiler)
+        event_ctrl.accept('control-f2', self.cosmonium.dump_frame_profile)
         event_ctrl.accept('f3', self.cosmonium.toggle_filled_wireframe)
         event_ctrl.accept('shift-f3', self.cosmonium.toggle_wireframe)
         event_ctrl.accept('f4', self.cosmonium.toggle_hdr)
@@ -572,6 +577,8 @@ class Gui(object):
                 ('Shaders', 0, shaders),
                 ('Instant movement>Control-J', settings.debug_jump, self.toggle_jump),
                 ('Connect pstats>F2', 0, self.cosmonium.connect_pstats),
+                ('Frame profiler>Shift-F2', frameProfiler.enabled, self.cosmonium.toggle_frame_profiler),
+                ('Dump frame profile>Control-F2', 0, self.cosmonium.dump_frame_profile),
                 ('Render info', 0, fps),
                 0,
                 ('Freeze LOD>F8', settings.debug_lod_freeze, self.toggle_lod_freeze),
@@ -741,6 +748,8 @@ class Gui(object):
         return True
 
     def select_object(self, body):
+        if isinstance(body, (DeferredBody, StarCatalogEntry)):
+            body = body.get_body()
         self.cosmonium.select_body(body)
 
     def get_object(self, name):
@@ -20,7 +20,7 @@
 from __future__ import print_function
 from __future__ import absolute_import
 
-from panda3d.core import LPoint3d, LQuaterniond
+from panda3d.core import LPoint3d, LVector3d, LQuaterniond, LMatrix4
 
 from .astro.orbits import FixedOrbit
 from .astro.rotations import FixedRotation
@@ -29,14 +29,25 @@ from .astro.frame import AbsoluteReferenceFrame
 from .astro import units
 
 from .foundation import CompositeObject
+from .stellarobject import StellarObject
 from .systems import StellarSystem
-from .octree import OctreeNode, OctreeLeaf, InfiniteFrustum, VisibleObjectsTraverser, hasOctreeLeaf
-from .pstats import pstat
+from .updatescheduler import updateScheduler
+from .starcatalog import StarCatalogEntry
+from .catalogs import objectsDB
+from .octree import OctreeNode, OctreeLeaf, InfiniteFrustum, VisibleObjectsTraverser, CoherentVisibleObjectsTraverser, hasOctreeLeaf
+from .pstats import pstat, levelpstat
+from .cache import create_path_for, map_arrays, save_arrays, read_arrays_key
+from . import settings
 
 from math import sqrt
 from time import time
+import hashlib
+import struct
+import numpy
+import os
 
 class Universe(StellarSystem):
+    octree_cache_version = 1
     def __init__(self, context):
         StellarSystem.__init__(self, 'Universe',
                                orbit=FixedOrbit(frame=AbsoluteReferenceFrame()),
@@ -49,12 +60,24 @@ class Universe(StellarSystem):
                              LPoint3d(10 * units.Ly, 10 * units.Ly, 10 * units.Ly),
                              self.octree_width,
                              abs_mag)
+        self.star_catalogs = []
         self.update_id = 0
+        self.last_update_time = None
         self.previous_leaves = []
         self.to_update_leaves = []
         self.to_update = []
         self.to_update_extra = []
         self.to_remove = []
+        self.batch_leaves = []
+        self.batch_dirty = False
+        self.batch_distances = None
+        self.other_leaves = []
+        if settings.coherent_octree and CoherentVisibleObjectsTraverser is not None:
+            self.coherent_traverser = CoherentVisibleObjectsTraverser(self.octree, 6.0)
+        else:
+            self.coherent_traverser = None
+        self.visible_leaves = {}
+        self.lens_mat = None
         self.nb_cells = 0
         self.nb_leaves = 0
         self.nb_leaves_in_cells = 0
@@ -73,13 +96,112 @@ class Universe(StellarSystem):
     def dumpOctreeStats(self):
         self.dump_octree_stats = not self.dump_octree_stats
 
+    def add_star_catalog(self, catalog):
+        catalog.set_parent(self)
+        self.star_catalogs.append(catalog)
+        objectsDB.add_catalog(catalog)
+
+    def find_by_name(self, name, name_up=None):
+        found = StellarSystem.find_by_name(self, name, name_up)
+        if found is None:
+            for catalog in self.star_catalogs:
+                found = catalog.get(name)
+                if found is not None: break
+        return found
+
+    def find_child_by_name(self, name, return_system=False):
+        child = StellarSystem.find_child_by_name(self, name, return_system)
+        if child is None:
+            for catalog in self.star_catalogs:
+                child = catalog.get(name)
+                if child is not None: break
+        return child
+
+    def get_octree_cache_file(self):
+        return os.path.join(create_path_for('octree'), 'octree.dat')
+
+    def get_octree_cache_key(self, children):
+        """
+        The key is a hash of everything the octree is built from, the children given are the ones not part of a catalog.
+        The stars already created are part of the catalog arrays, so the key does not depend on them.
+        """
+        md5 = hashlib.md5()
+        md5.update(struct.pack('<idi', OctreeNode.max_leaves, OctreeNode.child_threshold, OctreeNode.max_level))
+        for child in children:
+            position = child.get_global_position()
+            md5.update(struct.pack('<5d', position[0], position[1], position[2], child.get_abs_magnitude(), child.get_extend()))
+            md5.update(child.get_name().encode('utf-8'))
+        for catalog in self.star_catalogs:
+            for array in (catalog.positions, catalog.abs_magnitudes, catalog.radii, catalog.removed):
+                md5.update(numpy.ascontiguousarray(array))
+        return md5.digest()
+
+    def is_octree_cache_valid(self, cache_file, key):
+        return os.path.exists(cache_file) and read_arrays_key(cache_file) == key
+
+    def save_octree_cache(self, cache_file, key, leaves):
+        print("Caching into", cache_file)
+        save_arrays(cache_file, self.octree.get_arrays(leaves), self.octree_cache_version, key)
+        #Remove the caches of the previous versions, named after their key
+        cache_path = os.path.dirname(cache_file)
+        for filename in os.listdir(cache_path):
+            filepath = os.path.join(cache_path, filename)
+            if filepath != cache_file:
+                try:
+                    os.remove(filepath)
+                except OSError as e:
+                    print("Could not remove", filepath, ':', e)
+
     def create_octree(self):
+        catalogs_bodies = set()
+        for catalog in self.star_catalogs:
+            catalogs_bodies.update(catalog.bodies_index.keys())
+        #The leaves are always in the same order, whatever the stars already created
+        children = [child for child in self.children if child not in catalogs_bodies]
+        leaves = []
+        for child in children:
+            leaves.append(OctreeLeaf(child, child.get_global_position(), child.get_abs_magnitude(), child.get_extend()))
+        for catalog in self.star_catalogs:
+            for entry in catalog.create_entries():
+                leaves.append(OctreeLeaf(entry, entry.get_global_position(), entry.get_abs_magnitude(), entry.get_extend()))
+        cache_file = None
+        if settings.cache_octree and hasattr(self.octree, 'load_arrays'):
+            cache_file = self.get_octree_cache_file()
+            key = self.get_octree_cache_key(children)
+            if self.is_octree_cache_valid(cache_file, key):
+                print("Loading octree (cached)...")
+                start = time()
+                arrays = map_arrays(cache_file, self.octree_cache_version)
+                if arrays is not None and self.octree.load_arrays(arrays, leaves):
+                    end = time()
+                    print("Load time:", end - start)
+                    return
+                print("Invalid octree cache", cache_file)
         print("Creating octree...")
+        base.splash.set_text("Building octree...")
         start = time()
-        for child in self.children:
-            self.octree.add(OctreeLeaf(child, child.get_global_position(), child.get_abs_magnitude(), child.get_extend()))
+        if hasattr(self.octree, 'add_leaves'):
+            self.octree.add_leaves(leaves)
+        else:
+            for leaf in leaves:
+                self.octree.add(leaf)
         end = time()
         print("Creation time:", end - start)
+        if cache_file is not None:
+            self.save_octree_cache(cache_file, key, leaves)
+
+    def resolve_leaf(self, leaf_object):
+        if isinstance(leaf_object, StarCatalogEntry):
+            return leaf_object.get_body()
+        return leaf_object
+
+    def resolve_leaves(self, leaves_objects):
+        resolved = []
+        for leaf_object in leaves_objects:
+            leaf_object = self.resolve_leaf(leaf_object)
+            if leaf_object is not None:
+                resolved.append(leaf_object)
+        return resolved
 
     def build_octree_cells_list(self, limit):
         self.update_id += 1
@@ -88,20 +210,19 @@ class Universe(StellarSystem):
         mat = self.context.cam.getMat()
         bh = self.context.observer.realCamLens.make_bounds()
         f = InfiniteFrustum(bh, mat, pos)
+        if self.coherent_traverser is not None:
+            self.build_coherent_cells_list(f)
+            return
         t = VisibleObjectsTraverser(f, 6.0, self.update_id)
         self.octree.traverse(t)
         self.to_update_leaves = t.get_leaves()
-        self.to_remove = []
         if hasOctreeLeaf:
-            self.to_update = list(map(lambda x: x.get_object(), self.to_update_leaves))
-            for old in self.previous_leaves:
-                if old.get_update_id() != self.update_id:
-                    self.to_remove.append(old.get_object())
+            self.to_update = self.resolve_leaves(map(lambda x: x.get_object(), self.to_update_leaves))
+            removed = [old.get_object() for old in self.previous_leaves if old.get_update_id() != self.update_id]
         else:
-            self.to_update = self.to_update_leaves
-            for old in self.previous_leaves:
-                if old.update_id != self.update_id:
-                    self.to_remove.append(old)
+            self.to_update = self.resolve_leaves(self.to_update_leaves)
+            removed = [old for old in self.previous_leaves if old.update_id != self.update_id]
+        self.to_remove = self.resolve_leaves(removed)
         self.octree_cells_to_clean = []
         self.to_update_extra = []
 #         cells = pstats.levelpstat('cells')
@@ -117,6 +238,27 @@ class Universe(StellarSystem):
 #         in_cells.set_level(self.in_cells)
 #         in_view.set_level(self.in_view)
 
+    def build_coherent_cells_list(self, frustum):
+        lens_mat = self.context.observer.realCamLens.get_projection_mat()
+        if self.lens_mat is None or lens_mat != self.lens_mat:
+            self.lens_mat = LMatrix4(lens_mat)
+            self.coherent_traverser.invalidate()
+        self.coherent_traverser.update(frustum, self.context.cam.get_quat())
+        self.to_remove = []
+        for leaf in self.coherent_traverser.get_removed():
+            body = self.visible_leaves.pop(leaf, None)
+            if body is not None:
+                self.to_remove.append(body)
+        for leaf in self.coherent_traverser.get_added():
+            body = self.resolve_leaf(leaf)
+            if body is not None:
+                self.visible_leaves[leaf] = body
+        self.to_update = list(self.visible_leaves.values())
+        self.to_update_extra = []
+        levelpstat('tested', 'Octree').set_level(self.coherent_traverser.nb_tested_cells)
+        levelpstat('added', 'Octree').set_level(len(self.coherent_traverser.get_added()))
+        levelpstat('removed', 'Octree').set_level(len(self.coherent_traverser.get_removed()))
+
     def first_update(self):
         for child in self.children:
             child.first_update(self.context.time.time_full)
@@ -132,21 +274,128 @@ class Universe(StellarSystem):
 
     def update(self, time):
         CompositeObject.update(self, time)
+        if self.last_update_time is not None and time < self.last_update_time:
+            for child in self.children:
+                child.update_frozen = False
+        self.last_update_time = time
+        context = self.context
+        updateScheduler.start_frame(time, context.observer.pixel_size, (context.selected, context.track, context.follow, context.sync))
         for leaf in self.to_update:
             if isinstance(leaf, StellarSystem):
-                #print("Update system", leaf.get_name())
-                leaf.update(time)
-            elif not leaf.update_frozen:
-                #print("Update", leaf.get_name())
-                leaf.update(time)
+                if updateScheduler.needs_update(leaf):
+                    #print("Update system", leaf.get_name())
+                    leaf.update(time)
+            elif not leaf.update_frozen or leaf.resolved:
+                if updateScheduler.needs_update(leaf):
+                    #print("Update", leaf.get_name())
+                    leaf.update(time)
+                    if leaf.update_frozen:
+                        self.batch_dirty = True
+            else:
+                StellarObject.nb_update_skipped += 1
         for extra in self.to_update_extra:
             #print("Update", extra.get_name())
             extra.update(time)
 
+    def split_batch_leaves(self):
+        """
+        Separate the frozen point-like leaves, whose position does not change, from the other leaves.
+        The arrays of positions and extends of the batched leaves are only rebuilt when the list changes.
+        """
+        batch_leaves = []
+        self.other_leaves = []
+        for leaf in self.to_update:
+            if leaf.update_frozen and not leaf.resolved and not leaf.visibility_override and not isinstance(leaf, StellarSystem):
+                batch_leaves.append(leaf)
+            else:
+                self.other_leaves.append(leaf)
+        if self.batch_dirty or batch_leaves != self.batch_leaves:
+            self.batch_leaves = batch_leaves
+            self.batch_dirty = False
+            nb_leaves = len(batch_leaves)
+            self.batch_global_positions = numpy.empty((nb_leaves, 3), dtype=numpy.float64)
+            self.batch_local_positions = numpy.empty((nb_leaves, 3), dtype=numpy.float64)
+            self.batch_extends = numpy.empty(nb_leaves, dtype=numpy.float64)
+            for (i, leaf) in enumerate(batch_leaves):
+                position = leaf._global_position
+                self.batch_global_positions[i] = (position[0], position[1], position[2])
+                position = leaf._local_position
+                self.batch_local_positions[i] = (position[0], position[1], position[2])
+                self.batch_extends[i] = leaf._extend
+
+    def update_obs_batch(self, observer):
+        """
+        Vectorized version of StellarObject.update_obs() for the batched leaves.
+        """
+        leaves = self.batch_leaves
+        if len(leaves) == 0:
+            self.batch_distances = None
+            return
+        camera_global_pos = observer.camera_global_pos
+        position = observer._position
+        global_delta = self.batch_global_positions - (camera_global_pos[0], camera_global_pos[1], camera_global_pos[2])
+        local_delta = self.batch_local_positions - (position[0], position[1], position[2])
+        rel_positions = global_delta + local_delta
+        distances = numpy.sqrt(numpy.einsum('ij,ij->i', rel_positions, rel_positions))
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            vectors_to_obs = -rel_positions / distances[:, numpy.newaxis]
+        self.batch_distances = distances
+        rel_positions = rel_positions.tolist()
+        vectors_to_obs = vectors_to_obs.tolist()
+        distances = distances.tolist()
+        for (i, leaf) in enumerate(leaves):
+            leaf.rel_position = LVector3d(*rel_positions[i])
+            leaf.vector_to_obs = LVector3d(*vectors_to_obs[i])
+            leaf.distance_to_obs = distances[i]
+            leaf.height_under = leaf.get_apparent_radius()
+            CompositeObject.update_obs(leaf, observer)
+        StellarObject.nb_obs += len(leaves)
+
+    def check_visibility_batch(self, pixel_size):
+        """
+        Vectorized version of StellarObject.check_visibility() for the batched leaves, the leaves that become
+        resolved are checked again with the regular code to calculate their in view status.
+        """
+        leaves = self.batch_leaves
+        if len(leaves) == 0: return
+        distances = self.batch_distances
+        abs_magnitudes = numpy.array([leaf.get_abs_magnitude() for leaf in leaves], dtype=numpy.float64)
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            visible_sizes = numpy.where(distances > 0.0, self.batch_extends / (distances * pixel_size), 0.0)
+            app_magnitudes = numpy.where(distances > 0.0, abs_magnitudes + 5 * (numpy.log10(distances / units.KmPerParsec) - 1), 99.0)
+        resolved = visible_sizes > settings.min_body_size
+        visible = (visible_sizes > 1.0) | (app_magnitudes < settings.lowest_app_magnitude)
+        visible_sizes = visible_sizes.tolist()
+        app_magnitudes = app_magnitudes.tolist()
+        resolved = resolved.tolist()
+        visible = visible.tolist()
+        nb_visibility = 0
+        for (i, leaf) in enumerate(leaves):
+            if resolved[i]:
+                leaf.check_visibility(pixel_size)
+                continue
+            leaf.visible_size = visible_sizes[i]
+            leaf._app_magnitude = app_magnitudes[i]
+            leaf.resolved = False
+            leaf.in_view = True
+            leaf.visible = visible[i]
+            CompositeObject.check_visibility(leaf, pixel_size)
+            nb_visibility += 1
+        StellarObject.nb_visibility += nb_visibility
+
     def update_obs(self, observer):
         CompositeObject.update_obs(self, observer)
         self.nearest_system = None
-        for leaf in self.to_update:
+        if settings.batch_obs:
+            self.split_batch_leaves()
+            self.update_obs_batch(observer)
+            if self.batch_distances is not None:
+                self.nearest_system = self.batch_leaves[numpy.argmin(self.batch_distances)]
+            leaves = self.other_leaves
+        else:
+            self.batch_leaves = []
+            leaves = self.to_update
+        for leaf in leaves:
             leaf.update_obs(observer)
             if self.nearest_system is None or leaf.distance_to_obs < self.nearest_system.distance_to_obs:
                 self.nearest_system = leaf
@@ -155,7 +404,12 @@ class Universe(StellarSystem):
 
     def check_visibility(self, pixel_size):
         CompositeObject.check_visibility(self, pixel_size)
-        for leaf in self.to_update:
+        if settings.batch_obs:
+            self.check_visibility_batch(pixel_size)
+            leaves = self.other_leaves
+        else:
+            leaves = self.to_update
+        for leaf in leaves:
             leaf.check_visibility(pixel_size)
         for extra in self.to_update_extra:
             pass#extra.check_visibility(pixel_size)
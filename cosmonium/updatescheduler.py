@@ -0,0 +1,110 @@
+#
+#This file is part of Cosmonium.
+#
+#Copyright (C) 2018-2019 Laurent Deru.
+#
+#Cosmonium is free software: you can redistribute it and/or modify
+#it under the terms of the GNU General Public License as published by
+#the Free Software Foundation, either version 3 of the License, or
+#(at your option) any later version.
+#
+#Cosmonium is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#GNU General Public License for more details.
+#
+#You should have received a copy of the GNU General Public License
+#along with Cosmonium.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+from __future__ import print_function
+from __future__ import absolute_import
+
+from . import settings
+
+class UpdateScheduler(object):
+    """
+    Decides each frame which bodies must be recomputed.
+    The displacement of a body since its last update is bounded by the maximum speed of its orbit, and of the orbits
+    of its parents, times the elapsed simulation time. While that displacement seen from the observer stays below a
+    fraction of pixel, the update is deferred, up to a maximum number of frames. As the elapsed time is used instead
+    of the number of frames, a time jump or a change of time rate triggers the update of all the moving bodies.
+    The resolved bodies, the bodies whose motion can not be bounded and the selected, tracked and followed bodies,
+    with their parents, are always updated.
+    """
+    EVERY_FRAME = 0
+    DEFERRED = 1
+    ON_DEMAND = 2
+
+    nb_every_frame = 0
+    nb_deferred_updates = 0
+    nb_deferred = 0
+    nb_on_demand = 0
+
+    def __init__(self):
+        self.frame = 0
+        self.time = None
+        self.max_shift = 0.0
+        self.forced = set()
+        #Maximum speed of each body, including the motion of its parents, or None if it can not be bounded
+        self.speeds = {}
+
+    def invalidate(self):
+        self.speeds = {}
+
+    def start_frame(self, time, pixel_size, forced_bodies):
+        self.frame += 1
+        self.time = time
+        self.max_shift = settings.update_max_pixel_shift * pixel_size
+        self.forced = set()
+        for body in forced_bodies:
+            while body is not None and body not in self.forced:
+                self.forced.add(body)
+                body = body.parent
+
+    def get_speed(self, body):
+        if body in self.speeds:
+            return self.speeds[body]
+        if body.orbit.frame.dynamic:
+            speed = None
+        else:
+            speed = body.orbit.get_max_speed()
+        if speed is not None and body.parent is not None:
+            parent_speed = self.get_speed(body.parent)
+            speed = speed + parent_speed if parent_speed is not None else None
+        self.speeds[body] = speed
+        return speed
+
+    def get_bucket(self, body):
+        if body.resolved or body.visibility_override or body in self.forced or body.last_update_time is None:
+            return self.EVERY_FRAME
+        speed = self.get_speed(body)
+        if speed is None or body.distance_to_obs is None:
+            return self.EVERY_FRAME
+        if speed == 0.0:
+            return self.ON_DEMAND
+        return self.DEFERRED
+
+    def needs_update(self, body):
+        """
+        Returns True if the body must be updated in this frame, in which case it is assumed to be updated.
+        """
+        if not settings.update_scheduler:
+            return True
+        bucket = self.get_bucket(body)
+        if bucket == self.EVERY_FRAME:
+            UpdateScheduler.nb_every_frame += 1
+        elif bucket == self.ON_DEMAND:
+            UpdateScheduler.nb_on_demand += 1
+            return False
+        else:
+            drift = self.get_speed(body) * abs(self.time - body.last_update_time)
+            if drift < self.max_shift * body.distance_to_obs and self.frame - body.last_update_frame < settings.update_max_interval:
+                UpdateScheduler.nb_deferred += 1
+                return False
+            UpdateScheduler.nb_deferred_updates += 1
+        body.last_update_time = self.time
+        body.last_update_frame = self.frame
+        return True
+
+updateScheduler = UpdateScheduler()
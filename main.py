@@ -38,11 +38,13 @@ from cosmonium.parsers.objectparser import UniverseYamlParser
 from cosmonium.celestia import cel_parser, cel_engine
 from cosmonium.celestia import ssc_parser
 from cosmonium.celestia import stc_parser
-from cosmonium.celestia import star_parser
+from cosmonium.celestia import catalogs_loader
 from cosmonium.celestia import dsc_parser
 from cosmonium.celestia import asterisms_parser
 from cosmonium.celestia import boundaries_parser
 from cosmonium.dircontext import defaultDirContext
+from cosmonium.parallelparser import ParallelParser
+from cosmonium.profiler import frameProfiler
 
 #import textures to register celestia texture parser
 from cosmonium.celestia import textures
@@ -78,6 +80,7 @@ class CosmoniumConfig(object):
         self.celestia_start_script = 'start.cel'
         self.prc_file = 'config.prc'
         self.test_start = False
+        self.profile = False
 
     def update_from_args(self, args):
         #TODO: add input checking here
@@ -100,6 +103,7 @@ class CosmoniumConfig(object):
         if self.celestia and self.script is None and self.default is None:
             self.script = self.celestia_start_script
         self.test_start = args.test_start
+        self.profile = args.profile
 
 class CosmoniumConfigParser(YamlParser):
     def __init__(self, config_file):
@@ -150,6 +154,9 @@ class CosmoniumApp(Cosmonium):
         self.app_config = parser.load()
         self.app_config.update_from_args(args)
         settings.prc_file = self.app_config.prc_file
+        if self.app_config.profile:
+            frameProfiler.nb_frames = settings.profile_nb_frames
+            frameProfiler.set_enabled(True)
         Cosmonium.__init__(self)
 
     def find_celestia_data(self):
@@ -171,20 +178,25 @@ class CosmoniumApp(Cosmonium):
         defaultDirContext.add_path('scripts', self.celestia_data + '/scripts')
         defaultDirContext.add_path('scripts', self.celestia_data)
 
+    def init_loader(self):
+        #The catalogs to parse are submitted and the parser processes forked on the main thread,
+        #before the loader thread is started
+        if self.app_config.celestia:
+            self.find_celestia_data()
+            self.catalogs_parser = ParallelParser(self.splash)
+            self.catalogs_jobs = catalogs_loader.submit_catalogs(self.catalogs_parser,
+                                                                 self.app_config.celestia_stars_catalog,
+                                                                 self.app_config.celestia_stars_names,
+                                                                 self.app_config.celestia_stc,
+                                                                 self.app_config.celestia_ssc)
+            self.catalogs_parser.start()
+
     def load_universe_celestia(self):
-        self.find_celestia_data()
         if len(self.app_config.celestia_support) > 0:
             parser = UniverseYamlParser(self.universe)
             for support in self.app_config.celestia_support:
                 self.load_file(parser, support)
-        names = star_parser.load_names(self.app_config.celestia_stars_names)
-        if self.app_config.celestia_stars_catalog is not None:
-            if self.app_config.celestia_stars_catalog.endswith('.dat'):
-                star_parser.load_bin(self.app_config.celestia_stars_catalog, names, self.universe)
-            else:
-                star_parser.load_text(self.app_config.celestia_stars_catalog, names, self.universe)
-        stc_parser.load(self.app_config.celestia_stc, self.universe)
-        ssc_parser.load(self.app_config.celestia_ssc, self.universe)
+        catalogs_loader.load_catalogs(self.catalogs_parser, self.catalogs_jobs, self.universe)
         asterisms_parser.load(self.app_config.celestia_asterisms, self.universe)
         boundaries_parser.load(self.app_config.celestia_boundaries, self.universe)
         #dsc_parser.load(self.celestia_dsc, self.universe)
@@ -267,6 +279,10 @@ parser.add_argument("--test-start",
                     help=argparse.SUPPRESS,
                     action='store_true',
                     default=False)
+parser.add_argument("--profile",
+                    help="Record the duration of each frame phase, the report is saved on exit",
+                    action='store_true',
+                    default=False)
 if sys.platform == "darwin":
     #Ignore -psn_<app_id> from MacOS
     parser.add_argument('-p', help=argparse.SUPPRESS)